@@ -0,0 +1,87 @@
+"""
+Compare the time to bias-correct ERA5 data of 50 sites with ten years of
+hourly data by quantile mapping, fitted on one year of station data
+- per site: quantiles and `np.interp` for each site, variable and month,
+- at once: `fit_quantile_mapping` and `apply_quantile_mapping` over all
+  sites, variables and months.
+
+run with `python benchmarks/bench_bias_correction.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5_bias import apply_quantile_mapping  # noqa: E402
+from era5_bias import fit_quantile_mapping  # noqa: E402
+
+N_SITES = 50
+N_YEARS = 10
+VARIABLES = ["t_air", "windspeed", "ghi"]
+
+
+def site_data(times, rng):
+    return pd.DataFrame(
+        {
+            "t_air": rng.normal(20, 3, len(times)),
+            "windspeed": 5 * rng.weibull(2, len(times)),
+            "ghi": rng.uniform(0, 800, len(times)),
+        },
+        index=times.rename("time"),
+    )
+
+
+def per_site(era5, stations, probabilities):
+    corrected = {}
+    for name, frame in era5.items():
+        station = stations[name]
+        common = frame.index.intersection(station.index)
+        result = frame.copy()
+        for variable in VARIABLES:
+            for month in range(1, 13):
+                fit = common[common.month == month]
+                source = np.quantile(frame.loc[fit, variable], probabilities)
+                target = np.quantile(
+                    station.loc[fit, variable], probabilities
+                )
+                rows = frame.index.month == month
+                result.loc[rows, variable] = np.interp(
+                    frame.loc[rows, variable], source, target
+                )
+        corrected[name] = result
+    return corrected
+
+
+if __name__ == "__main__":
+    times = pd.date_range("2010", periods=8760 * N_YEARS, freq="h")
+    rng = np.random.default_rng(0)
+    era5 = {i: site_data(times, rng) for i in range(N_SITES)}
+    stations = {i: 1.1 * frame.iloc[-8760:] for i, frame in era5.items()}
+
+    start = time.perf_counter()
+    reference = per_site(era5, stations, np.linspace(0, 1, 101))
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapping = fit_quantile_mapping(era5, stations)
+    corrected = apply_quantile_mapping(era5, mapping)
+    at_once = time.perf_counter() - start
+
+    for name in era5:
+        inside = reference[name]["t_air"].between(
+            *corrected[name]["t_air"].quantile([0.01, 0.99])
+        )
+        np.testing.assert_allclose(
+            corrected[name]["t_air"][inside],
+            reference[name]["t_air"][inside],
+            rtol=1e-9,
+        )
+    print(
+        "{} sites, {} years: per site {:.1f} s, at once {:.1f} s".format(
+            N_SITES, N_YEARS, loop, at_once
+        )
+    )
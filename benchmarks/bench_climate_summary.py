@@ -0,0 +1,72 @@
+"""
+Compare the time to compute the annual report KPIs of many grid cells
+- per site: one pandas pass per cell and KPI, as done in the notebooks,
+- at once: `climate_summary` over all cells.
+
+run with `python benchmarks/bench_climate_summary.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5_summary import climate_summary  # noqa: E402
+
+N_CELLS = 20
+
+
+def weather_frame(n_years):
+    index = pd.MultiIndex.from_product(
+        [
+            pd.date_range(
+                "2000", periods=8760 * n_years, freq="h", tz="UTC"
+            ),
+            50 - 0.25 * np.arange(N_CELLS),
+            10 + 0.25 * np.arange(N_CELLS),
+        ],
+        names=["time", "latitude", "longitude"],
+    )
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        rng.uniform(0, 1, (len(index), 4)),
+        index=index,
+        columns=["ghi", "t_air", "windspeed", "tp"],
+    )
+
+
+def per_site(df):
+    kpis = {}
+    for cell, ep in df.groupby(level=["latitude", "longitude"]):
+        ep = ep.droplevel(["latitude", "longitude"])
+        years = ep.index.year
+        kpis[cell] = pd.DataFrame(
+            {
+                "solar_irrad_total": ep.ghi.groupby(years).sum() / 1000,
+                "windspeed_mean": ep.windspeed.groupby(years).mean(),
+                "precip_total": ep.tp.groupby(years).sum(),
+                "temp_mean": ep.t_air.groupby(years).mean(),
+            }
+        )
+    return kpis
+
+
+if __name__ == "__main__":
+    for n_years in (1, 2):
+        df = weather_frame(n_years)
+        timings = {}
+        for name, func in [
+            ("per site", per_site),
+            ("at once", lambda d: climate_summary(d, periods=["annual"])),
+        ]:
+            start = time.perf_counter()
+            func(df)
+            timings[name] = time.perf_counter() - start
+        print(
+            "{} cells, {} year(s): per site {:.2f} s, at once {:.2f} s".format(
+                N_CELLS ** 2, n_years, timings["per site"], timings["at once"]
+            )
+        )
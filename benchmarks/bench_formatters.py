@@ -0,0 +1,118 @@
+"""
+Compare the former `to_dataframe` based implementations of `format_pvlib`
+and `format_windpowerlib` with the columnar conversion of `era5.py` on a
+single point (10 years) and on a grid (1 year, 20x20 cells).
+
+run with `python benchmarks/bench_formatters.py`
+"""
+import os
+import sys
+import timeit
+import warnings
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5 import format_pvlib, format_windpowerlib  # noqa: E402
+
+
+def legacy_format_windpowerlib(ds):
+    ds["wnd100m"] = np.sqrt(ds["u100"] ** 2 + ds["v100"] ** 2)
+    ds["wnd10m"] = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2)
+    windpowerlib_vars = ["wnd10m", "wnd100m", "sp", "t2m", "fsr"]
+    ds_vars = list(ds.variables)
+    drop_vars = [
+        _
+        for _ in ds_vars
+        if _ not in windpowerlib_vars + ["latitude", "longitude", "time"]
+    ]
+    ds = ds.drop(drop_vars)
+    df = ds.to_dataframe().reset_index()
+    df["time"] = df.time - pd.Timedelta(minutes=60)
+    df.set_index(["time", "latitude", "longitude"], inplace=True)
+    df.sort_index(inplace=True)
+    df = df.tz_localize("UTC", level=0)
+    df = df[windpowerlib_vars]
+    midx = pd.MultiIndex(
+        levels=[
+            ["wind_speed", "pressure", "temperature", "roughness_length"],
+            [0, 2, 10, 100],
+        ],
+        codes=[[0, 0, 1, 2, 3], [2, 3, 0, 1, 0]],
+        names=["variable", "height"],
+    )
+    df.columns = midx
+    df.dropna(inplace=True)
+    return df
+
+
+def legacy_format_pvlib(ds):
+    ds["wind_speed"] = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2)
+    ds["temp_air"] = ds.t2m - 273.15
+    ds["dirhi"] = ds.fdir / 3600.0
+    ds["ghi"] = ds.ssrd / 3600.0
+    ds["dhi"] = ds.ghi - ds.dirhi
+    pvlib_vars = ["ghi", "dhi", "wind_speed", "temp_air"]
+    ds_vars = list(ds.variables)
+    drop_vars = [
+        _
+        for _ in ds_vars
+        if _ not in pvlib_vars + ["latitude", "longitude", "time"]
+    ]
+    ds = ds.drop(drop_vars)
+    df = ds.to_dataframe().reset_index()
+    df["time"] = df.time - pd.Timedelta(minutes=30)
+    df.set_index(["time", "latitude", "longitude"], inplace=True)
+    df.sort_index(inplace=True)
+    df = df.tz_localize("UTC", level=0)
+    df = df[["wind_speed", "temp_air", "ghi", "dhi"]]
+    df.dropna(inplace=True)
+    return df
+
+
+def dataset(n_hours, n_cells):
+    rng = np.random.default_rng(0)
+    shape = (n_hours, n_cells, n_cells)
+    names = ["u10", "v10", "u100", "v100", "t2m", "sp", "fsr", "ssrd", "fdir"]
+    return xr.Dataset(
+        {
+            name: (
+                ("time", "latitude", "longitude"),
+                rng.uniform(0, 1, shape).astype("float32"),
+                {"units": "-"},
+            )
+            for name in names
+        },
+        coords={
+            "time": pd.date_range("2000", periods=n_hours, freq="h"),
+            "latitude": 52 - 0.25 * np.arange(n_cells),
+            "longitude": 9 + 0.25 * np.arange(n_cells),
+        },
+    )
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore", FutureWarning)
+    for label, ds in [
+        ("single point, 10 years", dataset(10 * 8760, 1)),
+        ("20x20 grid, 1 year", dataset(8760, 20)),
+    ]:
+        for name, legacy, columnar in [
+            ("pvlib", legacy_format_pvlib, format_pvlib),
+            ("windpowerlib", legacy_format_windpowerlib, format_windpowerlib),
+        ]:
+            t_legacy = min(
+                timeit.repeat(lambda: legacy(ds.copy()), number=1, repeat=3)
+            )
+            t_columnar = min(
+                timeit.repeat(lambda: columnar(ds), number=1, repeat=3)
+            )
+            print(
+                "{:<24s} {:<13s} to_dataframe {:7.3f} s, columnar {:7.3f} s, "
+                "speedup x{:.1f}".format(
+                    label, name, t_legacy, t_columnar, t_legacy / t_columnar
+                )
+            )
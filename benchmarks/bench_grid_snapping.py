@@ -0,0 +1,63 @@
+"""
+Compare the snapping of positions to the CDS grid with the former
+xarray-based lookup of _format_cds_request_position (one global dataset and
+one `.sel(method="nearest")` per position) and the vectorized
+`cds_request_tools.snap_to_grid`.
+
+run with `python benchmarks/bench_grid_snapping.py`
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import xarray as xr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from cds_request_tools import snap_to_grid  # noqa: E402
+
+
+def snap_with_xarray(latitude, longitude, grid=(0.25, 0.25)):
+    answer = []
+    for lat, lon in zip(latitude, longitude):
+        grid_point = xr.Dataset(
+            {
+                "lat": np.arange(90, -90, -grid[0]),
+                "lon": np.arange(-180, 180.0, grid[1]),
+            }
+        ).sel(lat=lat, lon=lon, method="nearest")
+        answer.append([float(grid_point.coords[s]) for s in ("lat", "lon")])
+    return answer
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for n in (1, 1000, 100000):
+        latitude = rng.uniform(-90, 90, n)
+        longitude = rng.uniform(-180, 180, n)
+        t_vec = min(
+            timeit.repeat(
+                lambda: snap_to_grid(latitude, longitude), number=1, repeat=5
+            )
+        )
+        # the per-position lookup is timed on at most 1000 positions and
+        # extrapolated
+        n_ref = min(n, 1000)
+        t_ref = (
+            min(
+                timeit.repeat(
+                    lambda: snap_with_xarray(
+                        latitude[:n_ref], longitude[:n_ref]
+                    ),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            * n
+            / n_ref
+        )
+        print(
+            "{:>7d} points: xarray {:10.4f} s, vectorized {:10.6f} s, "
+            "speedup x{:.0f}".format(n, t_ref, t_vec, t_ref / t_vec)
+        )
@@ -0,0 +1,98 @@
+"""
+Compare the peak memory of reading one site out of yearly ERA5 files
+- eagerly: every file is loaded and concatenated before the selection, as
+  done before `weather_df_from_era5` accepted several files,
+- lazily: `weather_df_from_era5` opens the files as one chunked dataset.
+Each measurement runs in a fresh process.
+
+run with `python benchmarks/bench_multi_file.py`
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5 import weather_df_from_era5  # noqa: E402
+
+N_CELLS = 16
+SITE = [10.5, 50.5]
+
+
+def write_year(filename, year):
+    times = pd.date_range(str(year), periods=8760, freq="h")
+    shape = (len(times), N_CELLS, N_CELLS)
+    rng = np.random.default_rng(year)
+    data_vars = {
+        name: (
+            ("time", "latitude", "longitude"),
+            rng.uniform(0, 1, shape).astype("float32"),
+            {"units": units},
+        )
+        for name, units in [
+            ("u10", "m s**-1"),
+            ("v10", "m s**-1"),
+            ("t2m", "K"),
+            ("ssrd", "J m**-2"),
+            ("fdir", "J m**-2"),
+        ]
+    }
+    xr.Dataset(
+        data_vars,
+        coords={
+            "time": times,
+            "latitude": 52 - 0.25 * np.arange(N_CELLS),
+            "longitude": 9 + 0.25 * np.arange(N_CELLS),
+        },
+    ).to_netcdf(filename)
+
+
+def run_child(mode, pattern):
+    if mode == "eager":
+        import glob
+
+        from era5 import format_pvlib, select_area
+
+        datasets = [xr.load_dataset(f) for f in sorted(glob.glob(pattern))]
+        ds = xr.concat(datasets, dim="time")
+        del datasets
+        format_pvlib(select_area(ds, *SITE))
+    else:
+        weather_df_from_era5(
+            pattern, "pvlib", area=SITE, memory_budget=32 * 2 ** 20
+        )
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pattern = os.path.join(tmp_dir, "era5_*.nc")
+        for n_years in (1, 2, 4, 8):
+            for year in range(2000, 2000 + n_years):
+                filename = os.path.join(tmp_dir, "era5_{}.nc".format(year))
+                if not os.path.exists(filename):
+                    write_year(filename, year)
+            peak = {}
+            for mode in ("eager", "lazy"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, pattern],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                peak[mode] = int(out.stdout.split()[-1])
+            print(
+                "{} year(s): peak memory eager {:5d} MB, lazy {:5d} MB".format(
+                    n_years, peak["eager"], peak["lazy"]
+                )
+            )
@@ -0,0 +1,107 @@
+"""
+Compare the time to read the series of single sites out of a decade of
+hourly ERA5 data
+- from the yearly netCDF files, chunked by day (all cells of a day in one
+  chunk, like the time-major downloads of the CDS),
+- from the point store written once by `convert_era5_to_point_store`
+  (chunked netCDF and, if `zarr` is installed, Zarr).
+
+run with `python benchmarks/bench_point_store.py`
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5 import convert_era5_to_point_store  # noqa: E402
+from era5 import weather_df_from_era5  # noqa: E402
+
+N_CELLS = 16
+N_YEARS = 10
+N_SITES = 3
+VARIABLES = [
+    ("u10", "m s**-1"),
+    ("v10", "m s**-1"),
+    ("t2m", "K"),
+    ("ssrd", "J m**-2"),
+    ("fdir", "J m**-2"),
+]
+
+
+def write_year(filename, year):
+    times = pd.date_range(str(year), periods=8760, freq="h")
+    shape = (len(times), N_CELLS, N_CELLS)
+    hours = np.arange(len(times))[:, None, None]
+    rng = np.random.default_rng(year)
+    data_vars = {
+        name: (
+            ("time", "latitude", "longitude"),
+            (
+                np.sin(hours * 2 * np.pi / 24 + rng.uniform(0, 1, shape[1:]))
+                + rng.normal(0, 0.1, shape)
+            ).astype("float32"),
+            {"units": units},
+        )
+        for name, units in VARIABLES
+    }
+    encoding = {
+        name: {"zlib": True, "chunksizes": (24, N_CELLS, N_CELLS)}
+        for name, _ in VARIABLES
+    }
+    xr.Dataset(
+        data_vars,
+        coords={
+            "time": times,
+            "latitude": 52 - 0.25 * np.arange(N_CELLS),
+            "longitude": 9 + 0.25 * np.arange(N_CELLS),
+        },
+    ).to_netcdf(filename, encoding=encoding)
+
+
+def time_sites(filename, sites):
+    start = time.perf_counter()
+    for site in sites:
+        weather_df_from_era5(filename, "pvlib", area=site)
+    return (time.perf_counter() - start) / len(sites)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    sites = [
+        [9 + 0.25 * i, 52 - 0.25 * j]
+        for i, j in rng.integers(0, N_CELLS, (N_SITES, 2))
+    ]
+    stores = ["points.nc"]
+    try:
+        import zarr  # noqa: F401
+
+        stores.append("points.zarr")
+    except ImportError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for year in range(2000, 2000 + N_YEARS):
+            write_year(os.path.join(tmp_dir, "era5_{}.nc".format(year)), year)
+        source = os.path.join(tmp_dir, "era5_*.nc")
+        print(
+            "yearly files: {:8.1f} ms per site".format(
+                1000 * time_sites(source, sites)
+            )
+        )
+        for store in stores:
+            start = time.perf_counter()
+            target = convert_era5_to_point_store(
+                source, os.path.join(tmp_dir, store)
+            )
+            conversion = time.perf_counter() - start
+            print(
+                "{:12s}: {:8.1f} ms per site (converted in {:.1f} s)".format(
+                    store, 1000 * time_sites(target, sites), conversion
+                )
+            )
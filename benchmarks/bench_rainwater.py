@@ -0,0 +1,60 @@
+"""
+Compare the time to size rainwater tanks with ten years of hourly
+precipitation for a grid of 20 tank volumes and 20 catchment areas
+- per scenario: one simulation loop per tank volume and catchment area (timed
+  on a sample of scenarios and extrapolated to the grid),
+- at once: `simulate_rainwater_harvesting` over all scenarios.
+
+run with `python benchmarks/bench_rainwater.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5_rainwater import simulate_rainwater_harvesting  # noqa: E402
+
+N_YEARS = 10
+N_SAMPLE = 4
+
+
+def per_scenario(rain, volume, area, demand):
+    storage, met = 0.0, 0
+    for r, d in zip(rain, demand):
+        served = min(storage, d)
+        storage -= served
+        met += served >= d
+        storage = min(storage + 0.8 * area * r, volume)
+    return met / len(rain)
+
+
+if __name__ == "__main__":
+    times = pd.date_range("2000", periods=8760 * N_YEARS, freq="h")
+    rng = np.random.default_rng(0)
+    rain = pd.Series(rng.exponential(1.5, len(times)), index=times)
+    rain[rng.random(len(times)) < 0.9] = 0.0
+    volumes = np.linspace(500, 20000, 20)
+    areas = np.linspace(10, 200, 20)
+    demand = np.resize(np.r_[np.zeros(6), np.full(16, 10.0), np.zeros(2)], 24)
+
+    start = time.perf_counter()
+    values = rain.to_numpy()
+    for volume in volumes[:N_SAMPLE]:
+        per_scenario(values, volume, areas[0], np.resize(demand, len(times)))
+    loop = (
+        (time.perf_counter() - start) / N_SAMPLE * len(volumes) * len(areas)
+    )
+
+    start = time.perf_counter()
+    simulate_rainwater_harvesting(rain, volumes, areas, demand)
+    at_once = time.perf_counter() - start
+    print(
+        "{} scenarios, {} years hourly: per scenario {:.1f} s "
+        "(extrapolated), at once {:.2f} s".format(
+            len(volumes) * len(areas), N_YEARS, loop, at_once
+        )
+    )
@@ -0,0 +1,100 @@
+"""
+Compare the former implementation of `era5.select_geometry` (one shapely
+Point per grid point and one boolean array per inside point) with the
+vectorized mask of `era5.geometry_mask`.
+
+run with `python benchmarks/bench_select_geometry.py`
+"""
+import os
+import sys
+import timeit
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import xarray as xr
+from shapely.geometry import Point
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5 import select_geometry  # noqa: E402
+
+
+def select_geometry_loop(ds, area):
+    geometry = []
+    lon_vals = []
+    lat_vals = []
+
+    df = pd.DataFrame([], columns=["lon", "lat"])
+
+    for i, x in enumerate(ds.longitude):
+        for j, y in enumerate(ds.latitude):
+            lon_vals.append(x.values)
+            lat_vals.append(y.values)
+            geometry.append(Point(x, y))
+
+    df["lon"] = lon_vals
+    df["lat"] = lat_vals
+
+    geo_df = gpd.GeoDataFrame(df, crs="epsg:4326", geometry=geometry)
+
+    inside_points = geo_df.within(area)
+    if not inside_points.any():
+        return None
+
+    inside_lon = geo_df.loc[inside_points, "lon"].values
+    inside_lat = geo_df.loc[inside_points, "lat"].values
+
+    logical_list = []
+    for lon, lat in zip(inside_lon, inside_lat):
+        logical_list.append(
+            np.logical_and((ds.longitude == lon), (ds.latitude == lat))
+        )
+
+    cond = np.logical_or(*logical_list[:2])
+    for new_cond in logical_list[2:]:
+        cond = np.logical_or(cond, new_cond)
+
+    return ds.where(cond)
+
+
+def grid_dataset(n):
+    latitude = np.arange(n) * -0.25
+    longitude = np.arange(n) * 0.25
+    ds = xr.Dataset(
+        {"t2m": (("latitude", "longitude"), np.ones((n, n)))},
+        coords={"latitude": latitude, "longitude": longitude},
+    )
+    # disc covering about half of the grid
+    centre = Point(longitude.mean(), latitude.mean())
+    return ds, centre.buffer(0.4 * n * 0.25)
+
+
+if __name__ == "__main__":
+    for n in (10, 100, 400):
+        ds, area = grid_dataset(n)
+        t_vec = min(
+            timeit.repeat(lambda: select_geometry(ds, area), number=1, repeat=3)
+        )
+        t_weights = min(
+            timeit.repeat(
+                lambda: select_geometry(ds, area, return_weights=True),
+                number=1,
+                repeat=3,
+            )
+        )
+        # the former implementation is quadratic in the number of inside
+        # points, it is skipped on the largest grid
+        if n <= 100:
+            t_loop = min(
+                timeit.repeat(
+                    lambda: select_geometry_loop(ds, area), number=1, repeat=1
+                )
+            )
+            t_loop = "{:10.4f} s".format(t_loop)
+        else:
+            t_loop = "   skipped"
+        print(
+            "{0:>3d}x{0:<3d} grid: loop {1}, vectorized {2:.4f} s, "
+            "with weights {3:.4f} s".format(n, t_loop, t_vec, t_weights)
+        )
@@ -0,0 +1,90 @@
+"""
+Compare the time to add the solar position and the DNI to the pvlib
+formatted data of one year on 100 grid cells
+- per cell: pvlib's solar position of each cell, as done after
+  `format_pvlib` before (requires pvlib),
+- vectorized: `format_pvlib(ds, solar_position=True)` over the whole grid.
+
+run with `python benchmarks/bench_solar_position.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+try:
+    import pvlib
+except ImportError:
+    pvlib = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5 import format_pvlib  # noqa: E402
+
+N_CELLS = 10
+
+
+def era5_year():
+    times = pd.date_range("2020", periods=8784, freq="h")
+    shape = (len(times), N_CELLS, N_CELLS)
+    rng = np.random.default_rng(0)
+    data_vars = {
+        name: (
+            ("time", "latitude", "longitude"),
+            rng.uniform(low, high, shape).astype("float32"),
+        )
+        for name, low, high in [
+            ("u10", -5, 5),
+            ("v10", -5, 5),
+            ("t2m", 260, 310),
+            ("ssrd", 0, 3e6),
+            ("fdir", 0, 1e6),
+        ]
+    }
+    return xr.Dataset(
+        data_vars,
+        coords={
+            "time": times,
+            "latitude": 11 - 0.25 * np.arange(N_CELLS),
+            "longitude": -86 + 0.25 * np.arange(N_CELLS),
+        },
+    )
+
+
+def per_cell(ds):
+    df = format_pvlib(ds)
+    frames = []
+    for (lat, lon), cell in df.groupby(level=["latitude", "longitude"]):
+        times = cell.index.get_level_values("time")
+        position = pvlib.solarposition.get_solarposition(times, lat, lon)
+        cell = cell.assign(
+            zenith=position.zenith.values,
+            azimuth=position.azimuth.values,
+            dni_extra=pvlib.irradiance.get_extra_radiation(times).values,
+        )
+        cell["dni"] = pvlib.irradiance.dni(
+            cell.ghi, cell.dhi, cell.zenith
+        ).fillna(0)
+        frames.append(cell)
+    return pd.concat(frames).sort_index()
+
+
+if __name__ == "__main__":
+    ds = era5_year()
+    runs = [
+        ("without solar position", format_pvlib),
+        ("vectorized", lambda d: format_pvlib(d, solar_position=True)),
+    ]
+    if pvlib is not None:
+        runs.append(("per cell (pvlib)", per_cell))
+    for name, func in runs:
+        start = time.perf_counter()
+        func(ds)
+        print(
+            "{:24s}: {:.2f} s for {} cells".format(
+                name, time.perf_counter() - start, N_CELLS ** 2
+            )
+        )
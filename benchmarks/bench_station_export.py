@@ -0,0 +1,123 @@
+"""
+Compare the time to read a weather station export with two years of
+minute data into hourly values of the wefesiteanalyst layout
+- read and clean up: `pd.read_csv` of the whole file, conversion of the
+  columns to numbers and resampling, as done in the Costa Rica example
+  (with an explicit time format, without it pandas falls back to parsing
+  each time stamp on its own, which takes more than a minute),
+- streamed: `read_station_export`.
+
+run with `python benchmarks/bench_station_export.py`
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from weather_station import read_station_export  # noqa: E402
+
+N_YEARS = 2
+COLUMNS = [
+    "Barometer - in Hg",
+    "Temp - °F",
+    "Hohe Temp - °F",
+    "Niedrige Temp - °F",
+    "Hum - %",
+    "Taupunkt - °F",
+    "Windgeschwindigkeit - mph",
+    "Windrichtung",
+    "Regen - in",
+    "Regenrate - in/h",
+    "Sonneneinstr - W/m^2",
+    "Solarenergie - Ly",
+    "ET - in",
+    "UV-Index",
+]
+
+
+def write_export(filename):
+    times = pd.date_range("2021-01-01", periods=525600 * N_YEARS, freq="min")
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(
+        rng.uniform(0, 100, (len(times), len(COLUMNS))).round(2),
+        columns=COLUMNS,
+    )
+    frame["Windrichtung"] = "WSW"
+    temperature = frame["Temp - °F"].astype(str)
+    temperature[rng.random(len(times)) < 0.01] = "--"
+    frame["Temp - °F"] = temperature
+    frame.insert(
+        0,
+        "Date & Time",
+        times.strftime("%m/%d/%y %I:%M %p").str.lstrip("0"),
+    )
+    with open(filename, "w", encoding="latin-1", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(["Benchmark Station"])
+        writer.writerow(["1/1/21 12:00 AM : 2 Years"])
+        writer.writerow([""] + ["Gateway"] * len(COLUMNS))
+        writer.writerow([""] + ["Vantage Pro2"] * len(COLUMNS))
+        writer.writerow([""] * (len(COLUMNS) + 1))
+    frame.to_csv(
+        filename,
+        mode="a",
+        index=False,
+        quoting=csv.QUOTE_ALL,
+        encoding="latin-1",
+    )
+
+
+def read_and_clean_up(filename):
+    data = pd.read_csv(filename, skiprows=5, encoding="latin-1")
+    data.index = pd.to_datetime(
+        data["Date & Time"], format="%m/%d/%y %I:%M %p"
+    )
+    columns = {
+        "Temp - °F": "t_air",
+        "Windgeschwindigkeit - mph": "windspeed",
+        "Regen - in": "tp",
+        "Sonneneinstr - W/m^2": "ghi",
+        "ET - in": "e",
+    }
+    data = data[list(columns)].rename(columns=columns)
+    data = data.apply(pd.to_numeric, errors="coerce")
+    hourly = data.resample("h", label="right", closed="right")
+    hourly = pd.concat(
+        [
+            hourly[["t_air", "windspeed", "ghi"]].mean(),
+            hourly[["tp", "e"]].sum(),
+        ],
+        axis=1,
+    )
+    hourly["t_air"] = (hourly["t_air"] - 32) * 5 / 9
+    hourly["windspeed"] *= 0.44704
+    hourly[["tp", "e"]] *= 25.4
+    return hourly
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "export.csv")
+        write_export(filename)
+
+        start = time.perf_counter()
+        reference = read_and_clean_up(filename)
+        clean_up = time.perf_counter() - start
+
+        start = time.perf_counter()
+        streamed = read_station_export(filename)
+        stream = time.perf_counter() - start
+
+    np.testing.assert_allclose(
+        streamed["t_air"], reference["t_air"], rtol=1e-9
+    )
+    print(
+        "{} years of minute data: read and clean up {:.1f} s, "
+        "streamed {:.1f} s".format(N_YEARS, clean_up, stream)
+    )
@@ -0,0 +1,96 @@
+"""
+Compare the time to build the typical meteorological year of a regional
+grid from ten years of hourly data
+- per cell: the Finkelstein-Schafer selection of each cell with pandas
+  (timed on a sample of cells and extrapolated to the grid), which is also
+  used to check the selected years,
+- at once: `typical_meteorological_year` over all cells.
+
+run with `python benchmarks/bench_tmy.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5_tmy import TMY_WEIGHTS  # noqa: E402
+from era5_tmy import typical_meteorological_year  # noqa: E402
+
+N_CELLS = 10
+N_YEARS = 10
+N_SAMPLE = 5
+
+
+def weather_frame():
+    times = pd.date_range(
+        "2005", periods=8760 * N_YEARS + 24 * 3, freq="h", tz="UTC"
+    )
+    index = pd.MultiIndex.from_product(
+        [
+            times,
+            11 - 0.25 * np.arange(N_CELLS),
+            -86 + 0.25 * np.arange(N_CELLS),
+        ],
+        names=["time", "latitude", "longitude"],
+    )
+    rng = np.random.default_rng(0)
+    columns = ["ghi", "t_air", "e", "tp", "windspeed"]
+    return pd.DataFrame(
+        rng.gamma(2.0, 1.0, (len(index), len(columns))),
+        index=index,
+        columns=columns,
+    )
+
+
+def per_cell(df, cells):
+    selected = {}
+    total = sum(w for _, _, w in TMY_WEIGHTS.values())
+    for cell in cells:
+        series = df.xs(cell, level=["latitude", "longitude"])
+        daily = pd.DataFrame(
+            {
+                name: series[column].resample("D").agg(how)
+                for name, (column, how, _) in TMY_WEIGHTS.items()
+            }
+        )
+        for month in range(1, 13):
+            month_data = daily[daily.index.month == month]
+            scores = {}
+            for year, year_data in month_data.groupby(month_data.index.year):
+                score = 0
+                for name, (_, _, weight) in TMY_WEIGHTS.items():
+                    pooled = np.sort(month_data[name].values)
+                    own = np.sort(year_data[name].values)
+                    cdf_long = np.searchsorted(pooled, own, "right")
+                    cdf_own = np.searchsorted(own, own, "right")
+                    score += weight / total * np.mean(
+                        np.abs(cdf_own / len(own) - cdf_long / len(pooled))
+                    )
+                scores[year] = score
+            selected[cell + (month,)] = min(scores, key=scores.get)
+    return selected
+
+
+if __name__ == "__main__":
+    df = weather_frame()
+    n_cells = N_CELLS ** 2
+    cells = [(11 - 0.25 * i, -86 + 0.25 * i) for i in range(N_SAMPLE)]
+
+    start = time.perf_counter()
+    expected = per_cell(df, cells)
+    loop = (time.perf_counter() - start) / N_SAMPLE * n_cells
+
+    start = time.perf_counter()
+    _, selection = typical_meteorological_year(df)
+    at_once = time.perf_counter() - start
+
+    for (lat, lon, month), year in expected.items():
+        assert selection.loc[(lat, lon), month] == year
+    print(
+        "{} cells, {} years: per cell {:.1f} s (extrapolated), "
+        "at once {:.1f} s".format(n_cells, N_YEARS, loop, at_once)
+    )
@@ -0,0 +1,80 @@
+"""
+Compare the time to compute the hub-height wind resource of a regional grid
+with three years of hourly data
+- per cell: hub-height extrapolation and a Weibull fit with scipy for each
+  cell, as done outside of the library before (timed on a sample of cells
+  and extrapolated to the grid),
+- at once: `wind_resource` over all cells.
+
+run with `python benchmarks/bench_wind_resource.py`
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy import stats
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from era5_wind import wind_resource  # noqa: E402
+
+N_CELLS = 20
+N_YEARS = 3
+N_SAMPLE = 10
+
+
+def era5_wind_data():
+    times = pd.date_range("2000", periods=8760 * N_YEARS, freq="h")
+    shape = (len(times), N_CELLS, N_CELLS)
+    rng = np.random.default_rng(0)
+    ws100 = 8 * rng.weibull(2.0, shape).astype("float32")
+    direction = rng.uniform(0, 2 * np.pi, shape).astype("float32")
+    dims = ("time", "latitude", "longitude")
+    return xr.Dataset(
+        {
+            "u100": (dims, ws100 * np.cos(direction)),
+            "v100": (dims, ws100 * np.sin(direction)),
+            "u10": (dims, 0.6 * ws100 * np.cos(direction)),
+            "v10": (dims, 0.6 * ws100 * np.sin(direction)),
+            "fsr": (dims, np.full(shape, 0.1, dtype="float32")),
+            "sp": (dims, np.full(shape, 101325, dtype="float32")),
+            "t2m": (dims, np.full(shape, 288.15, dtype="float32")),
+        },
+        coords={
+            "time": times,
+            "latitude": 11 - 0.25 * np.arange(N_CELLS),
+            "longitude": -86 + 0.25 * np.arange(N_CELLS),
+        },
+    )
+
+
+def per_cell(ds, cells):
+    results = []
+    for i, j in cells:
+        cell = ds.isel(latitude=i, longitude=j).to_dataframe()
+        ws100 = np.hypot(cell.u100, cell.v100)
+        ws_hub = ws100 * np.log(120 / cell.fsr) / np.log(100 / cell.fsr)
+        k, _, c = stats.weibull_min.fit(ws_hub, floc=0)
+        rho = cell.sp / (287.05 * cell.t2m)
+        results.append((k, c, (0.5 * rho * ws_hub ** 3).mean()))
+    return results
+
+
+if __name__ == "__main__":
+    ds = era5_wind_data()
+    n_cells = N_CELLS ** 2
+
+    start = time.perf_counter()
+    per_cell(ds, [(i, i) for i in range(N_SAMPLE)])
+    loop = (time.perf_counter() - start) / N_SAMPLE * n_cells
+
+    start = time.perf_counter()
+    wind_resource(ds, hub_height=120)
+    at_once = time.perf_counter() - start
+    print(
+        "{} cells, {} years: per cell {:.1f} s (extrapolated), "
+        "at once {:.1f} s".format(n_cells, N_YEARS, loop, at_once)
+    )
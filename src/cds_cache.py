@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def request_hash(dataset_name, request):
+    """
+    Compute a canonical hash of a CDS request
+
+    Two requests which only differ by the order of their keys map to the same
+    hash, the order of the values within a list is kept as is.
+    :param dataset_name: (str) short name of the dataset of the CDS
+    :param request: (dict) full request sent to the CDS
+    :return: (str) hexadecimal sha1 digest of the request
+    """
+    canonical = json.dumps(
+        {"dataset_name": dataset_name, "request": request},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class CDSRequestCache:
+    """
+    Content-addressed on-disk cache for files downloaded from the CDS
+
+    Each downloaded file is stored under the hash of the request which
+    produced it (see request_hash()). A cache hit hard links (or copies, if
+    linking is not possible) the cached file to the requested target file.
+    The least recently used files are evicted once the total size of the
+    cache exceeds `max_bytes`.
+    :param cache_dir: (str) folder in which the cached files are stored
+    :param max_bytes: (int or None) disk budget of the cache in bytes, None
+        for an unbounded cache
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".nc")
+
+    def fetch(self, key, target_file):
+        """
+        Provide the cached file for `key` at `target_file`
+        :param key: (str) hash of the request
+        :param target_file: (str) name of the file to provide locally
+        :return: (bool) True in case of a cache hit, False otherwise
+        """
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return False
+            self.hits += 1
+            # mark the file as recently used
+            os.utime(path)
+        _link_or_copy(path, target_file)
+        logger.info(
+            "Using cached CDS request {} for {}".format(key, target_file)
+        )
+        return True
+
+    def store(self, key, source_file):
+        """
+        Add a downloaded file to the cache and evict old files if needed
+        :param key: (str) hash of the request
+        :param source_file: (str) name of the downloaded file
+        """
+        path = self._path(key)
+        tmp_path = path + ".part"
+        _link_or_copy(source_file, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used files exceeding the disk budget"""
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".nc"):
+                    continue
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+                logger.info("Evicted cached CDS request {}".format(name))
+
+    def stats(self):
+        """
+        :return: (dict) number of hits and misses and the size of the cache
+            in bytes
+        """
+        size = sum(
+            os.path.getsize(os.path.join(self.cache_dir, name))
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".nc")
+        )
+        return {"hits": self.hits, "misses": self.misses, "bytes": size}
+
+
+def _link_or_copy(source_file, target_file):
+    """Hard link `source_file` to `target_file`, copy it if linking fails"""
+    if os.path.exists(target_file):
+        os.remove(target_file)
+    try:
+        os.link(source_file, target_file)
+    except OSError:
+        shutil.copyfile(source_file, target_file)
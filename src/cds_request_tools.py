@@ -1,18 +1,34 @@
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
 
 import cdsapi
 import numpy as np
+import requests
 import xarray as xr
 
+from cds_cache import request_hash
+
 logger = logging.getLogger(__name__)
 
+# leading bytes of netCDF classic, 64-bit offset, 64-bit data and netCDF-4
+# (HDF5) files
+NETCDF_MAGIC_NUMBERS = (b"CDF\x01", b"CDF\x02", b"CDF\x05", b"\x89HDF")
+
+# the netCDF/HDF5 libraries are not thread safe, calls to them from the
+# threads of concurrent downloads must hold this lock
+NETCDF_LOCK = threading.Lock()
+
 
 def _get_cds_data(
     target_file,
     dataset_name="reanalysis-era5-single-levels",
     cds_client=None,
+    cache=None,
     **cds_params,
 ):
     """
@@ -29,13 +45,12 @@ def _get_cds_data(
     :param target_file: (str) name of the file to save downloaded locally
     :param cds_client: handle to CDS client (if none is provided, then it is
         created)
+    :param cache: (cds_cache.CDSRequestCache or None) if provided, an
+        identical request already downloaded is served from this cache
+        instead of the CDS and new downloads are added to it
     :param cds_params: (dict) parameter to pass to the CDS request
     """
 
-    # https://cds.climate.copernicus.eu/api-how-to
-    if cds_client is None:
-        cds_client = cdsapi.Client()
-
     # Default request
     request = {
         "format": "netcdf",
@@ -75,13 +90,24 @@ def _get_cds_data(
         request
     ), "Need to specify at least 'variable', 'year' and 'month'"
 
-    # Send the data request to the server
-    result = cds_client.retrieve(dataset_name, request)
-
     # Create a file in a secure way if a target filename was not provided
     if target_file.split(".")[-1] != "nc":
         target_file = target_file + ".nc"
 
+    # Skip the round trip to the server if the same request was already
+    # downloaded
+    if cache is not None:
+        key = request_hash(dataset_name, request)
+        if cache.fetch(key, target_file):
+            return
+
+    # https://cds.climate.copernicus.eu/api-how-to
+    if cds_client is None:
+        cds_client = cdsapi.Client()
+
+    # Send the data request to the server
+    result = cds_client.retrieve(dataset_name, request)
+
     logger.info(
         "Downloading request for {} variables to {}".format(
             len(request["variable"]), target_file
@@ -89,7 +115,118 @@ def _get_cds_data(
     )
 
     # Download the data in the target file
-    result.download(target_file)
+    _download_result(result, target_file)
+
+    if cache is not None:
+        cache.store(key, target_file)
+
+
+def _check_netcdf_file(filename, size=None):
+    """
+    Check that a downloaded file is complete and a readable netCDF file
+    :param filename: (str) name of the file to check
+    :param size: (int or None) expected size of the file in bytes
+    :raise IOError: if the file is truncated or not a readable netCDF file
+    """
+    actual_size = os.path.getsize(filename)
+    if size is not None and actual_size != size:
+        raise IOError(
+            "Download of {} is incomplete: {} byte(s) out of {}".format(
+                filename, actual_size, size
+            )
+        )
+    with open(filename, "rb") as f:
+        if not f.read(8).startswith(NETCDF_MAGIC_NUMBERS):
+            raise IOError("{} is not a netCDF file".format(filename))
+    try:
+        with NETCDF_LOCK:
+            xr.open_dataset(filename).close()
+    except Exception as e:
+        raise IOError(
+            "{} is not a readable netCDF file".format(filename)
+        ) from e
+
+
+def _download_result(
+    result, target_file, max_tries=5, retry_sleep=10, chunk_size=2 ** 16
+):
+    """
+    Download the result of a CDS request in a resumable and verified way
+
+    The data is streamed into the partial file `<target_file>.part`. If the
+    connection drops, the download resumes from the last byte received with
+    an HTTP range request (a partial file left by a former call is resumed
+    as well). The complete file is checked for its size and its netCDF
+    integrity (see _check_netcdf_file()) before being renamed to
+    `target_file`.
+    If `result` does not provide the `location` and `content_length` of the
+    file to download (like the results of cdsapi.Client().retrieve() do),
+    its own `download` method is used to fill the partial file.
+    :param result: result of a CDS request
+    :param target_file: (str) name of the file to save downloaded locally
+    :param max_tries: (int) maximal number of connections to the server
+    :param retry_sleep: (number) seconds to wait before reconnecting
+    :param chunk_size: (int) number of bytes read at once from the stream
+    :raise IOError: if the file can't be downloaded entirely or is not a
+        readable netCDF file (server errors are retried, client errors are
+        raised as requests.HTTPError)
+    """
+    part_file = target_file + ".part"
+    url = getattr(result, "location", None)
+    size = getattr(result, "content_length", None)
+
+    if url is None or size is None:
+        result.download(part_file)
+    else:
+        session = getattr(result, "session", None) or requests.Session()
+        for _ in range(max_tries):
+            offset = 0
+            if os.path.exists(part_file):
+                offset = os.path.getsize(part_file)
+            if offset == size:
+                break
+            if offset > size:
+                os.remove(part_file)
+                offset = 0
+            headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+            try:
+                with session.get(
+                    url, stream=True, headers=headers, timeout=60
+                ) as r:
+                    r.raise_for_status()
+                    # restart from scratch if the server ignores the range
+                    mode = "ab" if r.status_code == 206 else "wb"
+                    with open(part_file, mode) as f:
+                        for chunk in r.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout,
+                requests.exceptions.HTTPError,
+            ) as e:
+                # client errors (4xx) don't go away by retrying
+                if isinstance(e, requests.exceptions.HTTPError) and (
+                    e.response is None or e.response.status_code < 500
+                ):
+                    raise
+                logger.warning(
+                    "Download of {} interrupted: {}".format(target_file, e)
+                )
+                time.sleep(retry_sleep)
+
+    if not os.path.exists(part_file):
+        raise IOError(
+            "Download of {} failed: no data received".format(target_file)
+        )
+    try:
+        _check_netcdf_file(part_file, size)
+    except IOError:
+        # keep an incomplete file to resume it later
+        if size is None or os.path.getsize(part_file) == size:
+            os.remove(part_file)
+        raise
+    os.replace(part_file, target_file)
 
 
 def _format_cds_request_datespan(start_date, end_date):
@@ -136,6 +273,104 @@ def _format_cds_request_datespan(start_date, end_date):
     return answer
 
 
+def _plan_cds_request_datespan(start_date, end_date):
+    """
+    Split a date span into the smallest set of rectangular CDS requests
+
+    A CDS request covers the cartesian product of its years, months and days.
+    The dates of the span are grouped into blocks of years, months and days
+    whose cartesian product contains exactly the dates of the span (days
+    which do not exist in a month, e.g. 31st of April, are ignored by the
+    CDS). Months of a year with the same days are grouped, then years with
+    the same months and days are grouped.
+    :param start_date: (str) start date of the range in YYYY-MM-DD format
+    :param end_date: (str) end date of the range in YYYY-MM-DD format
+    :return: a list of dicts with the years, months and days of each block as
+        lists of string (see _format_cds_request_datespan())
+    """
+    fmt = "%Y-%m-%d"
+    start_dt = datetime.strptime(start_date, fmt)
+    end_dt = datetime.strptime(end_date, fmt)
+    if end_dt < start_dt:
+        start_dt, end_dt = end_dt, start_dt
+
+    # days covered within each (year, month) of the span, a fully covered
+    # month is represented by the days 1 to 31
+    month_days = {}
+    for sub_start, sub_end in _split_datespan(
+        start_dt.strftime(fmt), end_dt.strftime(fmt)
+    ):
+        sub_start_dt = datetime.strptime(sub_start, fmt)
+        sub_end_dt = datetime.strptime(sub_end, fmt)
+        first_day, last_day = sub_start_dt.day, sub_end_dt.day
+        if first_day == 1 and (sub_end_dt + timedelta(days=1)).day == 1:
+            last_day = 31
+        month_days[(sub_start_dt.year, sub_start_dt.month)] = tuple(
+            range(first_day, last_day + 1)
+        )
+
+    # group the months of each year which share the same days
+    year_blocks = {}
+    for (year, month), days in month_days.items():
+        year_blocks.setdefault(year, {}).setdefault(days, []).append(month)
+
+    # group the years which share the same months and days
+    blocks = {}
+    for year, day_groups in year_blocks.items():
+        for days, months in day_groups.items():
+            blocks.setdefault((tuple(months), days), []).append(year)
+
+    return [
+        {
+            "year": ["%4d" % y for y in years],
+            "month": ["%02d" % m for m in months],
+            "day": ["%02d" % d for d in days],
+        }
+        for (months, days), years in blocks.items()
+    ]
+
+
+def _count_request_days(request_dates):
+    """
+    Count the calendar days covered by the cartesian product of a request
+    :param request_dates: (dict) years, months and days of a CDS request as
+        lists of string
+    :return: (int) number of existing dates requested
+    """
+    count = 0
+    for year in request_dates["year"]:
+        for month in request_dates["month"]:
+            month_dt = datetime(int(year), int(month), 1)
+            month_index = month_dt.year * 12 + month_dt.month
+            n_days = (
+                datetime(month_index // 12, month_index % 12 + 1, 1)
+                - month_dt
+            ).days
+            count += sum(int(d) <= n_days for d in request_dates["day"])
+    return count
+
+
+def plan_cds_request_datespan(start_date, end_date):
+    """
+    Plan the CDS requests needed to download a date span
+    :param start_date: (str) start date of the range in YYYY-MM-DD format
+    :param end_date: (str) end date of the range in YYYY-MM-DD format
+    :return: a dict with the planned blocks of years, months and days (see
+        _plan_cds_request_datespan()) and the number of fields (days) per
+        variable and time step requested by the planned blocks and by a
+        single request for the cartesian product of all years, months and
+        days of the span (see _format_cds_request_datespan())
+    """
+    blocks = _plan_cds_request_datespan(start_date, end_date)
+    return {
+        "blocks": blocks,
+        "planned_fields": sum(_count_request_days(b) for b in blocks),
+        "naive_fields": _count_request_days(
+            _format_cds_request_datespan(start_date, end_date)
+        ),
+    }
+
+
 def _format_cds_request_area(
     latitude_span=None, longitude_span=None, grid=None
 ):
@@ -148,7 +383,8 @@ def _format_cds_request_area(
     In this grid the earth is modelled by a sphere with radius
     R_E = 6367.47 km. Latitude values in the range [-90, 90] relative to the
     equator and longitude values in the range [-180, 180]
-    relative to the Greenwich Prime Meridian [1].
+    relative to the Greenwich Prime Meridian [1]. The bounds of the area are
+    snapped outwards onto the grid points (see snap_to_axis()).
     References:
     [1] https://confluence.ecmwf.int/display/CKB/ERA5%3A+What+is+the+spatial+reference
     [2] https://confluence.ecmwf.int/display/UDOC/Post-processing+keywords
@@ -178,23 +414,98 @@ def _format_cds_request_area(
             longitude_span[1],
         ]
     elif latitude_span is None and longitude_span is not None:
-        area = [90, longitude_span[0], -90, latitude_span[1]]
+        area = [90, longitude_span[0], -90, longitude_span[1]]
     elif latitude_span is not None and longitude_span is None:
         area = [latitude_span[0], -180, latitude_span[1], 180]
     else:
         area = []
 
+    if area:
+        # Snap the bounds outwards onto the global grid, so that the grid
+        # points of the area are those of the global grid (see
+        # snap_to_grid())
+        n_lat = int(np.ceil(180.0 / grid[0] - 1e-9)) + 1
+        n_lon = int(np.ceil(360.0 / grid[1] - 1e-9)) + 1
+        north, south = (
+            90 - grid[0] * snap_to_axis(v, 90, -grid[0], n_lat, rounding)
+            for v, rounding in ((area[0], "down"), (area[2], "up"))
+        )
+        west, east = (
+            -180 + grid[1] * snap_to_axis(v, -180, grid[1], n_lon, rounding)
+            for v, rounding in ((area[1], "down"), (area[3], "up"))
+        )
+        area = [round(float(e), 6) for e in (north, west, south, east)]
+
     # Format the 'grid' keyword of the CDS request as
     # lat_resolution/lon_resolution
     answer["grid"] = "%.2f/%.2f" % (grid[0], grid[1])
 
     # Format the 'area' keyword of the CDS request as N/W/S/E
     if area:
-        answer["area"] = "/".join(str(e) for e in area)
+        answer["area"] = "/".join("{:g}".format(e) for e in area)
 
     return answer
 
 
+def snap_to_axis(values, start, step, size, rounding="nearest"):
+    """
+    Find the indices of the nearest points of a regular axis
+    :param values: (array_like) coordinates to snap
+    :param start: (number) first coordinate of the axis
+    :param step: (number) signed distance between two points of the axis
+    :param size: (int) number of points of the axis
+    :param rounding: (str) 'nearest' for the nearest point, 'down' or 'up'
+        for the nearest point at a lower or higher index
+    :return: (numpy.ndarray of int) index of the snapped axis point of each
+        value, values outside of the axis are snapped to its first or last
+        point
+    """
+    position = (np.asarray(values, dtype=float) - start) / step
+    if rounding == "nearest":
+        idx = np.rint(position)
+    elif rounding == "down":
+        idx = np.floor(position + 1e-9)
+    elif rounding == "up":
+        idx = np.ceil(position - 1e-9)
+    else:
+        raise ValueError(
+            "Unknown value for `rounding`. It must be either 'nearest', "
+            "'down' or 'up'."
+        )
+    return np.clip(idx, 0, size - 1).astype(int)
+
+
+def snap_to_grid(latitude, longitude, grid=None):
+    """
+    Find the nearest points of the global CDS grid for many positions
+
+    The latitudes of the grid range from 90 deg down to (excluded) -90 deg,
+    the longitudes from -180 deg up to (excluded) 180 deg, see
+    _format_cds_request_position().
+    :param latitude: (number or array_like) latitudes in the range [-90, 90]
+    :param longitude: (number or array_like) longitudes in the range
+        [-180, 180]
+    :param grid: (list of float) provide the latitude and longitude grid
+        resolutions in deg. It needs to be an integer fraction of 90 deg.
+    :return: a tuple of numpy arrays with the latitude indices, the longitude
+        indices, the latitudes and the longitudes of the nearest grid points
+    """
+    # Default value of the grid
+    if grid is None:
+        grid = [0.25, 0.25]
+
+    n_lat = int(np.ceil(180.0 / grid[0] - 1e-9))
+    n_lon = int(np.ceil(360.0 / grid[1] - 1e-9))
+    lat_idx = snap_to_axis(latitude, 90, -grid[0], n_lat)
+    lon_idx = snap_to_axis(longitude, -180, grid[1], n_lon)
+    return (
+        lat_idx,
+        lon_idx,
+        90 + lat_idx * -grid[0],
+        -180 + lon_idx * grid[1],
+    )
+
+
 def _format_cds_request_position(latitude, longitude, grid=None):
     """
     Reduce the area of a CDS request to a single GIS point on the earth grid
@@ -219,32 +530,142 @@ def _format_cds_request_position(latitude, longitude, grid=None):
         request
     """  # noqa: E501
 
-    # Default value of the grid
-    if grid is None:
-        grid = [0.25, 0.25]
-
     # Find the nearest point on the grid corresponding to the given latitude
     # and longitude
-    grid_point = xr.Dataset(
-        {
-            "lat": np.arange(90, -90, -grid[0]),
-            "lon": np.arange(-180, 180.0, grid[1]),
-        }
-    ).sel(lat=latitude, lon=longitude, method="nearest")
+    _, _, lat, lon = snap_to_grid(latitude, longitude, grid)
 
     # Prepare an area which consists of only one grid point
-    lat, lon = [float(grid_point.coords[s]) for s in ("lat", "lon")]
+    lat, lon = float(lat), float(lon)
     return _format_cds_request_area(
         latitude_span=[lat, lat], longitude_span=[lon, lon], grid=grid
     )
 
 
+def _split_datespan(start_date, end_date, chunk_months=1):
+    """
+    Split a date span into consecutive sub-spans of whole calendar months
+
+    The first and last sub-spans are clipped to the given start and end dates
+    so that the union of the sub-spans is exactly the original date span.
+    :param start_date: (str) start date of the range in YYYY-MM-DD format
+    :param end_date: (str) end date of the range in YYYY-MM-DD format
+    :param chunk_months: (int) number of calendar months per sub-span
+    :return: a list of (start_date, end_date) tuples in YYYY-MM-DD format
+    """
+    if chunk_months < 1:
+        raise ValueError("`chunk_months` must be a positive integer")
+
+    fmt = "%Y-%m-%d"
+    start_dt = datetime.strptime(start_date, fmt)
+    end_dt = datetime.strptime(end_date, fmt)
+    if end_dt < start_dt:
+        start_dt, end_dt = end_dt, start_dt
+
+    answer = []
+    cur_dt = start_dt
+    while cur_dt <= end_dt:
+        # first day of the month following the current chunk
+        month_index = cur_dt.year * 12 + cur_dt.month - 1 + chunk_months
+        next_dt = datetime(month_index // 12, month_index % 12 + 1, 1)
+        chunk_end_dt = min(next_dt - timedelta(days=1), end_dt)
+        answer.append((cur_dt.strftime(fmt), chunk_end_dt.strftime(fmt)))
+        cur_dt = next_dt
+    return answer
+
+
+def _merge_netcdf_files(source_files, target_file):
+    """
+    Merge netCDF files covering disjoint sets of time steps into one file
+
+    The merged file is first written next to `target_file` and then moved in
+    place, so that `target_file` is never left half written.
+    :param source_files: (list of str) netCDF files to merge
+    :param target_file: (str) name of the merged netCDF file
+    """
+    datasets = [xr.open_dataset(f) for f in source_files]
+    # recent versions of the CDS name the time dimension 'valid_time'
+    time_dim = "valid_time" if "valid_time" in datasets[0].dims else "time"
+    try:
+        merged = xr.concat(
+            datasets, dim=time_dim, combine_attrs="override"
+        ).sortby(time_dim)
+        # the ERA5 files are packed to int16 with their own scale and offset,
+        # which would clip the values of the other files if kept
+        for da in merged.data_vars.values():
+            for key in ("scale_factor", "add_offset", "dtype", "_FillValue"):
+                da.encoding.pop(key, None)
+        tmp_file = target_file + ".part"
+        merged.to_netcdf(tmp_file)
+    finally:
+        for ds in datasets:
+            ds.close()
+    os.replace(tmp_file, target_file)
+
+
+def _get_cds_data_blocks(
+    target_file,
+    request_dates,
+    max_workers=4,
+    **cds_params,
+):
+    """
+    Download data from the CDS as concurrent sub-requests
+
+    Each sub-request is retrieved by _get_cds_data() in a pool of at most
+    `max_workers` threads and the partial files are merged into
+    `target_file` (see _merge_netcdf_files()).
+    :param target_file: (str) name of the file to save downloaded locally
+    :param request_dates: (list of dict) years, months and days of each
+        sub-request as lists of string
+    :param max_workers: (int) maximal number of sub-requests running
+        concurrently
+    :param cds_params: (dict) parameter to pass to each CDS sub-request,
+        the `cds_client` handle (if any) is shared between the sub-requests
+    """
+    if target_file.split(".")[-1] != "nc":
+        target_file = target_file + ".nc"
+
+    block_files = [
+        "{}.{:03d}.nc".format(target_file[: -len(".nc")], i)
+        for i in range(len(request_dates))
+    ]
+    logger.info(
+        "Splitting request into {} sub-requests".format(len(request_dates))
+    )
+
+    def retrieve_block(dates, block_file):
+        params = dict(cds_params)
+        params.update(dates)
+        _get_cds_data(target_file=block_file, **params)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(retrieve_block, dates, block_file)
+                for dates, block_file in zip(request_dates, block_files)
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        _merge_netcdf_files(block_files, target_file)
+    finally:
+        for block_file in block_files:
+            if os.path.exists(block_file):
+                os.remove(block_file)
+
+
 def get_cds_data_from_datespan_and_position(
     start_date,
     end_date,
     latitude=None,
     longitude=None,
     grid=None,
+    chunk_months=None,
+    max_workers=4,
     **cds_params,
 ):
     """
@@ -271,6 +692,14 @@ def get_cds_data_from_datespan_and_position(
         * None: No geographical subset is selected.
     :param grid: (list of float) provide the latitude and longitude grid
         resolutions in deg. It needs to be an integer fraction of 90 deg.
+    :param chunk_months: (int or None) if provided, the datespan is split
+        into sub-requests of `chunk_months` calendar months which are queued
+        concurrently at the CDS and merged into `target_file` afterwards.
+        If None, the whole datespan is sent as a single request.
+    :param max_workers: (int) maximal number of sub-requests running
+        concurrently, used if the datespan can't be covered by a single
+        request (see _plan_cds_request_datespan()) or if `chunk_months` is
+        provided
     :param dataset_name: (str) short name of the dataset of the CDS. To find
         it, click on a dataset found in
         https://cds.climate.copernicus.eu/cdsapp#!/search?type=dataset and go
@@ -281,14 +710,12 @@ def get_cds_data_from_datespan_and_position(
         locally
     :param cds_client: handle to CDS client (if none is provided, then it is
         created)
+    :param cache: (cds_cache.CDSRequestCache or None) cache of previously
+        downloaded requests, see _get_cds_data()
     :param cds_params: (dict) parameter to pass to the CDS request
     :return: CDS data in an xarray format
     """
 
-    # Get the formatted year, month and day parameter from the datespan
-    request_dates = _format_cds_request_datespan(start_date, end_date)
-    cds_params.update(request_dates)
-
     # Get the area corresponding to a position on the globe for a given grid
     # size
     # if both longitude and latitude are provided as number, select single
@@ -314,4 +741,31 @@ def get_cds_data_from_datespan_and_position(
             )
     # in any other case no geographical subset is selected
 
-    _get_cds_data(**cds_params)
\ No newline at end of file
+    # Plan the formatted year, month and day parameters of the requests
+    # from the datespan
+    if chunk_months is not None:
+        chunks = _split_datespan(start_date, end_date, chunk_months)
+    else:
+        chunks = [(start_date, end_date)]
+    request_dates = []
+    for chunk in chunks:
+        request_dates.extend(_plan_cds_request_datespan(*chunk))
+    logger.info(
+        "Requesting {} days in {} request(s) instead of {} days".format(
+            sum(_count_request_days(d) for d in request_dates),
+            len(request_dates),
+            _count_request_days(
+                _format_cds_request_datespan(start_date, end_date)
+            ),
+        )
+    )
+
+    if len(request_dates) == 1:
+        cds_params.update(request_dates[0])
+        _get_cds_data(**cds_params)
+    else:
+        _get_cds_data_blocks(
+            request_dates=request_dates,
+            max_workers=max_workers,
+            **cds_params,
+        )
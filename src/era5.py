@@ -1,11 +1,89 @@
-import geopandas as gpd
+import glob
+import os
+
 import numpy as np
 import pandas as pd
+import shapely
 import xarray as xr
-from shapely.geometry import Point
 
 from cds_request_tools import get_cds_data_from_datespan_and_position
 
+# names of the ERA5 variables in CDS requests and in the downloaded netCDF
+# files
+ERA5_NETCDF_NAMES = {
+    "100u": "u100",
+    "100v": "v100",
+    "10u": "u10",
+    "10v": "v10",
+    "2t": "t2m",
+    "2d": "d2m",
+    "fsr": "fsr",
+    "sp": "sp",
+    "fdir": "fdir",
+    "ssrd": "ssrd",
+    "e": "e",
+    "tp": "tp",
+}
+
+# ERA5 variables (CDS request names) consumed by the formatters of this
+# module, by value of the `lib` parameter of `weather_df_from_era5`
+FORMATTER_VARIABLES = {
+    "pvlib": ["fdir", "ssrd", "2t", "10u", "10v"],
+    "windpowerlib": ["100u", "100v", "10u", "10v", "2t", "fsr", "sp"],
+    "wefesiteanalyst": ["ssrd", "2t", "10u", "10v", "e", "tp"],
+}
+
+# ERA5 variables (CDS request names) of download presets which are not
+# converted by a formatter of this module
+PRESET_VARIABLES = {
+    "et0": ["2t", "2d", "10u", "10v", "ssrd", "sp"],
+}
+
+
+# shift of the time stamps applied by the formatters of this module (see
+# format_pvlib and format_windpowerlib)
+FORMATTER_TIME_SHIFT = {
+    "pvlib": pd.Timedelta(minutes=30),
+    "windpowerlib": pd.Timedelta(minutes=60),
+    "wefesiteanalyst": pd.Timedelta(0),
+}
+
+
+def formatter_variables(formatters):
+    """
+    Get the ERA5 variables needed by a set of formatters.
+    Parameters
+    ----------
+    formatters : str or list of str
+        Names of the formatters (keys of `FORMATTER_VARIABLES`) or presets
+        (keys of `PRESET_VARIABLES`). 'feedinlib' stands for both 'pvlib'
+        and 'windpowerlib'.
+    Returns
+    -------
+    list of str
+        Union of the ERA5 variables (CDS request names) of the formatters.
+    """
+    if isinstance(formatters, str):
+        formatters = [formatters]
+    answer = []
+    for formatter in formatters:
+        if formatter == "feedinlib":
+            answer.extend(formatter_variables(["pvlib", "windpowerlib"]))
+        elif formatter in FORMATTER_VARIABLES:
+            answer.extend(FORMATTER_VARIABLES[formatter])
+        elif formatter in PRESET_VARIABLES:
+            answer.extend(PRESET_VARIABLES[formatter])
+        else:
+            raise ValueError(
+                "Unknown formatter '{}'. It must be one of {}.".format(
+                    formatter,
+                    ["feedinlib"]
+                    + list(FORMATTER_VARIABLES)
+                    + list(PRESET_VARIABLES),
+                )
+            )
+    return list(dict.fromkeys(answer))
+
 
 def get_era5_data_from_datespan_and_position(
     start_date,
@@ -16,6 +94,11 @@ def get_era5_data_from_datespan_and_position(
     longitude=None,
     grid=None,
     cds_client=None,
+    chunk_months=None,
+    max_workers=4,
+    cache=None,
+    incremental=False,
+    formatters=None,
 ):
     """
     Download a netCDF file from the era5 weather data server for you position
@@ -33,7 +116,10 @@ def get_era5_data_from_datespan_and_position(
         necessary to use the pvlib, set `variable` to 'pvlib'. If you want to
         download all variables necessary to use the windpowerlib, set
         `variable` to 'windpowerlib'. To download both variable sets for pvlib
-        and windpowerlib, set `variable` to 'feedinlib'.
+        and windpowerlib, set `variable` to 'feedinlib'. The variables of the
+        WEFESiteAnalyst are downloaded with 'wefesiteanalyst', those of the
+        reference evapotranspiration (see `era5_et0`) with 'et0'. Any other
+        value is passed to the CDS request as is.
     latitude : numeric
         Latitude in the range [-90, 90] relative to the equator, north
         corresponds to positive latitude.
@@ -45,34 +131,180 @@ def get_era5_data_from_datespan_and_position(
         be an integer fraction of 90 deg.
     cds_client : cdsapi.Client()
         Handle to CDS client (if none is provided, then it is created)
+    chunk_months : int or None
+        If provided, the date span is split into sub-requests of
+        `chunk_months` calendar months which are retrieved concurrently and
+        merged into `target_file`. Defaults to None (single request).
+    max_workers : int
+        Maximal number of concurrent sub-requests if `chunk_months` is
+        provided. Defaults to 4.
+    cache : cds_cache.CDSRequestCache or None
+        Cache of previously downloaded requests. Identical requests are served
+        from the cache without contacting the CDS. Defaults to None.
+    incremental : bool
+        If True and `target_file` already exists, only the days of the date
+        span and the variables which are missing in `target_file` are
+        downloaded and merged into it. Defaults to False.
+    formatters : str or list of str or None
+        Formatters ('pvlib', 'windpowerlib', 'wefesiteanalyst') the data is
+        downloaded for. If provided, only the union of the ERA5 variables
+        they consume is downloaded and `variable` is ignored (see
+        `formatter_variables`). Defaults to None.
     Returns
     -------
     CDS data in an xarray format : xarray
     variable names in era5: https://confluence.ecmwf.int/display/CKB/ERA5%3A+data+documentation
     """
 
-    if variable == "pvlib":
-        variable = ["fdir", "ssrd", "2t", "10u", "10v"]
-    elif variable == "windpowerlib":
-        variable = ["100u", "100v", "10u", "10v", "2t", "fsr", "sp"]
-    elif variable == "wefesiteanalyst":
-         variable = ["ssrd", "2t", "10u", "10v", "e", "tp"]
-    elif variable == "feedinlib":
-        variable = [
-            "100u",
-            "100v",
-            "fsr",
-            "sp",
-            "fdir",
-            "ssrd",
-            "2t",
-            "10u",
-            "10v",
+    if formatters is not None:
+        variable = formatter_variables(formatters)
+    elif isinstance(variable, str) and (
+        variable == "feedinlib"
+        or variable in FORMATTER_VARIABLES
+        or variable in PRESET_VARIABLES
+    ):
+        variable = formatter_variables(variable)
+
+    cds_kwargs = dict(
+        latitude=latitude,
+        longitude=longitude,
+        grid=grid,
+        cds_client=cds_client,
+        chunk_months=chunk_months,
+        max_workers=max_workers,
+        cache=cache,
+    )
+    if target_file.split(".")[-1] != "nc":
+        target_file = target_file + ".nc"
+    if incremental and os.path.exists(target_file):
+        _update_era5_file(
+            start_date, end_date, target_file, variable, **cds_kwargs
+        )
+    else:
+        get_cds_data_from_datespan_and_position(
+            start_date=start_date,
+            end_date=end_date,
+            target_file=target_file,
+            variable=variable,
+            **cds_kwargs,
+        )
+
+
+def _day_ranges(days):
+    """
+    Group days into ranges of consecutive days
+    Parameters
+    ----------
+    days : pd.DatetimeIndex
+        Sorted days.
+    Returns
+    -------
+    list of tuple
+        First and last day of each range in YYYY-MM-DD format.
+    """
+    ranges = []
+    if len(days) == 0:
+        return ranges
+    # a new range starts wherever the gap to the previous day exceeds one day
+    breaks = np.flatnonzero(np.diff(days.values) > np.timedelta64(1, "D"))
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(days) - 1]])
+    for i, j in zip(starts, ends):
+        ranges.append(
+            (days[i].strftime("%Y-%m-%d"), days[j].strftime("%Y-%m-%d"))
+        )
+    return ranges
+
+
+def _update_era5_file(start_date, end_date, target_file, variable, **kwargs):
+    """
+    Download the days and variables missing in an existing ERA5 file.
+    The days of the date span with missing hourly time steps are downloaded
+    completely for all variables of the file and of `variable`, the
+    variables of `variable` missing in the file are downloaded for the days
+    already present in the file. Variables of the file which are not in
+    `ERA5_NETCDF_NAMES` are requested by their netCDF name. The
+    downloads are merged with the existing data into a temporary file which
+    then replaces `target_file`.
+    Parameters
+    ----------
+    start_date : str
+        Start date of the date span in YYYY-MM-DD format.
+    end_date : str
+        End date of the date span in YYYY-MM-DD format.
+    target_file : str
+        Name of the existing netCDF file.
+    variable : list of str
+        ERA5 variables (CDS request names) to provide in `target_file`.
+    kwargs :
+        Further parameters of `get_cds_data_from_datespan_and_position`.
+    """
+    netcdf_names = {v: k for k, v in ERA5_NETCDF_NAMES.items()}
+    with xr.open_dataset(target_file) as ds:
+        time_dim = "valid_time" if "valid_time" in ds.dims else "time"
+        existing_hours = pd.DatetimeIndex(ds[time_dim].values)
+        existing_vars = [netcdf_names.get(v, v) for v in ds.data_vars]
+        missing_vars = [
+            v for v in variable if ERA5_NETCDF_NAMES.get(v, v) not in ds
         ]
-    get_cds_data_from_datespan_and_position(**locals())
+
+    # compare the hourly time steps, so that partly present days (e.g. of
+    # an interrupted download) are completed as well
+    first_day, last_day = sorted(pd.to_datetime([start_date, end_date]))
+    requested_hours = pd.date_range(
+        first_day, last_day + pd.Timedelta(hours=23), freq="h"
+    )
+    missing_days = (
+        requested_hours.difference(existing_hours).normalize().unique()
+    )
+    existing_days = existing_hours.normalize().unique().sort_values()
+    all_vars = existing_vars + [v for v in variable if v not in existing_vars]
+
+    requests = [
+        (day_range, all_vars) for day_range in _day_ranges(missing_days)
+    ]
+    if missing_vars:
+        requests.extend(
+            (day_range, missing_vars)
+            for day_range in _day_ranges(existing_days)
+        )
+    if not requests:
+        return
+
+    base_name = target_file[: -len(".nc")]
+    part_files = [
+        "{}.update{:03d}.nc".format(base_name, i)
+        for i in range(len(requests))
+    ]
+    try:
+        for ((start, end), variables), part_file in zip(requests, part_files):
+            get_cds_data_from_datespan_and_position(
+                start_date=start,
+                end_date=end,
+                target_file=part_file,
+                variable=variables,
+                **kwargs,
+            )
+        datasets = [xr.open_dataset(f) for f in [target_file] + part_files]
+        try:
+            merged = xr.merge(
+                datasets,
+                compat="no_conflicts",
+                join="outer",
+                combine_attrs="override",
+            )
+            merged.to_netcdf(base_name + ".update.nc")
+        finally:
+            for d in datasets:
+                d.close()
+        os.replace(base_name + ".update.nc", target_file)
+    finally:
+        for part_file in part_files + [base_name + ".update.nc"]:
+            if os.path.exists(part_file):
+                os.remove(part_file)
 
 
-def format_windpowerlib(ds):
+def format_windpowerlib(ds, float32=False):
     """
     Format dataset to dataframe as required by the windpowerlib's ModelChain.
     The windpowerlib's ModelChain requires a weather DataFrame with time
@@ -89,6 +321,9 @@ def format_windpowerlib(ds):
     ----------
     ds : xarray.Dataset
         Dataset with ERA5 weather data.
+    float32 : bool
+        If True, the values are stored as float32 instead of the dtype of the
+        ERA5 data. Defaults to False.
     Returns
     --------
     pd.DataFrame
@@ -96,38 +331,8 @@ def format_windpowerlib(ds):
     """
 
     # compute the norm of the wind speed
-    ds["wnd100m"] = np.sqrt(ds["u100"] ** 2 + ds["v100"] ** 2).assign_attrs(
-        units=ds["u100"].attrs["units"], long_name="100 metre wind speed"
-    )
-
-    ds["wnd10m"] = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2).assign_attrs(
-        units=ds["u10"].attrs["units"], long_name="10 metre wind speed"
-    )
-
-    # drop not needed variables
-    windpowerlib_vars = ["wnd10m", "wnd100m", "sp", "t2m", "fsr"]
-    ds_vars = list(ds.variables)
-    drop_vars = [
-        _
-        for _ in ds_vars
-        if _ not in windpowerlib_vars + ["latitude", "longitude", "time"]
-    ]
-    ds = ds.drop(drop_vars)
-
-    # convert to dataframe
-    df = ds.to_dataframe().reset_index()
-
-    # the time stamp given by ERA5 for mean values (probably) corresponds to
-    # the end of the valid time interval; the following sets the time stamp
-    # to the middle of the valid time interval
-    df["time"] = df.time - pd.Timedelta(minutes=60)
-
-    df.set_index(["time", "latitude", "longitude"], inplace=True)
-    df.sort_index(inplace=True)
-    df = df.tz_localize("UTC", level=0)
-
-    # reorder the columns of the dataframe
-    df = df[windpowerlib_vars]
+    wnd100m = np.sqrt(ds["u100"] ** 2 + ds["v100"] ** 2)
+    wnd10m = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2)
 
     # define a multiindexing on the columns
     midx = pd.MultiIndex(
@@ -143,25 +348,148 @@ def format_windpowerlib(ds):
         names=["variable", "height"],  # name of the levels
     )
 
-    df.columns = midx
-    df.dropna(inplace=True)
+    return _formatted_frame(
+        [wnd10m, wnd100m, ds["sp"], ds["t2m"], ds["fsr"]],
+        midx,
+        FORMATTER_TIME_SHIFT["windpowerlib"],
+        float32,
+    )
+
+
+def _day_angle(time):
+    """
+    Fractional year in radians of time stamps, as used by the Fourier series
+    of Spencer (1971) for the position of the sun.
+    Parameters
+    ----------
+    time : pd.DatetimeIndex
+        Time stamps in UTC.
+    Returns
+    -------
+    np.ndarray
+        Day angle of each time stamp.
+    """
+    hours = time.hour + time.minute / 60.0 + time.second / 3600.0
+    return 2 * np.pi / 365.0 * (time.dayofyear - 1 + (hours - 12) / 24.0)
+
+
+def extraterrestrial_irradiance(time):
+    """
+    Extraterrestrial normal irradiance (Spencer, 1971).
+    Parameters
+    ----------
+    time : xarray.DataArray or array_like of datetime64
+        Time stamps in UTC.
+    Returns
+    -------
+    xarray.DataArray or np.ndarray
+        Irradiance in W/m² normal to the sun beyond the atmosphere.
+    """
+    g = _day_angle(pd.DatetimeIndex(np.asarray(time)))
+    dni_extra = 1366.1 * (
+        1.00011
+        + 0.034221 * np.cos(g)
+        + 0.00128 * np.sin(g)
+        + 0.000719 * np.cos(2 * g)
+        + 0.000077 * np.sin(2 * g)
+    )
+    if isinstance(time, xr.DataArray):
+        return time.copy(data=np.asarray(dni_extra))
+    return np.asarray(dni_extra)
+
+
+def compute_solar_position(time, latitude, longitude):
+    """
+    Solar zenith and azimuth angles on a grid.
+    The declination and the equation of time are computed once per time
+    step (Fourier series of Spencer, 1971, accurate to a few tenths of a
+    degree) and broadcast against the latitude and longitude, so that all
+    cells of a grid are computed with array operations.
+    Parameters
+    ----------
+    time : xarray.DataArray
+        Time stamps in UTC along the time dimension. If chunked with dask,
+        the result is chunked along time the same way.
+    latitude : xarray.DataArray
+        Latitudes in deg.
+    longitude : xarray.DataArray
+        Longitudes in deg.
+    Returns
+    -------
+    tuple(xarray.DataArray, xarray.DataArray)
+        Zenith and azimuth (clockwise from north) of the sun in deg, over
+        the dimensions of `time`, `latitude` and `longitude`.
+    """
+    index = pd.DatetimeIndex(time.values)
+    g = _day_angle(index)
+    declination = (
+        0.006918
+        - 0.399912 * np.cos(g)
+        + 0.070257 * np.sin(g)
+        - 0.006758 * np.cos(2 * g)
+        + 0.000907 * np.sin(2 * g)
+        - 0.002697 * np.cos(3 * g)
+        + 0.00148 * np.sin(3 * g)
+    )
+    # equation of time in minutes
+    eot = 229.18 * (
+        0.000075
+        + 0.001868 * np.cos(g)
+        - 0.032077 * np.sin(g)
+        - 0.014615 * np.cos(2 * g)
+        - 0.040849 * np.sin(2 * g)
+    )
+    minutes = index.hour * 60.0 + index.minute + index.second / 60.0
+    declination = time.copy(data=np.asarray(declination))
+    hour_angle = time.copy(data=np.asarray((minutes + eot) / 4.0 - 180))
+    if time.chunks is not None:
+        # keep the result lazy and chunked like the time steps
+        declination = declination.chunk(time.chunksizes)
+        hour_angle = hour_angle.chunk(time.chunksizes)
+    # hour angle in radians, 0 at solar noon
+    hour_angle = np.radians(hour_angle + longitude)
+    lat = np.radians(latitude)
 
-    return df
+    cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(
+        declination
+    ) * np.cos(hour_angle)
+    zenith = np.degrees(np.arccos(cos_zenith.clip(-1, 1)))
+    azimuth = (
+        np.degrees(
+            np.arctan2(
+                np.sin(hour_angle),
+                np.cos(hour_angle) * np.sin(lat)
+                - np.tan(declination) * np.cos(lat),
+            )
+        )
+        + 180
+    )
+    return zenith, azimuth
 
 
-def format_pvlib(ds):
+def format_pvlib(ds, float32=False, solar_position=False):
     """
     Format dataset to dataframe as required by the pvlib's ModelChain.
     The pvlib's ModelChain requires a weather DataFrame with time series for
     - wind speed `wind_speed` in m/s,
     - temperature `temp_air` in C,
-    - direct irradiation 'dni' in W/m² (calculated later),
+    - direct irradiation 'dni' in W/m² (added with `solar_position`),
     - global horizontal irradiation 'ghi' in W/m²,
     - diffuse horizontal irradiation 'dhi' in W/m²
     Parameters
     ----------
     ds : xarray.Dataset
         Dataset with ERA5 weather data.
+    float32 : bool
+        If True, the values are stored as float32 instead of the dtype of the
+        ERA5 data. Defaults to False.
+    solar_position : bool
+        If True, the solar `zenith` and `azimuth` in deg, the extraterrestrial
+        irradiance `dni_extra` and the direct normal irradiance `dni` in W/m²
+        are added. They are computed for the middle of the hour over which
+        the irradiation is accumulated (the time stamps of the dataframe).
+        `dni` is set to 0 for a zenith above 87° and limited to `dni_extra`.
+        Defaults to False.
     Returns
     --------
     pd.DataFrame
@@ -169,54 +497,208 @@ def format_pvlib(ds):
     """
 
     # compute the norm of the wind speed
-    ds["wind_speed"] = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2).assign_attrs(
-        units=ds["u10"].attrs["units"], long_name="10 metre wind speed"
-    )
+    wind_speed = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2)
 
     # convert temperature to Celsius (from Kelvin)
-    ds["temp_air"] = ds.t2m - 273.15
+    temp_air = ds.t2m - 273.15
+
+    dirhi = ds.fdir / 3600.0
+    ghi = ds.ssrd / 3600.0
+    dhi = ghi - dirhi
+
+    arrays = [wind_speed, temp_air, ghi, dhi]
+    columns = ["wind_speed", "temp_air", "ghi", "dhi"]
+    if solar_position:
+        # middle of the accumulation hour, on the time coordinate of ds
+        time = ds["time"] - FORMATTER_TIME_SHIFT["pvlib"]
+        zenith, azimuth = compute_solar_position(
+            time, ds["latitude"], ds["longitude"]
+        )
+        dni_extra, _ = xr.broadcast(extraterrestrial_irradiance(time), zenith)
+        dni = (dirhi / np.cos(np.radians(zenith))).where(zenith <= 87, 0)
+        dni = np.minimum(dni, dni_extra)
+        dtype = ghi.dtype
+        arrays += [
+            a.astype(dtype) for a in (dni, zenith, azimuth, dni_extra)
+        ]
+        columns += ["dni", "zenith", "azimuth", "dni_extra"]
 
-    ds["dirhi"] = (ds.fdir / 3600.0).assign_attrs(units="W/m^2")
-    ds["ghi"] = (ds.ssrd / 3600.0).assign_attrs(
-        units="W/m^2", long_name="global horizontal irradiation"
+    return _formatted_frame(
+        arrays, columns, FORMATTER_TIME_SHIFT["pvlib"], float32
     )
-    ds["dhi"] = (ds.ghi - ds.dirhi).assign_attrs(
-        units="W/m^2", long_name="direct irradiation"
+
+
+def format_wefesiteanalyst(ds, float32=False):
+    """
+    Format dataset to dataframe as used by the WEFESiteAnalyst reports.
+    The dataframe contains time series for
+    - global horizontal irradiance `ghi` in W/m²,
+    - air temperature `t_air` in °C,
+    - evaporation `e` in mm of water equivalent,
+    - total precipitation `tp` in mm,
+    - wind speed at 10 m `windspeed` in m/s.
+    The time stamps are the ones of the ERA5 data (end of the accumulation
+    period of `ghi`, `e` and `tp`).
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with ERA5 weather data.
+    float32 : bool
+        If True, the values are stored as float32 instead of the dtype of the
+        ERA5 data. Defaults to False.
+    Returns
+    --------
+    pd.DataFrame
+        Dataframe formatted for the WEFESiteAnalyst.
+    """
+    ghi = ds.ssrd / 3600.0
+    t_air = ds.t2m - 273.15
+    e = ds.e * 1000
+    tp = ds.tp * 1000
+    windspeed = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2)
+
+    return _formatted_frame(
+        [ghi, t_air, e, tp, windspeed],
+        ["ghi", "t_air", "e", "tp", "windspeed"],
+        FORMATTER_TIME_SHIFT["wefesiteanalyst"],
+        float32,
     )
 
-    # drop not needed variables
-    pvlib_vars = ["ghi", "dhi", "wind_speed", "temp_air"]
-    ds_vars = list(ds.variables)
-    drop_vars = [
-        _
-        for _ in ds_vars
-        if _ not in pvlib_vars + ["latitude", "longitude", "time"]
-    ]
-    ds = ds.drop(drop_vars)
 
-    # convert to dataframe
-    df = ds.to_dataframe().reset_index()
+def _formatted_frame(arrays, columns, time_shift, float32=False):
+    """
+    Build a formatted dataframe directly from the values of data arrays.
+    The time stamps are shifted by `time_shift` and localized to UTC, the
+    rows are sorted by time, latitude and longitude (latitude and longitude
+    being ascending as after `pd.DataFrame.sort_index`) and the rows
+    containing a NaN are dropped. As the ERA5 coordinates are already
+    sorted, descending coordinates only need to be reversed and the values
+    of each array are copied once into the single block of the dataframe.
+    Parameters
+    -----------
+    arrays : list of xarray.DataArray
+        Data arrays over time, latitude and longitude (latitude and longitude
+        may also be scalar coordinates), one per column.
+    columns : list or pd.Index
+        Names of the columns.
+    time_shift : pd.Timedelta
+        Shift of the time stamps, see FORMATTER_TIME_SHIFT.
+    float32 : bool
+        If True, all columns are stored as float32.
+    Returns
+    -------
+    pd.DataFrame
+        Dataframe with a multiindex with time, latitude and longitude levels.
+    """
+    ds = xr.Dataset({i: da for i, da in enumerate(arrays)})
+    for dim in ("latitude", "longitude"):
+        if dim not in ds.dims:
+            ds = ds.expand_dims(dim)
+        elif ds[dim].size > 1 and ds[dim].values[0] > ds[dim].values[-1]:
+            ds = ds.isel({dim: slice(None, None, -1)})
+    if not ds.indexes["time"].is_monotonic_increasing:
+        ds = ds.sortby("time")
+    ds = ds.transpose("time", "latitude", "longitude").compute()
+
+    time = (ds.indexes["time"] - time_shift).tz_localize("UTC")
+    index = pd.MultiIndex.from_product(
+        [time, ds.latitude.values, ds.longitude.values],
+        names=["time", "latitude", "longitude"],
+    )
+    values = [ds[i].values for i in range(len(arrays))]
+    valid = np.ones(len(index), dtype=bool)
+    for v in values:
+        valid &= ~np.isnan(v).ravel()
 
-    # the time stamp given by ERA5 for mean values (probably) corresponds to
-    # the end of the valid time interval; the following sets the time stamp
-    # to the middle of the valid time interval
-    df["time"] = df.time - pd.Timedelta(minutes=30)
+    dtypes = {v.dtype for v in values}
+    if float32:
+        dtypes = {np.dtype("float32")}
+    if len(dtypes) > 1:
+        df = pd.DataFrame(
+            {i: v.ravel() for i, v in enumerate(values)}, index=index
+        )
+        df.columns = columns
+        return df[valid]
 
-    df.set_index(["time", "latitude", "longitude"], inplace=True)
-    df.sort_index(inplace=True)
-    df = df.tz_localize("UTC", level=0)
+    # fill a (columns, rows) array whose transpose is the single block of
+    # the dataframe
+    data = np.empty((len(values), len(index)), dtype=dtypes.pop())
+    for row, v in zip(data, values):
+        row.reshape(v.shape)[...] = v
+    if not valid.all():
+        data = data[:, valid]
+        index = index[valid]
+    return pd.DataFrame(data.T, index=index, columns=columns, copy=False)
 
-    df = df[["wind_speed", "temp_air", "ghi", "dhi"]]
-    df.dropna(inplace=True)
 
-    return df
+def nearest_indices(coord, values):
+    """
+    Find the indices of the nearest points of a sorted coordinate.
+    Parameters
+    -----------
+    coord : xarray.DataArray or array_like
+        Ascending or descending coordinate, e.g. the latitude or longitude of
+        an ERA5 dataset. It may be unevenly spaced, e.g. after combining the
+        files of several areas.
+    values : float or array_like
+        Coordinate values to look up.
+    Returns
+    -------
+    int or numpy.ndarray
+        Index of the nearest point of `coord` for each value, as found by
+        `.sel(method="nearest")`.
+    """
+    coord = np.asarray(coord, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if coord.size < 2:
+        return np.zeros(values.shape, dtype=int)[()]
+    descending = coord[0] > coord[-1]
+    axis = coord[::-1] if descending else coord
+    above = np.clip(np.searchsorted(axis, values), 1, axis.size - 1)
+    below = above - 1
+    # ties go to the higher value, as for `.sel(method="nearest")`
+    nearest = np.where(
+        values - axis[below] < axis[above] - values, below, above
+    )
+    if descending:
+        nearest = axis.size - 1 - nearest
+    return nearest[()]
+
+
+def _span_indexer(coord, lower, upper):
+    """
+    Index the points of a sorted coordinate within (lower, upper].
+    Parameters
+    -----------
+    coord : xarray.DataArray
+        Ascending or descending coordinate.
+    lower : float
+        Excluded lower bound.
+    upper : float
+        Included upper bound.
+    Returns
+    -------
+    slice
+        Positions of the coordinate within the bounds.
+    """
+    values = coord.values
+    descending = values.size > 1 and values[0] > values[-1]
+    if descending:
+        values = values[::-1]
+    start = np.searchsorted(values, lower, side="right")
+    stop = np.searchsorted(values, upper, side="right")
+    if descending:
+        start, stop = values.size - stop, values.size - start
+    return slice(start, max(start, stop))
 
 
 def select_area(ds, lon, lat, g_step=0.25):
     """
     Select data for given location or rectangular area from dataset.
     In case data for a single location is requested, the nearest data point
-    for which weather data is given is returned.
+    for which weather data is given is returned. In case of a rectangular
+    area, only the grid points within the area are returned (west and south
+    boundaries excluded, east and north boundaries included).
     Parameters
     -----------
     ds : xarray.Dataset
@@ -253,87 +735,335 @@ def select_area(ds, lon, lat, g_step=0.25):
         lat_n = lat + g_step
 
     if select_point is True:
-        answer = ds.sel(latitude=lat, longitude=lon, method="nearest")
+        answer = ds.isel(
+            latitude=nearest_indices(ds.latitude, lat),
+            longitude=nearest_indices(ds.longitude, lon),
+        )
     else:
-        answer = ds.where(
-            (lat_s < ds.latitude)
-            & (ds.latitude <= lat_n)
-            & (lon_w < ds.longitude)
-            & (ds.longitude <= lon_e)
+        answer = ds.isel(
+            latitude=_span_indexer(ds.latitude, lat_s, lat_n),
+            longitude=_span_indexer(ds.longitude, lon_w, lon_e),
         )
 
     return answer
 
 
-def select_geometry(ds, area):
+def _cell_size(coord, g_step):
+    """Spacing of a regular coordinate, `g_step` if it has a single point"""
+    coord = np.asarray(coord)
+    if coord.size < 2:
+        return g_step
+    return abs(float(coord[1] - coord[0]))
+
+
+def geometry_mask(ds, area, weights=False, g_step=0.25):
     """
-    Select data for given geometry from dataset.
+    Find the grid points of a dataset which lie within a geometry.
+    The test is vectorized over all grid points of the dataset.
     Parameters
     -----------
     ds : xarray.Dataset
         Dataset with ERA5 weather data.
     area : shapely's compatible geometry object (i.e. Polygon, Multipolygon, etc...)
         Area to select data for.
+    weights : bool
+        If True, the share of the area of each grid cell (centred on its grid
+        point) covered by `area` is returned in addition.
+    g_step : float
+        Grid resolution of weather data, only used to compute the weights in
+        case the dataset has a single latitude or longitude.
     Returns
     -------
-    xarray.Dataset
-        Dataset containing selection for specified location or area.
+    xarray.DataArray or tuple of xarray.DataArray
+        Boolean mask over latitude and longitude which is True for the grid
+        points within `area` and, if `weights` is True, the covered share
+        (between 0 and 1) of each grid cell.
     """  # noqa: E501
-    geometry = []
-    lon_vals = []
-    lat_vals = []
+    lon2d, lat2d = np.meshgrid(ds.longitude.values, ds.latitude.values)
+    coords = {"latitude": ds.latitude, "longitude": ds.longitude}
+    dims = ("latitude", "longitude")
 
-    df = pd.DataFrame([], columns=["lon", "lat"])
+    shapely.prepare(area)
+    mask = xr.DataArray(
+        shapely.contains_xy(area, lon2d, lat2d), coords=coords, dims=dims
+    )
+    if not weights:
+        return mask
 
-    for i, x in enumerate(ds.longitude):
-        for j, y in enumerate(ds.latitude):
-            lon_vals.append(x.values)
-            lat_vals.append(y.values)
-            geometry.append(Point(x, y))
+    half_lon = _cell_size(ds.longitude, g_step) / 2
+    half_lat = _cell_size(ds.latitude, g_step) / 2
+    cells = shapely.box(
+        lon2d - half_lon, lat2d - half_lat, lon2d + half_lon, lat2d + half_lat
+    )
+    # cells crossed by the boundary of the geometry are partially covered,
+    # the other cells are either fully inside or fully outside
+    boundary = shapely.boundary(area)
+    shapely.prepare(boundary)
+    crossed = shapely.intersects(boundary, cells)
+    share = np.where(mask.values, 1.0, 0.0)
+    share[crossed] = shapely.area(
+        shapely.intersection(cells[crossed], area)
+    ) / (4 * half_lon * half_lat)
+    return mask, xr.DataArray(share, coords=coords, dims=dims)
 
-    df["lon"] = lon_vals
-    df["lat"] = lat_vals
 
-    # create a geopandas to use the geometry functions
-    crs = {"init": "epsg:4326"}
-    geo_df = gpd.GeoDataFrame(df, crs=crs, geometry=geometry)
+def select_geometry(ds, area, return_weights=False):
+    """
+    Select data for given geometry from dataset.
+    Parameters
+    -----------
+    ds : xarray.Dataset
+        Dataset with ERA5 weather data.
+    area : shapely's compatible geometry object (i.e. Polygon, Multipolygon, etc...)
+        Area to select data for.
+    return_weights : bool
+        If True, the share of each grid cell covered by `area` is returned in
+        addition, e.g. to compute area weighted averages (see
+        `geometry_mask`).
+    Returns
+    -------
+    xarray.Dataset or tuple
+        Dataset containing selection for specified location or area and, if
+        `return_weights` is True, the covered share of each grid cell as
+        xarray.DataArray. None if no grid point lies within `area`.
+    """  # noqa: E501
+    if return_weights:
+        cond, weights = geometry_mask(ds, area, weights=True)
+    else:
+        cond = geometry_mask(ds, area)
 
-    inside_points = geo_df.within(area)
     # if no points lie within area, return None
-    if not inside_points.any():
+    if not cond.any():
         return None
 
-    inside_lon = geo_df.loc[inside_points, "lon"].values
-    inside_lat = geo_df.loc[inside_points, "lat"].values
+    # apply the condition to where
+    if return_weights:
+        return ds.where(cond), weights
+    return ds.where(cond)
+
 
-    # prepare a list where the latitude and longitude of the points inside are
-    # formatted as xarray of bools
-    logical_list = []
-    for lon, lat in zip(inside_lon, inside_lat):
-        logical_list.append(
-            np.logical_and((ds.longitude == lon), (ds.latitude == lat))
+def _time_bound(value, upper=False):
+    """
+    Convert a start or end date to a naive UTC timestamp.
+    A date given as string is interpreted like pandas does when slicing a
+    DataFrame: e.g. '2020-01' as upper bound includes all of January.
+    Parameters
+    -----------
+    value : anything `pandas.to_datetime` can convert to a timestamp
+        Start or end date, naive dates are assumed to be in UTC.
+    upper : bool
+        If True, the latest time covered by a date string is returned,
+        otherwise the earliest one.
+    Returns
+    -------
+    pd.Timestamp
+        Naive timestamp in UTC.
+    """
+    bound = pd.Timestamp(value)
+    if isinstance(value, str) and bound.tz is None:
+        try:
+            period = pd.Period(value)
+        except ValueError:
+            period = None
+        if period is not None:
+            bound = period.end_time if upper else period.start_time
+    if bound.tz is not None:
+        bound = bound.tz_convert("UTC").tz_localize(None)
+    return bound
+
+
+def _time_chunk_size(ds, memory_budget):
+    """
+    Number of time steps per chunk for a memory budget.
+    The budget is shared by the chunks of all data variables and by the
+    intermediate results of the formatters, estimated as three times the
+    size of the data (e.g. wind speeds and solar angles computed from the
+    variables), so that a chunk uses four times the size of its data.
+    Parameters
+    -----------
+    ds : xarray.Dataset
+        Dataset with ERA5 weather data.
+    memory_budget : int
+        Memory budget in bytes.
+    Returns
+    -------
+    int
+        Number of time steps per chunk.
+    """
+    step_bytes = sum(
+        da.dtype.itemsize * da.size // max(da.sizes.get("time", 1), 1)
+        for da in ds.data_vars.values()
+    )
+    return max(1, int(memory_budget // (4 * max(step_bytes, 1))))
+
+
+def open_era5_dataset(era5_netcdf_filename, chunks=None, memory_budget=None):
+    """
+    Open one or several ERA5 netCDF files as a single dataset.
+    Several files (e.g. one file per year or month) are opened lazily as one
+    dataset chunked with dask, the data is only read once it is computed.
+    Parameters
+    -----------
+    era5_netcdf_filename : str or list of str
+        Filename including path of a netCDF file, glob pattern (e.g.
+        'era5_*.nc') or list of filenames of netCDF files containing ERA5
+        weather data, or path of a Zarr store (ending with '.zarr') created
+        with `convert_era5_to_point_store`.
+    chunks : None or int or dict
+        Chunk sizes by dimension passed to `xarray.open_mfdataset`. Defaults
+        to None, in which case several files are chunked per file and a single
+        file is opened without dask (unless `memory_budget` is given).
+    memory_budget : None or int
+        Maximal memory in bytes a chunk of time steps of all variables (and
+        of the intermediate results of the formatters) should use. If given,
+        the dataset is rechunked along time accordingly. Defaults to None.
+    Returns
+    -------
+    xarray.Dataset
+        Dataset with ERA5 weather data.
+    """
+    if isinstance(era5_netcdf_filename, str) and _is_zarr_store(
+        era5_netcdf_filename
+    ):
+        if chunks is None and memory_budget is None:
+            # without dask only the chunks of the selected cells are read
+            return xr.open_zarr(
+                era5_netcdf_filename, chunks=None, consolidated=False
+            )
+        ds = xr.open_zarr(
+            era5_netcdf_filename, chunks=chunks or {}, consolidated=False
         )
+        if memory_budget is not None:
+            ds = ds.chunk({"time": _time_chunk_size(ds, memory_budget)})
+        return ds
 
-    # bind all conditions from the list
-    cond = np.logical_or(*logical_list[:2])
-    for new_cond in logical_list[2:]:
-        cond = np.logical_or(cond, new_cond)
+    if isinstance(era5_netcdf_filename, (list, tuple)):
+        filenames = list(era5_netcdf_filename)
+    elif glob.has_magic(era5_netcdf_filename):
+        filenames = sorted(glob.glob(era5_netcdf_filename))
+        if not filenames:
+            raise FileNotFoundError(
+                "No file matches '{}'".format(era5_netcdf_filename)
+            )
+    else:
+        filenames = [era5_netcdf_filename]
+
+    if len(filenames) == 1 and chunks is None and memory_budget is None:
+        return xr.open_dataset(filenames[0])
+
+    ds = xr.open_mfdataset(
+        filenames,
+        combine="by_coords",
+        chunks=chunks if chunks is not None else {},
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+    )
+    if memory_budget is not None:
+        ds = ds.chunk({"time": _time_chunk_size(ds, memory_budget)})
+    return ds
+
+
+def _is_zarr_store(path):
+    """Check whether `path` names a Zarr store rather than a netCDF file."""
+    return path.rstrip("/\\").endswith(".zarr")
 
-    # apply the condition to where
-    return ds.where(cond)
+
+def convert_era5_to_point_store(
+    era5_netcdf_filename, target, cell_chunk=1, time_chunk=None
+):
+    """
+    Rechunk downloaded ERA5 data for reading the time series of grid cells.
+    The netCDF files downloaded from the CDS are chunked by time step, so
+    reading the time series of one grid cell decompresses the whole file.
+    The store written here is chunked by grid cell instead: each chunk holds
+    the time series of `cell_chunk` x `cell_chunk` cells, so reading one site
+    only reads its own chunks. The store can be passed instead of the netCDF
+    files to `weather_df_from_era5`, `iter_weather_df_from_era5` and
+    `open_era5_dataset` (and the opened dataset to `select_area`).
+    Parameters
+    -----------
+    era5_netcdf_filename : str or list of str
+        Filename, glob pattern or list of filenames of the netCDF files
+        containing ERA5 weather data, see `open_era5_dataset`.
+    target : str
+        Filename of the store. A name ending with '.zarr' creates a Zarr store
+        (requires the `zarr` package), any other name a netCDF file chunked by
+        grid cell.
+    cell_chunk : int
+        Number of grid cells along latitude and longitude of a chunk.
+        Defaults to 1.
+    time_chunk : None or int
+        Number of time steps of a chunk. Defaults to None, in which case a
+        chunk holds all time steps.
+    Returns
+    -------
+    str
+        Filename of the store.
+    """
+    # one dask chunk per source file, the chunks of the files themselves are
+    # usually far too small for dask
+    ds = open_era5_dataset(
+        era5_netcdf_filename,
+        chunks={"time": -1, "latitude": -1, "longitude": -1},
+    )
+    sizes = {
+        "time": time_chunk or ds.sizes["time"],
+        "latitude": cell_chunk,
+        "longitude": cell_chunk,
+    }
+    sizes = {dim: min(size, ds.sizes[dim]) for dim, size in sizes.items()}
+    ds = ds.chunk(sizes)
+    # the CDS packs every file as int16 with its own scale and offset, the
+    # encoding of the first file would pack the values of the other files
+    # wrongly, so that only the units are kept (as well as not the chunking
+    # of the source)
+    for var in ds.variables.values():
+        var.encoding = {k: v for k, v in var.encoding.items() if k == "units"}
+
+    if _is_zarr_store(target):
+        ds.to_zarr(target, mode="w", consolidated=False)
+    else:
+        encoding = {
+            name: {
+                "zlib": True,
+                "complevel": 1,
+                "chunksizes": tuple(sizes.get(d, 1) for d in da.dims),
+            }
+            for name, da in ds.data_vars.items()
+        }
+        part_file = target + ".part"
+        try:
+            ds.to_netcdf(part_file, encoding=encoding)
+            os.replace(part_file, target)
+        finally:
+            if os.path.exists(part_file):
+                os.remove(part_file)
+    ds.close()
+    return target
 
 
 def weather_df_from_era5(
-    era5_netcdf_filename, lib, start=None, end=None, area=None
+    era5_netcdf_filename,
+    lib,
+    start=None,
+    end=None,
+    area=None,
+    chunks=None,
+    memory_budget=None,
+    float32=False,
+    solar_position=False,
 ):
     """
     Gets ERA5 weather data from netcdf file and converts it to a pandas
     dataframe as required by the spcified lib.
     Parameters
     -----------
-    era5_netcdf_filename : str
+    era5_netcdf_filename : str or list of str
         Filename including path of netcdf file containing ERA5 weather data
-        for specified time span and area.
+        for specified time span and area. A glob pattern or a list of
+        filenames can be provided to open several files (e.g. one per year)
+        as a single lazily chunked dataset (see `open_era5_dataset`).
     start : None or anything `pandas.to_datetime` can convert to a timestamp
         Get weather data starting from this date. Defaults to None in which
         case start is set to first time step in the dataset.
@@ -348,6 +1078,18 @@ def weather_df_from_era5(
         If you want data for an area you can provide a shape of this area or
         specify a rectangular area giving a list of the
         form [(lon west, lon east), (lat south, lat north)].
+    chunks : None or int or dict
+        Chunk sizes by dimension, see `open_era5_dataset`.
+    memory_budget : None or int
+        Memory budget in bytes of a chunk of time steps, see
+        `open_era5_dataset`.
+    float32 : bool
+        If True, the values are stored as float32, which halves the memory
+        of the dataframe. Defaults to False.
+    solar_position : bool
+        If True and `lib` is 'pvlib', the solar position, the extraterrestrial
+        irradiance and the DNI are added, see `format_pvlib`. Defaults to
+        False.
     Returns
     -------
     pd.DataFrame
@@ -356,7 +1098,8 @@ def weather_df_from_era5(
         dataframe is a datetime index. Otherwise the index is a multiindex
         with time, latitude and longitude levels.
     """  # noqa: E501
-    ds = xr.open_dataset(era5_netcdf_filename)
+    ds = open_era5_dataset(era5_netcdf_filename, chunks, memory_budget)
+    ds = _select_formatter_data(ds, lib, start, end, era5_netcdf_filename)
 
     if area is not None:
         if isinstance(area, list):
@@ -366,14 +1109,77 @@ def weather_df_from_era5(
             if ds is None:
                 return pd.DataFrame()
 
+    return _format_era5(ds, lib, start, end, area, float32, solar_position)
+
+
+def _select_formatter_data(ds, lib, start, end, era5_netcdf_filename):
+    """
+    Keep the variables and time steps the formatter of `lib` needs.
+    Parameters
+    -----------
+    ds : xarray.Dataset
+        Dataset with ERA5 weather data.
+    lib : str
+        Name of the formatter, see `weather_df_from_era5`.
+    start : None or anything `pandas.to_datetime` can convert to a timestamp
+        Start of the time window.
+    end : None or anything `pandas.to_datetime` can convert to a timestamp
+        End of the time window.
+    era5_netcdf_filename : str or list of str
+        Name of the data for the error message.
+    Returns
+    -------
+    xarray.Dataset
+        Selected dataset.
+    """
+    if lib in FORMATTER_VARIABLES:
+        missing_vars = [
+            v
+            for v in FORMATTER_VARIABLES[lib]
+            if ERA5_NETCDF_NAMES[v] not in ds
+        ]
+        if missing_vars:
+            raise ValueError(
+                "The variables {} needed by the {} formatter are missing in "
+                "{}. Download them with `formatters='{}'`.".format(
+                    missing_vars, lib, era5_netcdf_filename, lib
+                )
+            )
+        # only keep the variables the formatter needs
+        ds = ds[[ERA5_NETCDF_NAMES[v] for v in FORMATTER_VARIABLES[lib]]]
+
+    # only convert the time steps which end up within start and end once the
+    # formatter shifted them
+    if lib in FORMATTER_TIME_SHIFT:
+        shift = FORMATTER_TIME_SHIFT[lib]
+        if start is not None:
+            ds = ds.sel(time=slice(_time_bound(start) + shift, None))
+        if end is not None:
+            ds = ds.sel(time=slice(None, _time_bound(end, upper=True) + shift))
+    return ds
+
+
+def _format_era5(
+    ds, lib, start, end, area, float32=False, solar_position=False
+):
+    """
+    Convert the selected dataset with the formatter of `lib`.
+    See `weather_df_from_era5` for the parameters.
+    Returns
+    -------
+    pd.DataFrame
+        Dataframe with ERA5 weather data in format required by the lib.
+    """
     if lib == "windpowerlib":
-        df = format_windpowerlib(ds)
+        df = format_windpowerlib(ds, float32)
     elif lib == "pvlib":
-        df = format_pvlib(ds)
+        df = format_pvlib(ds, float32, solar_position)
+    elif lib == "wefesiteanalyst":
+        df = format_wefesiteanalyst(ds, float32)
     else:
         raise ValueError(
             "Unknown value for `lib`. "
-            "It must be either 'pvlib' or 'windpowerlib'."
+            "It must be either 'pvlib', 'windpowerlib' or 'wefesiteanalyst'."
         )
 
     # drop latitude and longitude from index in case a single location
@@ -382,8 +1188,123 @@ def weather_df_from_era5(
         if np.size(area[0]) == 1 and np.size(area[1]) == 1:
             df.index = df.index.droplevel(level=[1, 2])
 
-    if start is None:
-        start = df.index[0]
-    if end is None:
-        end = df.index[-1]
-    return df[start:end]
\ No newline at end of file
+    # an open bound (None) selects all time steps up to the start or end
+    return df[start:end]
+
+
+def _time_blocks(times, freq, shift):
+    """
+    Split sorted time steps into blocks of calendar periods.
+    Parameters
+    -----------
+    times : array_like of datetime64
+        Sorted time steps of the ERA5 data.
+    freq : str
+        Period alias of the blocks, e.g. 'Y' for years or 'M' for months.
+    shift : pd.Timedelta
+        Shift of the formatter, the blocks are formed on the shifted times.
+    Returns
+    -------
+    list of slice
+        Index slices of the time steps of each block.
+    """
+    if len(times) == 0:
+        return []
+    periods = (pd.DatetimeIndex(times) - shift).to_period(freq)
+    edges = np.flatnonzero(periods[1:] != periods[:-1]) + 1
+    edges = np.concatenate([[0], edges, [len(times)]])
+    return [slice(a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def iter_weather_df_from_era5(
+    era5_netcdf_filename,
+    lib,
+    freq="Y",
+    tile_size=None,
+    start=None,
+    end=None,
+    area=None,
+    chunks=None,
+    float32=False,
+    solar_position=False,
+):
+    """
+    Generate the dataframes of `weather_df_from_era5` block by block.
+    The ERA5 data is read lazily and converted one time block (e.g. year)
+    and one spatial tile at a time, so that only the data of the current
+    block is held in memory. Concatenating all blocks gives the dataframe of
+    `weather_df_from_era5` (up to the order of the rows if the area is split
+    into several tiles).
+    Parameters
+    -----------
+    era5_netcdf_filename : str or list of str
+        Filename, glob pattern or list of filenames of netcdf files containing
+        ERA5 weather data, see `open_era5_dataset`.
+    lib : str
+        Format of the dataframes, 'pvlib', 'windpowerlib' or
+        'wefesiteanalyst'.
+    freq : str
+        Pandas period alias of the time blocks, e.g. 'Y' for one block per
+        year or 'M' for one block per month. The blocks follow the time
+        stamps of the formatted dataframes. Defaults to 'Y'.
+    tile_size : None or int or tuple(int, int)
+        Number of grid cells along latitude and longitude of a spatial tile.
+        Defaults to None, in which case the whole area is one tile.
+    start : None or anything `pandas.to_datetime` can convert to a timestamp
+        See `weather_df_from_era5`.
+    end : None or anything `pandas.to_datetime` can convert to a timestamp
+        See `weather_df_from_era5`.
+    area : shapely compatible geometry object or list(float) or list(tuple)
+        See `weather_df_from_era5`.
+    chunks : None or int or dict
+        Chunk sizes by dimension, see `open_era5_dataset`.
+    float32 : bool
+        If True, the values are stored as float32. Defaults to False.
+    solar_position : bool
+        See `weather_df_from_era5`.
+    Yields
+    -------
+    pd.DataFrame
+        Dataframe with the ERA5 weather data of a time block and tile in the
+        format required by the lib.
+    """
+    ds = open_era5_dataset(era5_netcdf_filename, chunks)
+    ds = _select_formatter_data(ds, lib, start, end, era5_netcdf_filename)
+    if area is not None:
+        if isinstance(area, list):
+            ds = select_area(ds, area[0], area[1])
+        else:
+            ds = select_geometry(ds, area)
+            if ds is None:
+                return
+    if not ds.indexes["time"].is_monotonic_increasing:
+        ds = ds.sortby("time")
+
+    if tile_size is None:
+        tiles = [{}]
+    else:
+        lat_step, lon_step = np.broadcast_to(tile_size, 2)
+        n_lat = ds.sizes.get("latitude", 1)
+        n_lon = ds.sizes.get("longitude", 1)
+        tiles = [
+            {
+                dim: slice(i, i + step)
+                for dim, i, step in (
+                    ("latitude", i, lat_step),
+                    ("longitude", j, lon_step),
+                )
+                if dim in ds.dims
+            }
+            for i in range(0, n_lat, lat_step)
+            for j in range(0, n_lon, lon_step)
+        ]
+
+    shift = FORMATTER_TIME_SHIFT.get(lib, pd.Timedelta(0))
+    for block in _time_blocks(ds["time"].values, freq, shift):
+        for tile in tiles:
+            chunk = ds.isel(time=block, **tile).load()
+            df = _format_era5(
+                chunk, lib, start, end, area, float32, solar_position
+            )
+            if len(df):
+                yield df
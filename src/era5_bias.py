@@ -0,0 +1,344 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from era5_summary import _time_location_layout
+
+# variables of the wefesiteanalyst layout which cannot become negative
+NON_NEGATIVE_VARIABLES = ["ghi", "tp", "windspeed"]
+
+
+def _layout_array(data, variables):
+    """
+    Weather data as (time, location, variable) array.
+    Parameters
+    ----------
+    data : pd.DataFrame or dict
+        Dataframe of `era5.weather_df_from_era5` or dataframes by site name.
+    variables : list of str
+        Columns of the array.
+    Returns
+    -------
+    tuple
+        The data as one dataframe, the sorted time steps in UTC without
+        time zone (pd.DatetimeIndex), the location keys (pd.Index, None for a
+        single location), the array and the time and location position of
+        each row.
+    """
+    data, times, locations, time_codes, location_codes = (
+        _time_location_layout(data)
+    )
+    missing = [v for v in variables if v not in data.columns]
+    if missing:
+        raise ValueError(
+            "The variables {} are missing in the data.".format(missing)
+        )
+    if times.tz is not None:
+        times = times.tz_convert("UTC").tz_localize(None)
+    if times.is_unique:
+        order = np.argsort(times.to_numpy(), kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        times, time_codes = times[order].to_numpy(), rank[time_codes]
+    else:
+        times, time_codes = np.unique(
+            times[time_codes].to_numpy(), return_inverse=True
+        )
+    keys = None
+    if locations is not None:
+        if locations.shape[1] == 1:
+            keys = pd.Index(locations.iloc[:, 0])
+        else:
+            keys = pd.MultiIndex.from_frame(locations)
+    n_locations = 1 if keys is None else len(keys)
+    array = np.full((len(times), n_locations, len(variables)), np.nan)
+    array[time_codes, location_codes] = data[variables].to_numpy(float)
+    return (
+        data,
+        pd.DatetimeIndex(times),
+        keys,
+        array,
+        time_codes,
+        location_codes,
+    )
+
+
+def _nanquantile(values, probabilities):
+    """
+    Quantiles along the first axis, NaN for slices without data.
+    Parameters
+    ----------
+    values : np.ndarray
+        Values with time along the first axis.
+    probabilities : np.ndarray
+        Probabilities of the quantiles.
+    Returns
+    -------
+    np.ndarray
+        Quantiles along the first axis.
+    """
+    # NaN are sorted to the end, the quantiles are interpolated linearly
+    # between the sorted valid values of each slice
+    values = np.sort(values, axis=0)
+    count = (~np.isnan(values)).sum(axis=0)
+    shape = (-1,) + (1,) * count.ndim
+    position = probabilities.reshape(shape) * np.maximum(count - 1, 0)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+    weight = position - lower
+    below = np.take_along_axis(values, lower, axis=0)
+    above = np.take_along_axis(values, upper, axis=0)
+    quantiles = below + (above - below) * weight
+    quantiles[:, count == 0] = np.nan
+    return quantiles
+
+
+def fit_quantile_mapping(era5, stations, variables=None, n_quantiles=100):
+    """
+    Fit quantile mappings of ERA5 data to station measurements.
+    The ERA5 and station series are aligned on their common time steps and
+    the quantiles of both are computed per calendar month for all
+    locations and variables at once. Time steps with a missing value in
+    one of the series are left out.
+    Parameters
+    ----------
+    era5 : pd.DataFrame or dict
+        ERA5 data in the layout of `era5.weather_df_from_era5` (e.g. the
+        wefesiteanalyst layout) with a time index or a multiindex with
+        time and location levels, or dataframes with a time index by site
+        name (see `era5_sites.weather_df_for_sites`).
+    stations : pd.DataFrame or dict
+        Station measurements in the same layout, locations and units (see
+        `weather_station.read_station_export`). Time stamps with a time
+        zone are compared in UTC.
+    variables : None or list of str
+        Variables to fit. Defaults to None, in which case all columns of
+        `era5` which are also in `stations` are fitted.
+    n_quantiles : int
+        Number of quantiles between the minimum and maximum of each month.
+        Defaults to 100.
+    Returns
+    -------
+    xarray.Dataset
+        Quantiles `era5` and `station` with the dimensions month (1 to 12),
+        quantile, location (only for several locations) and variable. The
+        quantiles of months without common data are NaN.
+    """
+    if variables is None:
+        columns = []
+        for data in (era5, stations):
+            if isinstance(data, dict):
+                data = next(iter(data.values()))
+            columns.append(data.columns)
+        variables = [v for v in columns[0] if v in columns[1]]
+    _, era5_times, era5_keys, era5_array, _, _ = _layout_array(
+        era5, variables
+    )
+    _, station_times, station_keys, station_array, _, _ = _layout_array(
+        stations, variables
+    )
+    if (era5_keys is None) != (station_keys is None):
+        raise ValueError(
+            "The ERA5 data and the station data must both have one or "
+            "several locations."
+        )
+    if era5_keys is not None:
+        positions = era5_keys.get_indexer(station_keys)
+        if (positions < 0).any():
+            raise ValueError(
+                "The locations {} are missing in the ERA5 data.".format(
+                    list(station_keys[positions < 0])
+                )
+            )
+        era5_array = era5_array[:, positions]
+
+    times, era5_rows, station_rows = np.intersect1d(
+        era5_times, station_times, return_indices=True
+    )
+    if len(times) == 0:
+        raise ValueError(
+            "The ERA5 data and the station data have no common time steps."
+        )
+    era5_array = era5_array[era5_rows]
+    station_array = station_array[station_rows]
+    valid = ~np.isnan(era5_array) & ~np.isnan(station_array)
+    era5_array = np.where(valid, era5_array, np.nan)
+    station_array = np.where(valid, station_array, np.nan)
+
+    probabilities = np.linspace(0, 1, n_quantiles + 1)
+    shape = (12, len(probabilities)) + era5_array.shape[1:]
+    era5_quantiles = np.full(shape, np.nan)
+    station_quantiles = np.full(shape, np.nan)
+    months = pd.DatetimeIndex(times).month
+    for month in range(1, 13):
+        in_month = months == month
+        if not in_month.any():
+            continue
+        era5_quantiles[month - 1] = _nanquantile(
+            era5_array[in_month], probabilities
+        )
+        station_quantiles[month - 1] = _nanquantile(
+            station_array[in_month], probabilities
+        )
+
+    dims = ("month", "quantile", "location", "variable")
+    coords = {
+        "month": np.arange(1, 13),
+        "quantile": probabilities,
+        "variable": variables,
+    }
+    if station_keys is not None:
+        coords.update(
+            xr.Coordinates.from_pandas_multiindex(station_keys, "location")
+            if isinstance(station_keys, pd.MultiIndex)
+            else {"location": station_keys.to_numpy()}
+        )
+    mapping = xr.Dataset(
+        {
+            "era5": (dims, era5_quantiles),
+            "station": (dims, station_quantiles),
+        },
+        coords=coords,
+    )
+    if station_keys is None:
+        mapping = mapping.isel(location=0)
+    return mapping
+
+
+def _map_quantiles(values, source, target):
+    """
+    Map values from source to target quantiles, for many quantile curves at
+    once.
+    All curves are searched with one sorted array, each curve normalized to
+    its own interval. Values between two quantiles are interpolated
+    linearly, values equal to several quantiles (e.g. dry time steps) are
+    mapped to the middle of their target quantiles and values outside of
+    the fitted range are shifted by the difference of the outermost
+    quantiles.
+    Parameters
+    ----------
+    values : np.ndarray
+        Values of shape (time, curve).
+    source : np.ndarray
+        Non-decreasing source quantiles of shape (quantile, curve).
+    target : np.ndarray
+        Target quantiles of shape (quantile, curve).
+    Returns
+    -------
+    np.ndarray
+        Mapped values of shape (time, curve). Values of curves with NaN
+        quantiles are returned unchanged.
+    """
+    n_quantiles, n_curves = source.shape
+    fitted = ~np.isnan(source).any(axis=0) & ~np.isnan(target).any(axis=0)
+    source = np.where(fitted, source, np.arange(n_quantiles)[:, None])
+    target = np.where(fitted, target, 0.0)
+    low, high = source[0], source[-1]
+    span = np.where(high > low, high - low, 1.0)
+    offset = 2.0 * np.arange(n_curves)
+    keys = ((source - low) / span + offset).T.ravel()
+
+    missing = np.isnan(values)
+    filled = np.where(missing, low, values)
+    clipped = np.clip(filled, low, high)
+    x = (clipped - low) / span + offset
+    base = n_quantiles * np.arange(n_curves)
+    right = np.searchsorted(keys, x, side="right")
+    # values equal to one or several quantiles are mapped to the middle of
+    # their target quantiles
+    exact = keys[right - 1] == x
+    middle = (
+        np.searchsorted(keys, x[exact], side="left") + right[exact] - 1
+    ) / 2.0
+    # the other values are interpolated linearly between two quantiles
+    below = np.minimum(right - 1, base + n_quantiles - 2)
+    source = source.T.ravel()
+    target = target.T.ravel()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.diff(target) / np.diff(source)
+    slope = np.append(np.where(np.isfinite(slope), slope, 0.0), 0.0)
+    mapped = (
+        target[below]
+        + (clipped - source[below]) * slope[below]
+        + (filled - clipped)
+    )
+    lower = np.minimum(
+        np.floor(middle).astype(int),
+        np.broadcast_to(base, x.shape)[exact] + n_quantiles - 2,
+    )
+    weight = middle - lower
+    mapped[exact] = (
+        target[lower] * (1 - weight)
+        + target[lower + 1] * weight
+        + (filled - clipped)[exact]
+    )
+    mapped = np.where(fitted, mapped, values)
+    return np.where(missing, np.nan, mapped)
+
+
+def apply_quantile_mapping(era5, mapping):
+    """
+    Correct ERA5 data with fitted quantile mappings.
+    The whole record is corrected for all locations and variables at once,
+    each time step with the mapping of its calendar month.
+    Parameters
+    ----------
+    era5 : pd.DataFrame or dict
+        ERA5 data in the layout used for `fit_quantile_mapping`, e.g. the
+        full multi-year record.
+    mapping : xarray.Dataset
+        Result of `fit_quantile_mapping`.
+    Returns
+    -------
+    pd.DataFrame or dict
+        Corrected data in the layout of `era5`. Variables which are not
+        fitted are kept, `NON_NEGATIVE_VARIABLES` are clipped at 0.
+    """
+    variables = list(mapping["variable"].values)
+    data, times, keys, array, time_codes, location_codes = _layout_array(
+        era5, variables
+    )
+    if "location" in mapping.dims:
+        if keys is None:
+            raise ValueError(
+                "The mapping has several locations, the data only one."
+            )
+        positions = mapping.indexes["location"].get_indexer(keys)
+        if (positions < 0).any():
+            raise ValueError(
+                "The locations {} have no fitted mapping.".format(
+                    list(keys[positions < 0])
+                )
+            )
+        mapping = mapping.isel(location=positions)
+    else:
+        mapping = mapping.expand_dims(location=1, axis=2)
+    source = mapping["era5"].transpose(
+        "month", "quantile", "location", "variable"
+    ).to_numpy()
+    target = mapping["station"].transpose(
+        "month", "quantile", "location", "variable"
+    ).to_numpy()
+
+    n_times, n_locations, n_variables = array.shape
+    corrected = np.empty_like(array)
+    months = times.month
+    for month in range(1, 13):
+        in_month = months == month
+        if not in_month.any():
+            continue
+        corrected[in_month] = _map_quantiles(
+            array[in_month].reshape(-1, n_locations * n_variables),
+            source[month - 1].reshape(-1, n_locations * n_variables),
+            target[month - 1].reshape(-1, n_locations * n_variables),
+        ).reshape(-1, n_locations, n_variables)
+    non_negative = [v in NON_NEGATIVE_VARIABLES for v in variables]
+    corrected[..., non_negative] = np.clip(
+        corrected[..., non_negative], 0, None
+    )
+
+    data = data.copy()
+    data[variables] = corrected[time_codes, location_codes]
+    if isinstance(era5, dict):
+        return {name: data.loc[name] for name in era5}
+    return data
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+from era5 import compute_solar_position
+from era5 import extraterrestrial_irradiance
+
+# Stefan-Boltzmann constant in MJ/(m² K⁴) per hour and per day
+STEFAN_BOLTZMANN_HOURLY = 2.043e-10
+STEFAN_BOLTZMANN_DAILY = 4.903e-9
+# albedo of the grass reference crop
+ALBEDO = 0.23
+
+
+def saturation_vapour_pressure(temperature):
+    """
+    Saturation vapour pressure (FAO-56 eq. 11).
+    Parameters
+    ----------
+    temperature : xarray.DataArray
+        Air temperature in °C.
+    Returns
+    -------
+    xarray.DataArray
+        Saturation vapour pressure in kPa.
+    """
+    return 0.6108 * np.exp(17.27 * temperature / (temperature + 237.3))
+
+
+def wind_speed_2m(ds):
+    """
+    Wind speed at 2 m from the ERA5 wind at 10 m (FAO-56 eq. 47).
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variables `u10` and `v10`.
+    Returns
+    -------
+    xarray.DataArray
+        Wind speed at 2 m in m/s.
+    """
+    ws10 = np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2)
+    return ws10 * 4.87 / np.log(67.8 * 10 - 5.42)
+
+
+def _hourly_radiation(ds, elevation):
+    """
+    Shortwave and clear-sky radiation of the ERA5 accumulation hours.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variable `ssrd`.
+    elevation : float or xarray.DataArray
+        Elevation above sea level in m.
+    Returns
+    -------
+    tuple(xarray.DataArray, xarray.DataArray)
+        Incoming shortwave radiation and clear-sky radiation (FAO-56 eq.
+        37) in MJ/m² per hour.
+    """
+    # ssrd is accumulated over the hour ending at its time stamp, the sun is
+    # taken at the middle of the hour
+    time = ds["time"] - pd.Timedelta(minutes=30)
+    if ds["ssrd"].chunks is not None:
+        time = time.chunk({"time": ds["ssrd"].chunksizes["time"]})
+    zenith, _ = compute_solar_position(time, ds["latitude"], ds["longitude"])
+    cos_zenith = np.cos(np.radians(zenith)).clip(0, None)
+    ra = extraterrestrial_irradiance(time) * cos_zenith * 3600 / 1e6
+    rso = (0.75 + 2e-5 * elevation) * ra
+    return ds["ssrd"] / 1e6, rso
+
+
+def reference_evapotranspiration(ds, freq="h", elevation=0.0):
+    """
+    FAO-56 Penman-Monteith reference evapotranspiration of a grass crop.
+    All grid cells and time steps are computed with array operations on the
+    ERA5 variables. For a dataset chunked with dask (see
+    `era5.open_era5_dataset`) the result is lazy and computed chunk by
+    chunk, so that long runs on large grids stay within memory.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variables `t2m` and `d2m` in K, `u10` and `v10`
+        in m/s, `ssrd` in J/m² and `sp` in Pa (downloaded with the 'et0'
+        preset).
+    freq : str
+        'h' for the hourly reference evapotranspiration (FAO-56 eq. 53) at
+        the time steps of the ERA5 data, 'D' for the daily one (FAO-56
+        eq. 6) of each UTC day, which should cover complete days. Defaults to
+        'h'.
+    elevation : float or xarray.DataArray
+        Elevation above sea level in m, used for the clear-sky radiation.
+        Defaults to 0.
+    Returns
+    -------
+    xarray.DataArray
+        Reference evapotranspiration in mm per hour or per day. Small
+        negative hourly values occur at night when dew forms.
+    """
+    temperature = ds["t2m"] - 273.15
+    ea = saturation_vapour_pressure(ds["d2m"] - 273.15)
+    gamma = 0.000665 * ds["sp"] / 1000
+    u2 = wind_speed_2m(ds)
+    rs, rso = _hourly_radiation(ds, elevation)
+
+    if freq == "h":
+        es = saturation_vapour_pressure(temperature)
+        delta = 4098 * es / (temperature + 237.3) ** 2
+        # at night the cloudiness of the clear-sky ratio is not defined, a
+        # ratio of 0.8 is assumed
+        ratio = (rs / rso).where(rso > 0.01, 0.8).clip(0.25, 1.0)
+        rnl = (
+            STEFAN_BOLTZMANN_HOURLY
+            * ds["t2m"] ** 4
+            * (0.34 - 0.14 * np.sqrt(ea))
+            * (1.35 * ratio - 0.35)
+        )
+        rn = (1 - ALBEDO) * rs - rnl
+        # soil heat flux during daytime and nighttime (FAO-56 eq. 45, 46)
+        soil_heat = (0.1 * rn).where(rn > 0, 0.5 * rn)
+        et0 = (
+            0.408 * delta * (rn - soil_heat)
+            + gamma * 37 / (temperature + 273) * u2 * (es - ea)
+        ) / (delta + gamma * (1 + 0.34 * u2))
+    elif freq == "D":
+        # radiation belongs to the day of the middle of its hour
+        shifted = {"time": ds["time"] - pd.Timedelta(minutes=30)}
+        rs = rs.assign_coords(shifted).resample(time="1D").sum()
+        rso = rso.assign_coords(shifted).resample(time="1D").sum()
+        t_max = ds["t2m"].resample(time="1D").max()
+        t_min = ds["t2m"].resample(time="1D").min()
+        temperature = temperature.resample(time="1D").mean()
+        ea = ea.resample(time="1D").mean()
+        gamma = gamma.resample(time="1D").mean()
+        u2 = u2.resample(time="1D").mean()
+        rs, rso = rs.reindex_like(t_max), rso.reindex_like(t_max)
+
+        es = (
+            saturation_vapour_pressure(t_max - 273.15)
+            + saturation_vapour_pressure(t_min - 273.15)
+        ) / 2
+        delta = (
+            4098
+            * saturation_vapour_pressure(temperature)
+            / (temperature + 237.3) ** 2
+        )
+        ratio = (rs / rso).where(rso > 0, 0.8).clip(0.25, 1.0)
+        rnl = (
+            STEFAN_BOLTZMANN_DAILY
+            * (t_max ** 4 + t_min ** 4)
+            / 2
+            * (0.34 - 0.14 * np.sqrt(ea))
+            * (1.35 * ratio - 0.35)
+        )
+        rn = (1 - ALBEDO) * rs - rnl
+        et0 = (
+            0.408 * delta * rn
+            + gamma * 900 / (temperature + 273) * u2 * (es - ea)
+        ) / (delta + gamma * (1 + 0.34 * u2))
+    else:
+        raise ValueError(
+            "Unknown value for `freq`. It must be either 'h' or 'D'."
+        )
+    et0.name = "et0"
+    et0.attrs["units"] = "mm"
+    return et0
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def _per_step(values, n_steps, name):
+    """
+    Broadcast a scalar, a series or a repeated profile to one value per
+    time step.
+    Parameters
+    ----------
+    values : float or array_like
+        Scalar, one value per time step or a profile repeated cyclically
+        (e.g. 24 hourly values of a day).
+    n_steps : int
+        Number of time steps.
+    name : str
+        Name of the parameter for the error message.
+    Returns
+    -------
+    np.ndarray
+        One value per time step.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 0:
+        return np.full(n_steps, float(values))
+    if values.ndim != 1 or n_steps % len(values) != 0:
+        raise ValueError(
+            "`{}` must be a scalar, have one value per time step or a "
+            "length dividing the number of time steps ({}).".format(
+                name, n_steps
+            )
+        )
+    return np.resize(values, n_steps)
+
+
+def simulate_rainwater_harvesting(
+    rain,
+    tank_volumes,
+    catchment_areas,
+    demand,
+    runoff_coefficient=0.8,
+    evaporation=None,
+    tank_surface=0.0,
+    initial_fill=0.0,
+):
+    """
+    Simulate rainwater tanks for all combinations of tank volumes and
+    catchment areas at once.
+    The tank mass balance follows the yield-after-spillage rule: the demand
+    of a time step is served from the water stored at its start, then the
+    runoff of the step is added and the water exceeding the tank volume
+    spills. Evaporation from an open water surface is removed at the end of
+    the step. The time steps are simulated in sequence, each step updating
+    the storage of all scenarios (sites, tank volumes and catchment areas)
+    with one array operation.
+    Parameters
+    ----------
+    rain : pd.Series or pd.DataFrame
+        Precipitation in mm per time step (e.g. `tp` of the wefesiteanalyst
+        layout, hourly or resampled to daily sums), with one column per site
+        in case of a dataframe.
+    tank_volumes : array_like
+        Tank volumes in l.
+    catchment_areas : array_like
+        Catchment (e.g. roof) areas in m².
+    demand : float or array_like
+        Water demand in l per time step, either constant, one value per time
+        step or a profile repeated cyclically (e.g. 24 hourly values).
+    runoff_coefficient : float
+        Share of the precipitation reaching the tank. Defaults to 0.8.
+    evaporation : None or pd.Series or pd.DataFrame
+        ERA5 evaporation in mm per time step (`e` of the wefesiteanalyst
+        layout, negative for evaporation) aligned with `rain`. Defaults to
+        None, i.e. no evaporation.
+    tank_surface : float
+        Open water surface of the tanks in m² exposed to evaporation.
+        Defaults to 0 (closed tanks).
+    initial_fill : float
+        Initial filling of the tanks as share of their volume. Defaults to 0.
+    Returns
+    -------
+    xarray.Dataset
+        Per site (if `rain` is a dataframe), tank volume and catchment area
+        - `reliability`: share of time steps in which the demand is fully
+          met,
+        - `volumetric_reliability`: share of the total demand supplied,
+        - `supplied`: water supplied in l,
+        - `overflow`: water spilled in l.
+    """
+    sites = None
+    if isinstance(rain, pd.DataFrame):
+        sites = rain.columns
+    rain = np.asarray(rain, dtype=float).reshape(len(rain), -1)
+    n_steps = len(rain)
+    volumes = np.sort(np.asarray(tank_volumes, dtype=float))
+    areas = np.sort(np.asarray(catchment_areas, dtype=float))
+    demand = _per_step(demand, n_steps, "demand")
+
+    # scenarios along (site, tank volume, catchment area)
+    shape = (rain.shape[1], len(volumes), len(areas))
+    inflow = runoff_coefficient * np.nan_to_num(rain)[:, :, None, None] * (
+        areas[None, None, None, :]
+    )
+    if evaporation is not None and tank_surface > 0:
+        evaporation = np.asarray(evaporation, dtype=float).reshape(
+            n_steps, -1
+        )
+        losses = np.clip(-np.nan_to_num(evaporation), 0, None) * tank_surface
+    else:
+        losses = None
+
+    capacity = np.broadcast_to(volumes[None, :, None], shape)
+    storage = initial_fill * capacity
+    served = np.empty(shape)
+    supplied = np.zeros(shape)
+    lost = np.zeros(shape)
+    met = np.zeros(shape)
+    for t in range(n_steps):
+        np.minimum(storage, demand[t], out=served)
+        storage -= served
+        supplied += served
+        met += served >= demand[t] * (1 - 1e-9)
+        storage += inflow[t]
+        np.minimum(storage, capacity, out=storage)
+        if losses is not None:
+            np.minimum(storage, losses[t][:, None, None], out=served)
+            storage -= served
+            lost += served
+    # the spilled water closes the mass balance of the tanks
+    overflow = (
+        initial_fill * capacity
+        + inflow.sum(axis=0)
+        - supplied
+        - lost
+        - storage
+    ).clip(0, None)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        volumetric = supplied / demand.sum()
+    dims = ("site", "tank_volume", "catchment_area")
+    coords = {"tank_volume": volumes, "catchment_area": areas}
+    data_vars = {
+        "reliability": (dims, met / n_steps),
+        "volumetric_reliability": (dims, volumetric),
+        "supplied": (dims, supplied),
+        "overflow": (dims, overflow),
+    }
+    result = xr.Dataset(data_vars, coords=coords)
+    if sites is None:
+        return result.isel(site=0)
+    return result.assign_coords(site=sites)
+
+
+def minimum_tank_volume(result, target=0.95, metric="reliability"):
+    """
+    Smallest simulated tank volume reaching a target reliability.
+    Parameters
+    ----------
+    result : xarray.Dataset
+        Result of `simulate_rainwater_harvesting`.
+    target : float
+        Target reliability between 0 and 1. Defaults to 0.95.
+    metric : str
+        'reliability' or 'volumetric_reliability'. Defaults to
+        'reliability'.
+    Returns
+    -------
+    xarray.DataArray
+        Tank volume in l per catchment area (and site), NaN if no simulated
+        tank reaches the target.
+    """
+    reached = result[metric] >= target
+    first = reached.argmax("tank_volume")
+    volume = result["tank_volume"].isel(tank_volume=first)
+    return volume.where(reached.any("tank_volume")).drop_vars(
+        "tank_volume", errors="ignore"
+    )
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+def _fold(previous, current, how):
+    """
+    Combine the statistics of a new block with the previous ones.
+    Parameters
+    ----------
+    previous : None or pd.Series or pd.DataFrame
+        Statistics of the previous blocks.
+    current : pd.Series or pd.DataFrame
+        Statistics of the new block.
+    how : str
+        Name of the aggregation combining both, 'sum', 'min' or 'max'.
+    Returns
+    -------
+    pd.Series or pd.DataFrame
+        Combined statistics.
+    """
+    if previous is None:
+        return current
+    combined = pd.concat([previous, current])
+    levels = list(range(combined.index.nlevels))
+    return combined.groupby(level=levels, sort=False).agg(how)
+
+
+class RunningStats:
+    """
+    Running count, sum, mean, minimum and maximum over dataframe blocks.
+    Feed the blocks yielded by `era5.iter_weather_df_from_era5` to `update`
+    to get the statistics of the whole time span without holding it in
+    memory. NaN values are ignored.
+    Parameters
+    ----------
+    by_location : bool
+        If True, the statistics are computed per grid cell, i.e. per
+        latitude and longitude level of the index of the blocks. Otherwise
+        they are computed over all rows. Defaults to False.
+    """
+
+    def __init__(self, by_location=False):
+        self.by_location = by_location
+        self.count = None
+        self.sum = None
+        self.min = None
+        self.max = None
+
+    def update(self, df):
+        """
+        Add a dataframe block to the statistics.
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Block of weather data.
+        """
+        if self.by_location:
+            data = df.groupby(level=["latitude", "longitude"], sort=False)
+        else:
+            data = df
+        self.count = _fold(self.count, data.count(), "sum")
+        self.sum = _fold(self.sum, data.sum(), "sum")
+        self.min = _fold(self.min, data.min(), "min")
+        self.max = _fold(self.max, data.max(), "max")
+
+    @property
+    def mean(self):
+        """Mean of all values added so far."""
+        if self.count is None:
+            return None
+        return self.sum / self.count.where(self.count > 0)
+
+
+class RunningHistogram:
+    """
+    Running histogram of each column over dataframe blocks.
+    Parameters
+    ----------
+    bins : array_like
+        Edges of the bins, identical for all blocks. Values outside of the
+        edges and NaN values are not counted.
+    """
+
+    def __init__(self, bins):
+        self.bins = np.asarray(bins, dtype=float)
+        self._counts = {}
+
+    def update(self, df):
+        """
+        Add a dataframe block to the histogram.
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Block of weather data.
+        """
+        for column in df.columns:
+            values = df[column].to_numpy()
+            counts, _ = np.histogram(values[~np.isnan(values)], self.bins)
+            if column in self._counts:
+                self._counts[column] += counts
+            else:
+                self._counts[column] = counts
+
+    @property
+    def counts(self):
+        """
+        pd.DataFrame
+            Number of values per bin (rows) and column of the blocks.
+        """
+        index = pd.IntervalIndex.from_breaks(self.bins)
+        if not self._counts:
+            return pd.DataFrame(index=index)
+        return pd.DataFrame(self._counts, index=index)
+
+
+def fold_blocks(blocks, *reducers):
+    """
+    Feed each dataframe block to all reducers.
+    Parameters
+    ----------
+    blocks : iterable of pd.DataFrame
+        Blocks of weather data, e.g. yielded by
+        `era5.iter_weather_df_from_era5`.
+    reducers :
+        Objects with an `update` method taking a block, e.g.
+        `RunningStats` or `RunningHistogram`.
+    Returns
+    -------
+    tuple
+        The reducers.
+    """
+    for df in blocks:
+        for reducer in reducers:
+            reducer.update(df)
+    return reducers
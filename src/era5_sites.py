@@ -0,0 +1,539 @@
+import logging
+import os
+
+import numpy as np
+import xarray as xr
+
+from cds_request_tools import snap_to_grid
+from era5 import _format_era5
+from era5 import _select_formatter_data
+from era5 import get_era5_data_from_datespan_and_position
+from era5 import open_era5_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def cluster_sites(
+    latitude, longitude, grid=None, max_waste=0.5, max_cells=400
+):
+    """
+    Group sites into rectangular boxes of grid cells to download together.
+    The sites are snapped to their nearest grid cell. Starting from one box
+    per cell, the pair of boxes whose merged bounding box adds the fewest
+    cells is merged as long as the share of cells of the merged box which do
+    not contain a site stays below `max_waste`, the merged box does not
+    contain more than `max_cells` cells and does not overlap another box.
+    Parameters
+    ----------
+    latitude : array_like
+        Latitudes of the sites.
+    longitude : array_like
+        Longitudes of the sites.
+    grid : list of float
+        Latitude and longitude grid resolutions in deg. Defaults to
+        [0.25, 0.25].
+    max_waste : float
+        Maximal share (between 0 and 1) of cells without site in a box. 0
+        only merges adjacent rows or columns of sites, 1 merges all sites
+        until `max_cells` is reached.
+    max_cells : int
+        Maximal number of grid cells of a box.
+    Returns
+    -------
+    list of dict
+        One dict per box with the `latitude` span [N, S], the `longitude`
+        span [W, E] and the indices of the `sites` it contains.
+    """
+    if grid is None:
+        grid = [0.25, 0.25]
+
+    # grid cell indices of the sites
+    lat_idx, lon_idx, _, _ = snap_to_grid(latitude, longitude, grid)
+    cells, site_cell = np.unique(
+        np.stack([lat_idx, lon_idx], axis=1), axis=0, return_inverse=True
+    )
+    site_cell = site_cell.ravel()
+
+    # bounds (north, south, west, east) as cell indices, number of occupied
+    # cells and list of occupied cells of each box, merged boxes are
+    # deactivated
+    n_boxes = len(cells)
+    bounds = np.column_stack(
+        [cells[:, 0], cells[:, 0], cells[:, 1], cells[:, 1]]
+    )
+    occupied = np.ones(n_boxes)
+    members = [[i] for i in range(n_boxes)]
+    active = np.ones(n_boxes, dtype=bool)
+
+    def box_cells(b):
+        return (b[..., 1] - b[..., 0] + 1) * (b[..., 3] - b[..., 2] + 1)
+
+    def merged_bounds(i, j):
+        return np.column_stack(
+            [
+                np.minimum(bounds[i, 0], bounds[j, 0]),
+                np.maximum(bounds[i, 1], bounds[j, 1]),
+                np.minimum(bounds[i, 2], bounds[j, 2]),
+                np.maximum(bounds[i, 3], bounds[j, 3]),
+            ]
+        )
+
+    def merge_costs(i):
+        # cells added by merging box i with each box, inf if not admissible
+        j = np.arange(n_boxes)
+        merged_cells = box_cells(merged_bounds(i, j))
+        cost = merged_cells - box_cells(bounds) - box_cells(bounds[i])
+        admissible = (
+            active
+            & (merged_cells <= max_cells)
+            & (1 - (occupied + occupied[i]) / merged_cells <= max_waste)
+        )
+        admissible[i] = False
+        return np.where(admissible, cost, np.inf)
+
+    def overlaps_others(i, j):
+        b = merged_bounds(i, j)[0]
+        others = active.copy()
+        others[[i, j]] = False
+        return (
+            others
+            & (bounds[:, 0] <= b[1])
+            & (bounds[:, 1] >= b[0])
+            & (bounds[:, 2] <= b[3])
+            & (bounds[:, 3] >= b[2])
+        ).any()
+
+    # pairwise merge costs and the cheapest merge of each box, only the
+    # costs of the merged box are updated after a merge
+    cost = np.stack([merge_costs(i) for i in range(n_boxes)])
+    row_min = cost.min(axis=1)
+    row_arg = cost.argmin(axis=1)
+    while n_boxes > 1:
+        i = np.argmin(row_min)
+        if np.isinf(row_min[i]):
+            break
+        i, j = sorted([i, row_arg[i]])
+        if overlaps_others(i, j):
+            # boxes only grow, so that the overlap persists
+            cost[i, j] = cost[j, i] = np.inf
+            stale = np.array([i, j])
+        else:
+            bounds[i] = merged_bounds(i, j)[0]
+            occupied[i] += occupied[j]
+            members[i].extend(members[j])
+            members[j] = []
+            active[j] = False
+            cost[j] = cost[:, j] = np.inf
+            cost[i] = cost[:, i] = merge_costs(i)
+            stale = np.flatnonzero(
+                (row_arg == i) | (row_arg == j) | (cost[:, i] < row_min)
+            )
+            stale = np.union1d(stale, [i, j])
+        row_min[stale] = cost[stale].min(axis=1)
+        row_arg[stale] = cost[stale].argmin(axis=1)
+
+    boxes = []
+    for i in np.flatnonzero(active):
+        b, cell_list = bounds[i], members[i]
+        boxes.append(
+            {
+                "latitude": [
+                    float(round(90 - b[0] * grid[0], 6)),
+                    float(round(90 - b[1] * grid[0], 6)),
+                ],
+                "longitude": [
+                    float(round(-180 + b[2] * grid[1], 6)),
+                    float(round(-180 + b[3] * grid[1], 6)),
+                ],
+                "sites": np.flatnonzero(np.isin(site_cell, cell_list)),
+            }
+        )
+    return boxes
+
+
+def get_era5_data_for_sites(
+    start_date,
+    end_date,
+    sites,
+    target_dir,
+    variable="feedinlib",
+    grid=None,
+    max_waste=0.5,
+    max_cells=400,
+    split_sites=True,
+    **kwargs,
+):
+    """
+    Download ERA5 data for many sites with few CDS requests.
+    Nearby sites are grouped into rectangular boxes (see `cluster_sites`),
+    each box is downloaded once and the data of each site is selected from
+    the box containing it.
+    Parameters
+    ----------
+    start_date : str
+        Start date of the date span in YYYY-MM-DD format.
+    end_date : str
+        End date of the date span in YYYY-MM-DD format.
+    sites : dict
+        Latitude and longitude of the sites as tuple (lat, lon) by site name.
+    target_dir : str
+        Folder in which the downloaded boxes and the site files are stored.
+    variable : str or list of str
+        ERA5 variables to download, see
+        `get_era5_data_from_datespan_and_position`.
+    grid : list of float
+        Latitude and longitude grid resolutions in deg. Defaults to
+        [0.25, 0.25].
+    max_waste : float
+        Maximal share of cells without site in a box, see `cluster_sites`.
+    max_cells : int
+        Maximal number of grid cells of a box, see `cluster_sites`.
+    split_sites : bool
+        If True, the data of each site is stored in the file
+        `<target_dir>/<site name>.nc`, otherwise it is returned as dataset.
+    kwargs :
+        Further parameters of `get_era5_data_from_datespan_and_position`.
+    Returns
+    -------
+    dict
+        Filename (if `split_sites` is True) or xarray.Dataset of each site by
+        site name.
+    """
+    if grid is None:
+        grid = [0.25, 0.25]
+    names = list(sites)
+    latitude, longitude = np.array([sites[n] for n in names], dtype=float).T
+    boxes = cluster_sites(latitude, longitude, grid, max_waste, max_cells)
+    logger.info(
+        "Downloading {} sites in {} requests".format(len(names), len(boxes))
+    )
+
+    os.makedirs(target_dir, exist_ok=True)
+    answer = {}
+    for i, box in enumerate(boxes):
+        box_file = os.path.join(target_dir, "box_{:03d}.nc".format(i))
+        get_era5_data_from_datespan_and_position(
+            start_date=start_date,
+            end_date=end_date,
+            target_file=box_file,
+            variable=variable,
+            latitude=box["latitude"],
+            longitude=box["longitude"],
+            grid=grid,
+            **kwargs,
+        )
+        with xr.open_dataset(box_file) as ds:
+            for s in box["sites"]:
+                # keep latitude and longitude as dimensions like in the file
+                # of a single point request
+                site = ds.sel(
+                    latitude=[latitude[s]],
+                    longitude=[longitude[s]],
+                    method="nearest",
+                ).load()
+                if split_sites:
+                    site_file = os.path.join(target_dir, names[s] + ".nc")
+                    site.to_netcdf(site_file)
+                    answer[names[s]] = site_file
+                else:
+                    answer[names[s]] = site
+    return answer
+
+
+def _axis_neighbours(coord, values):
+    """
+    Indices of the two grid points enclosing each value along an axis and
+    the relative position of the value between them.
+    Parameters
+    ----------
+    coord : array_like
+        Ascending or descending coordinates of the axis.
+    values : array_like
+        Coordinates to locate.
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray, np.ndarray)
+        Lower and upper index and relative position (0 at the lower, 1 at
+        the upper index) of each value.
+    """
+    coord = np.asarray(coord, dtype=float)
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(coord)
+    ordered = coord[order]
+    tolerance = 1e-9
+    outside = (values < ordered[0] - tolerance) | (
+        values > ordered[-1] + tolerance
+    )
+    if outside.any():
+        raise ValueError(
+            "The coordinates {} are outside of the grid [{}, {}].".format(
+                values[outside], ordered[0], ordered[-1]
+            )
+        )
+    if len(coord) == 1:
+        zeros = np.zeros(len(values), dtype=int)
+        return zeros, zeros, np.zeros(len(values))
+    j = np.clip(np.searchsorted(ordered, values, side="right") - 1, 0, None)
+    j = np.minimum(j, len(coord) - 2)
+    frac = (values - ordered[j]) / (ordered[j + 1] - ordered[j])
+    return order[j], order[j + 1], np.clip(frac, 0, 1)
+
+
+def _axis_nearest(coord, values, count):
+    """
+    Indices of the nearest grid points of each value along an axis.
+    Parameters
+    ----------
+    coord : array_like
+        Coordinates of the axis.
+    values : array_like
+        Coordinates to locate.
+    count : int
+        Number of grid points per value.
+    Returns
+    -------
+    np.ndarray
+        Indices of the `count` (at most the length of `coord`) nearest grid
+        points of each value, of shape (value, count).
+    """
+    coord = np.asarray(coord, dtype=float)
+    values = np.asarray(values, dtype=float)
+    count = min(count, len(coord))
+    order = np.argsort(coord)
+    ordered = coord[order]
+    # the nearest points are within `count` points on both sides of the
+    # position of the value in the sorted axis
+    width = min(2 * count, len(coord))
+    start = np.clip(
+        np.searchsorted(ordered, values) - count, 0, len(coord) - width
+    )
+    window = start[:, None] + np.arange(width)
+    distance = np.abs(ordered[window] - values[:, None])
+    nearest = np.argpartition(distance, count - 1, axis=1)[:, :count]
+    return order[np.take_along_axis(window, nearest, axis=1)]
+
+
+def interpolation_weights(
+    grid_latitude,
+    grid_longitude,
+    latitude,
+    longitude,
+    method="bilinear",
+    neighbours=4,
+    power=2,
+):
+    """
+    Neighbouring grid cells and weights to interpolate gridded data to sites.
+    The weights only depend on the grid and the sites, they can be computed
+    once and applied to any number of variables and time steps with
+    `interpolate_to_sites`.
+    Parameters
+    ----------
+    grid_latitude : array_like
+        Latitudes of the grid.
+    grid_longitude : array_like
+        Longitudes of the grid.
+    latitude : array_like
+        Latitudes of the sites.
+    longitude : array_like
+        Longitudes of the sites.
+    method : str
+        'bilinear' for bilinear interpolation between the four enclosing
+        cells or 'idw' for inverse distance weighting of the `neighbours`
+        nearest cells. Defaults to 'bilinear'.
+    neighbours : int
+        Number of cells used by the inverse distance weighting. Defaults to
+        4.
+    power : float
+        Power of the distance in the inverse distance weighting. Defaults to
+        2.
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Indices of the neighbouring cells in the flattened (latitude,
+        longitude) grid and their weights, both of shape (site, neighbour).
+    """
+    grid_latitude = np.asarray(grid_latitude, dtype=float)
+    grid_longitude = np.asarray(grid_longitude, dtype=float)
+    latitude = np.atleast_1d(np.asarray(latitude, dtype=float))
+    longitude = np.atleast_1d(np.asarray(longitude, dtype=float))
+    n_lon = len(grid_longitude)
+
+    if method == "bilinear":
+        lat_lo, lat_hi, fy = _axis_neighbours(grid_latitude, latitude)
+        lon_lo, lon_hi, fx = _axis_neighbours(grid_longitude, longitude)
+        indices = np.stack(
+            [
+                lat_lo * n_lon + lon_lo,
+                lat_lo * n_lon + lon_hi,
+                lat_hi * n_lon + lon_lo,
+                lat_hi * n_lon + lon_hi,
+            ],
+            axis=1,
+        )
+        weights = np.stack(
+            [
+                (1 - fy) * (1 - fx),
+                (1 - fy) * fx,
+                fy * (1 - fx),
+                fy * fx,
+            ],
+            axis=1,
+        )
+    elif method == "idw":
+        # the nearest cells of a site lie on its `neighbours` nearest
+        # latitudes and longitudes, only the distances to these cells are
+        # computed
+        lat_idx = _axis_nearest(grid_latitude, latitude, neighbours)
+        lon_idx = _axis_nearest(grid_longitude, longitude, neighbours)
+        candidates = (
+            lat_idx[:, :, None] * n_lon + lon_idx[:, None, :]
+        ).reshape(len(latitude), -1)
+        # distances in degrees of latitude, longitudes are scaled by the
+        # cosine of the latitude of the site
+        dy = latitude[:, None, None] - grid_latitude[lat_idx][:, :, None]
+        dx = (
+            longitude[:, None, None] - grid_longitude[lon_idx][:, None, :]
+        ) * np.cos(np.radians(latitude))[:, None, None]
+        distance = np.hypot(dy, dx).reshape(len(latitude), -1)
+        neighbours = min(neighbours, distance.shape[1])
+        nearest = np.argpartition(distance, neighbours - 1, axis=1)[
+            :, :neighbours
+        ]
+        indices = np.take_along_axis(candidates, nearest, axis=1)
+        distance = np.take_along_axis(distance, nearest, axis=1)
+        with np.errstate(divide="ignore"):
+            weights = 1.0 / distance ** power
+        # a site on a grid point takes the value of that point
+        on_point = distance == 0
+        weights = np.where(
+            on_point.any(axis=1, keepdims=True), on_point * 1.0, weights
+        )
+        weights /= weights.sum(axis=1, keepdims=True)
+    else:
+        raise ValueError(
+            "Unknown value for `method`. "
+            "It must be either 'bilinear' or 'idw'."
+        )
+    return indices, weights
+
+
+def interpolate_to_sites(
+    ds, latitude, longitude, method="bilinear", weights=None, **kwargs
+):
+    """
+    Interpolate gridded ERA5 data to site coordinates.
+    All variables, time steps and sites are interpolated with one batched
+    array operation per variable.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with ERA5 weather data with latitude and longitude
+        dimensions.
+    latitude : array_like
+        Latitudes of the sites.
+    longitude : array_like
+        Longitudes of the sites.
+    method : str
+        Interpolation method, see `interpolation_weights`.
+    weights : None or tuple(np.ndarray, np.ndarray)
+        Precomputed result of `interpolation_weights` for the grid of `ds`.
+        Defaults to None, in which case the weights are computed.
+    kwargs :
+        Further parameters of `interpolation_weights`.
+    Returns
+    -------
+    xarray.Dataset
+        Dataset with (time, site) variables and the latitude and longitude
+        of the sites as coordinates along the site dimension.
+    """
+    latitude = np.atleast_1d(np.asarray(latitude, dtype=float))
+    longitude = np.atleast_1d(np.asarray(longitude, dtype=float))
+    if weights is None:
+        weights = interpolation_weights(
+            ds["latitude"].values,
+            ds["longitude"].values,
+            latitude,
+            longitude,
+            method,
+            **kwargs,
+        )
+    indices, factors = weights
+
+    data_vars = {}
+    for name, da in ds.data_vars.items():
+        other_dims = [
+            d for d in da.dims if d not in ("latitude", "longitude")
+        ]
+        values = da.transpose(*other_dims, "latitude", "longitude").values
+        values = values.reshape(values.shape[: len(other_dims)] + (-1,))
+        result = np.einsum("...sk,sk->...s", values[..., indices], factors)
+        data_vars[name] = (
+            other_dims + ["site"],
+            result.astype(values.dtype, copy=False),
+            da.attrs,
+        )
+    # keep the coordinates which do not depend on the grid, e.g. time
+    grid_dims = {"latitude", "longitude"}
+    coords = {
+        k: v
+        for k, v in ds.coords.items()
+        if k not in grid_dims and not grid_dims.intersection(v.dims)
+    }
+    coords["latitude"] = ("site", latitude)
+    coords["longitude"] = ("site", longitude)
+    return xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
+
+
+def weather_df_for_sites(
+    era5_netcdf_filename,
+    sites,
+    lib,
+    method="bilinear",
+    start=None,
+    end=None,
+    float32=False,
+    **kwargs,
+):
+    """
+    Interpolate ERA5 weather data to sites and format it for a lib.
+    Parameters
+    ----------
+    era5_netcdf_filename : str or list of str
+        Filename, glob pattern or list of filenames of netCDF files containing
+        ERA5 weather data, see `era5.open_era5_dataset`.
+    sites : dict
+        Latitude and longitude of the sites as tuple (lat, lon) by site name.
+    lib : str
+        Format of the dataframes, see `era5.weather_df_from_era5`.
+    method : str
+        Interpolation method, 'bilinear' or 'idw', see
+        `interpolation_weights`.
+    start : None or anything `pandas.to_datetime` can convert to a timestamp
+        See `era5.weather_df_from_era5`.
+    end : None or anything `pandas.to_datetime` can convert to a timestamp
+        See `era5.weather_df_from_era5`.
+    float32 : bool
+        If True, the values are stored as float32. Defaults to False.
+    kwargs :
+        Further parameters of `interpolation_weights`.
+    Returns
+    -------
+    dict
+        Dataframe with a datetime index in the format required by the lib
+        by site name.
+    """
+    names = list(sites)
+    latitude, longitude = np.array([sites[n] for n in names], dtype=float).T
+    ds = open_era5_dataset(era5_netcdf_filename)
+    ds = _select_formatter_data(ds, lib, start, end, era5_netcdf_filename)
+    interpolated = interpolate_to_sites(
+        ds, latitude, longitude, method, **kwargs
+    )
+    answer = {}
+    for i, name in enumerate(names):
+        site = interpolated.isel(site=i)
+        answer[name] = _format_era5(
+            site, lib, start, end, [longitude[i], latitude[i]], float32
+        )
+    return answer
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+# key performance indicators of the WEFESiteAnalyst reports as
+# name: (column of the wefesiteanalyst dataframe, aggregation, factor)
+REPORT_STATISTICS = {
+    "solar_irrad_total": ("ghi", "sum", 1e-3),
+    "windspeed_mean": ("windspeed", "mean", 1.0),
+    "precip_total": ("tp", "sum", 1.0),
+    "temp_mean": ("t_air", "mean", 1.0),
+}
+
+AGGREGATIONS = ("mean", "sum", "min", "max", "count")
+PERIODS = ("total", "annual", "monthly", "diurnal")
+
+
+def _time_location_layout(data):
+    """
+    Positions of the rows of weather data in (time, location) arrays.
+    Parameters
+    ----------
+    data : pd.DataFrame or dict
+        Dataframe of `era5.weather_df_from_era5` or dataframes by site name.
+    Returns
+    -------
+    tuple
+        The data as one dataframe, its time steps (pd.DatetimeIndex), the
+        locations (pd.DataFrame with one column per location level, None for
+        a single location) and the time and location position of each row.
+    """
+    if isinstance(data, dict):
+        data = pd.concat(data, names=["site"])
+    index = data.index
+    if not isinstance(index, pd.MultiIndex):
+        times = pd.DatetimeIndex(index)
+        rows = np.arange(len(index))
+        return data, times, None, rows, np.zeros(len(index), dtype=int)
+    # levels of sliced frames keep their unused values
+    index = index.remove_unused_levels()
+    levels = [i for i, name in enumerate(index.names) if name != "time"]
+    time_level = index.names.index("time")
+    # combine the integer codes of the location levels to one location code
+    sizes = [len(index.levels[i]) for i in levels]
+    combined = np.ravel_multi_index([index.codes[i] for i in levels], sizes)
+    present = np.zeros(np.prod(sizes), dtype=bool)
+    present[combined] = True
+    location_codes = (np.cumsum(present) - 1)[combined]
+    level_codes = np.unravel_index(np.flatnonzero(present), sizes)
+    locations = pd.DataFrame(
+        {
+            index.names[i]: index.levels[i][codes]
+            for i, codes in zip(levels, level_codes)
+        }
+    )
+    return (
+        data,
+        pd.DatetimeIndex(index.levels[time_level]),
+        locations,
+        index.codes[time_level],
+        location_codes,
+    )
+
+
+def _period_groups(times, period):
+    """
+    Group codes and labels of the time steps for a period.
+    Parameters
+    ----------
+    times : pd.DatetimeIndex
+        Time steps of the weather data.
+    period : str
+        One of `PERIODS`.
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        Group code of each time step and label of each group.
+    """
+    if period == "total":
+        keys = np.zeros(len(times), dtype=int)
+    elif period == "annual":
+        keys = times.year.to_numpy()
+    elif period == "monthly":
+        keys = times.year.to_numpy() * 100 + times.month.to_numpy()
+    elif period == "diurnal":
+        keys = times.hour.to_numpy()
+    else:
+        raise ValueError(
+            "Unknown period '{}'. It must be one of {}.".format(
+                period, PERIODS
+            )
+        )
+    labels, codes = np.unique(keys, return_inverse=True)
+    if period == "total":
+        labels = np.array(["all"])
+    elif period == "monthly":
+        labels = np.array(
+            ["{}-{:02d}".format(k // 100, k % 100) for k in labels]
+        )
+    else:
+        labels = labels.astype(str)
+    return codes.ravel(), labels
+
+
+def _aggregate(values, starts, how):
+    """
+    Aggregate the rows of a (time, location) array by group.
+    NaN values are ignored.
+    Parameters
+    ----------
+    values : np.ndarray
+        Values of shape (time, location) with the time steps sorted by group.
+    starts : np.ndarray
+        Index of the first time step of each group.
+    how : str
+        One of `AGGREGATIONS`.
+    Returns
+    -------
+    np.ndarray
+        Aggregated values of shape (group, location).
+    """
+    valid = ~np.isnan(values)
+    if how in ("min", "max"):
+        reduce = np.fmin if how == "min" else np.fmax
+        return reduce.reduceat(values, starts, axis=0)
+    count = np.add.reduceat(valid, starts, axis=0)
+    if how == "count":
+        return count.astype(float)
+    total = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    if how == "sum":
+        return np.where(count > 0, total, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+def climate_summary(
+    data, statistics=None, periods=("total", "annual"), timezone=None
+):
+    """
+    Summarise weather data of many grid cells or sites in one table.
+    Each statistic is computed for all locations at once with vectorized
+    group reductions over the (time, location) arrays, without a loop over
+    the locations.
+    Parameters
+    ----------
+    data : pd.DataFrame or dict
+        Dataframe of `era5.weather_df_from_era5` (with a time index or a
+        multiindex with time, latitude and longitude levels) or dataframes
+        with a time index by site name (e.g. of
+        `era5_sites.weather_df_for_sites`).
+    statistics : None or dict
+        Statistics to compute as name: (column, aggregation, factor), with
+        the aggregation one of 'mean', 'sum', 'min', 'max' or 'count'; the
+        factor is applied to the result. Defaults to None, in which case the
+        report KPIs in `REPORT_STATISTICS` of wefesiteanalyst data are
+        computed.
+    periods : iterable of str
+        Periods over which the statistics are computed: 'total' for the whole
+        time span, 'annual' per year, 'monthly' per month of each year and
+        'diurnal' per hour of the day. Defaults to ('total', 'annual').
+    timezone : None or str
+        Time zone in which the periods are formed, e.g. 'America/Costa_Rica'
+        for diurnal cycles in local time. Defaults to None, in which case the
+        time stamps of the data are used.
+    Returns
+    -------
+    pd.DataFrame
+        Tidy table with one row per location, period, group, and statistic.
+        Its columns are the location levels (e.g. latitude and longitude, or
+        site), 'period', 'group' (e.g. '2020', '2020-01' or '13'),
+        'statistic' and 'value'.
+    """
+    if statistics is None:
+        statistics = REPORT_STATISTICS
+    data, times, locations, time_codes, location_codes = (
+        _time_location_layout(data)
+    )
+    n_locations = 1 if locations is None else len(locations)
+    if timezone is not None:
+        times = times.tz_convert(timezone)
+
+    for name, (column, how, _) in statistics.items():
+        if how not in AGGREGATIONS:
+            raise ValueError(
+                "Unknown aggregation '{}' of statistic '{}'. It must be one "
+                "of {}.".format(how, name, AGGREGATIONS)
+            )
+        if column not in data.columns:
+            raise ValueError(
+                "The column {} of statistic '{}' is missing in the "
+                "data.".format(column, name)
+            )
+
+    # (time, location) array of each column, NaN for missing rows
+    arrays = {}
+    for column in {column for column, _, _ in statistics.values()}:
+        values = np.full((len(times), n_locations), np.nan)
+        values[time_codes, location_codes] = data[column].to_numpy(float)
+        arrays[column] = values
+
+    tables = []
+    for period in periods:
+        codes, labels = _period_groups(times, period)
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.diff(codes[order], prepend=-1) != 0)
+        sorted_arrays = {k: v[order] for k, v in arrays.items()}
+        for name, (column, how, factor) in statistics.items():
+            values = _aggregate(sorted_arrays[column], starts, how)
+            table = {}
+            if locations is not None:
+                for level in locations.columns:
+                    table[level] = np.tile(
+                        locations[level].to_numpy(), len(labels)
+                    )
+            table["period"] = period
+            table["group"] = np.repeat(labels, n_locations)
+            table["statistic"] = name
+            table["value"] = values.ravel() * factor
+            tables.append(pd.DataFrame(table))
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+
+from era5_summary import _aggregate
+from era5_summary import _time_location_layout
+
+# daily indices of the Finkelstein-Schafer statistics with their weights
+# (following the Sandia method) for the wefesiteanalyst layout as
+# name: (column, daily aggregation, weight)
+TMY_WEIGHTS = {
+    "ghi_sum": ("ghi", "sum", 12),
+    "t_air_max": ("t_air", "max", 1),
+    "t_air_min": ("t_air", "min", 1),
+    "t_air_mean": ("t_air", "mean", 2),
+    "windspeed_max": ("windspeed", "max", 2),
+    "windspeed_mean": ("windspeed", "mean", 2),
+    "tp_sum": ("tp", "sum", 4),
+}
+
+
+def _daily_indices(arrays, times, weights):
+    """
+    Daily values of the indices of the Finkelstein-Schafer statistics.
+    Days with less than 90 % of the usual number of time steps are set to
+    NaN.
+    Parameters
+    ----------
+    arrays : dict
+        (time, location) array of each column.
+    times : pd.DatetimeIndex
+        Sorted time steps of the arrays.
+    weights : dict
+        Indices as name: (column, daily aggregation, weight).
+    Returns
+    -------
+    tuple(pd.DatetimeIndex, dict)
+        Days and (day, location) array of each index.
+    """
+    day_codes, days = pd.factorize(times.floor("D"))
+    starts = np.flatnonzero(np.diff(day_codes, prepend=-1) != 0)
+    steps = np.diff(np.append(starts, len(times)))
+    incomplete = steps < 0.9 * steps.max()
+    daily = {}
+    for name, (column, how, _) in weights.items():
+        values = _aggregate(arrays[column], starts, how)
+        values[incomplete] = np.nan
+        daily[name] = values
+    return pd.DatetimeIndex(days), daily
+
+
+def _cdf_ranks(values, axis):
+    """
+    Number of values less than or equal to each value along an axis.
+    NaN values get ranks above the number of valid values.
+    Parameters
+    ----------
+    values : np.ndarray
+        Values.
+    axis : int
+        Axis along which the values are ranked.
+    Returns
+    -------
+    np.ndarray
+        Rank of each value, equal values sharing the highest rank.
+    """
+    values = np.moveaxis(values, axis, 0)
+    order = np.argsort(values, axis=0)
+    ordered = np.take_along_axis(values, order, axis=0)
+    position = np.arange(1, len(values) + 1, dtype=float)
+    position = position.reshape((-1,) + (1,) * (values.ndim - 1))
+    # the last of equal values holds the rank of all of them
+    last = np.ones(values.shape, dtype=bool)
+    last[:-1] = ordered[:-1] != ordered[1:]
+    ranks = np.where(last, position, np.inf)
+    ranks = np.minimum.accumulate(ranks[::-1], axis=0)[::-1]
+    result = np.empty(values.shape)
+    np.put_along_axis(result, order, ranks, axis=0)
+    return np.moveaxis(result, 0, axis)
+
+
+def _fs_statistics(values):
+    """
+    Finkelstein-Schafer statistic of each candidate year.
+    Parameters
+    ----------
+    values : np.ndarray
+        Daily values of one calendar month of shape (year, day, location),
+        padded with NaN.
+    Returns
+    -------
+    np.ndarray
+        Mean absolute difference between the cumulative distribution of
+        each year and the long-term one at the daily values of the year, of
+        shape (year, location).
+    """
+    n_years, n_days, n_locations = values.shape
+    valid = ~np.isnan(values)
+    # cumulative distribution of all days of the month of all years
+    pooled = values.reshape(n_years * n_days, n_locations)
+    long_term = _cdf_ranks(pooled, 0).reshape(values.shape) / valid.sum(
+        axis=(0, 1)
+    )
+    n_valid = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        own = _cdf_ranks(values, 1) / n_valid[:, None, :]
+        difference = np.where(valid, np.abs(own - long_term), 0.0)
+        return difference.sum(axis=1) / n_valid
+
+
+def typical_meteorological_year(data, weights=None, year=2001):
+    """
+    Build a typical meteorological year (TMY) of each grid cell or site.
+    For each calendar month the year whose distributions of daily indices
+    (e.g. daily sums of ghi, daily extremes and means of temperature and
+    wind speed) are closest to the long-term distributions is selected,
+    measured by the weighted sum of the Finkelstein-Schafer statistics of
+    the indices. The cumulative distributions of all candidate years and
+    locations are computed at once with array operations. The secondary
+    criteria of the Sandia method (persistence of extremes) are not
+    applied. Candidate months with missing days are not selected.
+    Parameters
+    ----------
+    data : pd.DataFrame or dict
+        Dataframe of `era5.weather_df_from_era5` (with a time index or a
+        multiindex with time, latitude and longitude levels) or dataframes
+        with a time index by site name, covering several years.
+    weights : None or dict
+        Daily indices and their weights as name: (column, daily aggregation
+        ('mean', 'sum', 'min' or 'max'), weight). Defaults to None, in which
+        case `TMY_WEIGHTS` (wefesiteanalyst layout) is used.
+    year : int
+        Year of the time stamps of the TMY. Defaults to 2001. February 29 is
+        dropped if `year` is not a leap year.
+    Returns
+    -------
+    tuple(pd.DataFrame, pd.DataFrame)
+        The TMY in the layout of `data` (with the columns of `data`) and the
+        selected year of each month (columns 1 to 12) of each location.
+    """
+    if weights is None:
+        weights = TMY_WEIGHTS
+    data, times, locations, time_codes, location_codes = (
+        _time_location_layout(data)
+    )
+    for name, (column, _, _) in weights.items():
+        if column not in data.columns:
+            raise ValueError(
+                "The column {} of index '{}' is missing in the data.".format(
+                    column, name
+                )
+            )
+    n_locations = 1 if locations is None else len(locations)
+    arrays = {}
+    for column in data.columns:
+        values = np.full((len(times), n_locations), np.nan)
+        values[time_codes, location_codes] = data[column].to_numpy(float)
+        arrays[column] = values
+
+    days, daily = _daily_indices(arrays, times, weights)
+    years = np.unique(days.year)
+    total_weight = float(sum(w for _, _, w in weights.values()))
+
+    selected = np.empty((12, n_locations), dtype=int)
+    for month in range(1, 13):
+        in_month = days.month == month
+        year_idx = np.searchsorted(years, days.year[in_month])
+        day_idx = days.day[in_month] - 1
+        n_days = pd.to_datetime(
+            ["{}-{:02d}-01".format(y, month) for y in years]
+        ).days_in_month.to_numpy()
+        score = np.zeros((len(years), n_locations))
+        complete = np.ones((len(years), n_locations), dtype=bool)
+        for name, (_, _, weight) in weights.items():
+            values = np.full((len(years), 31, n_locations), np.nan)
+            values[year_idx, day_idx] = daily[name][in_month]
+            score += weight / total_weight * _fs_statistics(values)
+            complete &= (~np.isnan(values)).sum(axis=1) >= n_days[:, None]
+        score = np.where(complete, score, np.inf)
+        if np.isinf(score).all(axis=0).any():
+            raise ValueError(
+                "No complete data for month {} of some locations.".format(
+                    month
+                )
+            )
+        selected[month - 1] = years[np.argmin(score, axis=0)]
+
+    # time steps of the TMY: the times of the year of each selected month
+    slot = (
+        times.month * 1000000
+        + times.day * 10000
+        + times.hour * 100
+        + times.minute
+    ).to_numpy()
+    slots = np.unique(slot)
+    slot_month = slots // 1000000
+    slot_day = slots // 10000 % 100
+    if not pd.Timestamp(year=year, month=1, day=1).is_leap_year:
+        keep = ~((slot_month == 2) & (slot_day == 29))
+        slots, slot_month, slot_day = (
+            slots[keep],
+            slot_month[keep],
+            slot_day[keep],
+        )
+    tmy_times = pd.to_datetime(
+        {
+            "year": year,
+            "month": slot_month,
+            "day": slot_day,
+            "hour": slots // 100 % 100,
+            "minute": slots % 100,
+        }
+    )
+    tmy_times = pd.DatetimeIndex(tmy_times).tz_localize(times.tz)
+
+    # row of the source data of each time step of the TMY and location
+    key = times.year.to_numpy().astype(np.int64) * 100000000 + slot
+    target = (
+        selected[slot_month - 1].astype(np.int64) * 100000000
+        + slots[:, None]
+    )
+    rows = np.clip(np.searchsorted(key, target), 0, len(key) - 1)
+    found = key[rows] == target
+    columns = np.arange(n_locations)[None, :]
+
+    frame = {}
+    for column, values in arrays.items():
+        frame[column] = np.where(found, values[rows, columns], np.nan).ravel()
+    if locations is None:
+        index = tmy_times
+        index.name = data.index.name
+    else:
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(tmy_times, n_locations)]
+            + [
+                np.tile(locations[level].to_numpy(), len(tmy_times))
+                for level in locations.columns
+            ],
+            names=["time"] + list(locations.columns),
+        )
+    tmy = pd.DataFrame(frame, index=index, columns=data.columns)
+    tmy = tmy[found.ravel()]
+
+    selection = pd.DataFrame(selected.T, columns=range(1, 13))
+    if locations is not None:
+        selection.index = pd.MultiIndex.from_frame(locations)
+    return tmy, selection
@@ -0,0 +1,181 @@
+import numpy as np
+import xarray as xr
+from scipy.special import gamma
+
+# specific gas constant of dry air in J/(kg K)
+GAS_CONSTANT_DRY_AIR = 287.05
+# air density in kg/m³ of the standard atmosphere at sea level
+STANDARD_AIR_DENSITY = 1.225
+
+
+def wind_speeds(ds):
+    """
+    Wind speeds at 10 m and 100 m from the ERA5 wind components.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variables `u10`, `v10`, `u100` and `v100`.
+    Returns
+    -------
+    tuple(xarray.DataArray, xarray.DataArray)
+        Wind speeds at 10 m and 100 m in m/s.
+    """
+    return (
+        np.sqrt(ds["u10"] ** 2 + ds["v10"] ** 2),
+        np.sqrt(ds["u100"] ** 2 + ds["v100"] ** 2),
+    )
+
+
+def shear_exponent(ws10, ws100, default=1 / 7.0, limits=(0.0, 1.0)):
+    """
+    Exponent of the power law between the wind speeds at 10 m and 100 m.
+    Parameters
+    ----------
+    ws10 : xarray.DataArray
+        Wind speed at 10 m.
+    ws100 : xarray.DataArray
+        Wind speed at 100 m.
+    default : float
+        Exponent used where one of the wind speeds is 0. Defaults to 1/7.
+    limits : tuple(float, float)
+        Lower and upper limit of the exponent, which is unstable for low
+        wind speeds. Defaults to (0, 1).
+    Returns
+    -------
+    xarray.DataArray
+        Shear exponent.
+    """
+    valid = (ws10 > 0) & (ws100 > 0)
+    alpha = np.log(ws100.where(valid) / ws10.where(valid)) / np.log(10.0)
+    return alpha.fillna(default).clip(*limits).where(
+        ws10.notnull() & ws100.notnull()
+    )
+
+
+def hub_height_wind_speed(ds, hub_height, method="log"):
+    """
+    Extrapolate the ERA5 wind speed to a hub height.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variables `u10`, `v10`, `u100`, `v100` and, for
+        the logarithmic profile, the surface roughness `fsr`.
+    hub_height : float
+        Hub height in m.
+    method : str
+        'log' for the logarithmic wind profile from the wind speed at 100 m
+        and the roughness length, 'power' for the power law with the shear
+        exponent between 10 m and 100 m of each time step. Defaults to 'log'.
+    Returns
+    -------
+    xarray.DataArray
+        Wind speed at hub height in m/s.
+    """
+    ws10, ws100 = wind_speeds(ds)
+    if method == "log":
+        z0 = ds["fsr"]
+        return ws100 * np.log(hub_height / z0) / np.log(100.0 / z0)
+    elif method == "power":
+        alpha = shear_exponent(ws10, ws100)
+        return ws100 * (hub_height / 100.0) ** alpha
+    raise ValueError(
+        "Unknown value for `method`. It must be either 'log' or 'power'."
+    )
+
+
+def air_density(ds):
+    """
+    Density of dry air from the ERA5 surface pressure and temperature.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variables `sp` in Pa and `t2m` in K.
+    Returns
+    -------
+    xarray.DataArray
+        Air density in kg/m³.
+    """
+    return ds["sp"] / (GAS_CONSTANT_DRY_AIR * ds["t2m"])
+
+
+def weibull_parameters(wind_speed, dim="time"):
+    """
+    Weibull shape and scale parameters of wind speeds.
+    The parameters are estimated from the mean and the standard deviation
+    of the wind speed (empirical method of Justus et al., 1978), which only
+    needs one pass over the data of all cells.
+    Parameters
+    ----------
+    wind_speed : xarray.DataArray
+        Wind speed in m/s.
+    dim : str
+        Dimension along which the distribution is fitted. Defaults to
+        'time'.
+    Returns
+    -------
+    tuple(xarray.DataArray, xarray.DataArray)
+        Shape parameter k and scale parameter c in m/s.
+    """
+    mean = wind_speed.mean(dim)
+    std = wind_speed.std(dim)
+    k = (std / mean) ** -1.086
+    c = mean / xr.apply_ufunc(gamma, 1 + 1 / k, dask="allowed")
+    return k, c
+
+
+def wind_resource(ds, hub_height=100.0, method="log", dim="time"):
+    """
+    Wind resource of all grid cells at once.
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        Dataset with the ERA5 variables consumed by `format_windpowerlib`
+        (`u10`, `v10`, `u100`, `v100`, `fsr`, `sp` and `t2m`). The dataset
+        may be chunked with dask (see `era5.open_era5_dataset`), in which
+        case the statistics are computed chunk by chunk.
+    hub_height : float
+        Hub height in m. Defaults to 100.
+    method : str
+        Vertical extrapolation, see `hub_height_wind_speed`. Defaults to
+        'log'.
+    dim : str
+        Dimension over which the statistics are computed. Defaults to
+        'time'.
+    Returns
+    -------
+    xarray.Dataset
+        Per cell
+        - `wind_speed_mean`: mean wind speed at hub height in m/s,
+        - `shear_exponent`: power law exponent of the mean wind speeds at
+          10 m and 100 m,
+        - `weibull_k` and `weibull_c`: Weibull shape and scale (m/s) of the
+          wind speed at hub height,
+        - `power_density`: mean wind power density at hub height in W/m²,
+        - `weibull_power_density`: power density of the Weibull
+          distribution in W/m², with the mean air density.
+    """
+    ws10, ws100 = wind_speeds(ds)
+    ws_hub = hub_height_wind_speed(ds, hub_height, method)
+    if "sp" in ds and "t2m" in ds:
+        rho = air_density(ds)
+    else:
+        rho = xr.full_like(ws_hub, STANDARD_AIR_DENSITY)
+    k, c = weibull_parameters(ws_hub, dim)
+    mean_rho = rho.mean(dim)
+
+    result = xr.Dataset(
+        {
+            "wind_speed_mean": ws_hub.mean(dim),
+            "shear_exponent": np.log(ws100.mean(dim) / ws10.mean(dim))
+            / np.log(10.0),
+            "weibull_k": k,
+            "weibull_c": c,
+            "power_density": (0.5 * rho * ws_hub ** 3).mean(dim),
+            "weibull_power_density": 0.5
+            * mean_rho
+            * c ** 3
+            * xr.apply_ufunc(gamma, 1 + 3 / k, dask="allowed"),
+        }
+    )
+    result.attrs["hub_height"] = hub_height
+    return result.compute()
@@ -0,0 +1,258 @@
+import csv
+
+import numpy as np
+import pandas as pd
+
+# column names of the station exports (WeatherLink, in English and German)
+# for the variables of the wefesiteanalyst layout
+STATION_COLUMNS = {
+    "t_air": ["Temp", "Temperature"],
+    "windspeed": ["Wind Speed", "Windgeschwindigkeit"],
+    "tp": ["Rain", "Regen"],
+    "ghi": ["Solar Rad", "Sonneneinstr"],
+    "e": ["ET"],
+}
+
+# units of the station exports as unit: (scale, offset) to the units of the
+# wefesiteanalyst layout (°C, m/s, mm, W/m²)
+UNIT_CONVERSIONS = {
+    "°F": (5 / 9.0, -32 * 5 / 9.0),
+    "°C": (1.0, 0.0),
+    "mph": (0.44704, 0.0),
+    "km/h": (1 / 3.6, 0.0),
+    "m/s": (1.0, 0.0),
+    "in": (25.4, 0.0),
+    "mm": (1.0, 0.0),
+    "W/m^2": (1.0, 0.0),
+    "W/m²": (1.0, 0.0),
+}
+
+# variables summed over the resampling periods, the others are averaged
+SUMMED_VARIABLES = ["tp", "e"]
+
+
+def read_station_header(
+    filename, time_column="Date & Time", encoding="latin-1"
+):
+    """
+    Resolve the stacked header rows of a weather station export.
+    The exports start with the station name and the period, followed by
+    rows with the gateway and the sensor of each column and the row with the
+    column names in the format 'name - unit'.
+    Parameters
+    ----------
+    filename : str
+        Filename of the station export (csv).
+    time_column : str
+        Name of the time column, which marks the row of the column names.
+        Defaults to 'Date & Time'.
+    encoding : str
+        Encoding of the file. Defaults to 'latin-1'.
+    Returns
+    -------
+    tuple(str, pd.DataFrame, int)
+        Station name, a dataframe with the `name`, `unit`, `gateway` and
+        `sensor` of each column (NaN where not given) and the number of
+        header lines.
+    """
+    rows = []
+    with open(filename, encoding=encoding, newline="") as f:
+        for row in csv.reader(f):
+            rows.append(row)
+            if row and row[0].strip() == time_column:
+                break
+        else:
+            raise ValueError(
+                "The column {} was not found in the header of {}.".format(
+                    time_column, filename
+                )
+            )
+    station = rows[0][0].strip() if len(rows) > 1 else None
+
+    labels = rows[-1]
+    names, units = [], []
+    for label in labels:
+        name, _, unit = label.partition(" - ")
+        names.append(name.strip())
+        units.append(unit.strip() or np.nan)
+    # rows above the column names with one entry per column
+    stacked = [
+        [value.strip() or np.nan for value in row]
+        for row in rows[:-1]
+        if len(row) == len(labels) and any(value.strip() for value in row)
+    ]
+    columns = pd.DataFrame({"name": names, "unit": units})
+    for key, row in zip(["gateway", "sensor"], stacked):
+        columns[key] = row
+    return station, columns, len(rows)
+
+
+def _select_columns(columns, names):
+    """
+    Positions and conversions of the station columns of the variables of
+    the wefesiteanalyst layout.
+    Parameters
+    ----------
+    columns : pd.DataFrame
+        Columns of the export (see `read_station_header`).
+    names : dict
+        Variable: list of possible column names.
+    Returns
+    -------
+    dict
+        Variable: (column position, scale, offset).
+    """
+    selected = {}
+    for variable, candidates in names.items():
+        match = columns.index[columns["name"].isin(candidates)]
+        if len(match) == 0:
+            continue
+        position = match[0]
+        unit = columns.at[position, "unit"]
+        if unit not in UNIT_CONVERSIONS:
+            raise ValueError(
+                "Unknown unit {} of the column {}.".format(
+                    unit, columns.at[position, "name"]
+                )
+            )
+        scale, offset = UNIT_CONVERSIONS[unit]
+        if variable == "e":
+            # evapotranspiration is negative in the ERA5 convention
+            scale = -scale
+        selected[variable] = (position, scale, offset)
+    return selected
+
+
+def _parse_times(strings, time_format):
+    """
+    Parse time stamps by their date and time of day.
+    The dates and the times of day of long records repeat, so that only
+    their unique values are parsed.
+    Parameters
+    ----------
+    strings : pd.Series
+        Time stamps.
+    time_format : str
+        Format of the time stamps, with a space between date and time.
+    Returns
+    -------
+    pd.Series
+        Parsed time stamps.
+    """
+    date_format, _, day_format = time_format.partition(" ")
+    if not day_format:
+        return pd.to_datetime(strings, format=time_format)
+    parts = strings.str.strip().str.partition(" ")
+    date_codes, dates = pd.factorize(parts[0])
+    day_codes, days = pd.factorize(parts[2])
+    dates = pd.to_datetime(dates, format=date_format).to_numpy()
+    days = (
+        pd.to_datetime(days, format=day_format) - pd.Timestamp("1900-01-01")
+    ).to_numpy()
+    return pd.Series(
+        dates[date_codes] + days[day_codes], index=strings.index
+    )
+
+
+def read_station_export(
+    filename,
+    freq="h",
+    columns=None,
+    timezone=None,
+    time_format="%m/%d/%y %I:%M %p",
+    time_column="Date & Time",
+    encoding="latin-1",
+    chunksize=200000,
+):
+    """
+    Read a weather station export into the wefesiteanalyst layout.
+    The file is read in chunks of rows. Only the needed columns are parsed,
+    converted to the units of the wefesiteanalyst layout and aggregated to
+    `freq` chunk by chunk, so that the memory use is bounded by the size of
+    a chunk and of the resampled data. Missing values ('--') are skipped.
+    The time stamps of the export mark the end of the recording intervals,
+    the resampled time stamps mark the end of the periods as the ERA5 time
+    stamps of `era5.format_wefesiteanalyst`.
+    Parameters
+    ----------
+    filename : str
+        Filename of the station export (csv).
+    freq : str
+        Frequency of the result. Defaults to 'h'.
+    columns : None or dict
+        Column names of the export by variable (`t_air`, `windspeed`, `tp`,
+        `ghi`, `e`), see `STATION_COLUMNS`. Defaults to None, in which case
+        `STATION_COLUMNS` is used.
+    timezone : None or str
+        Time zone of the export. If given, the time stamps are converted to
+        UTC. Defaults to None (time stamps are kept as they are).
+    time_format : str
+        Format of the time stamps. Defaults to '%m/%d/%y %I:%M %p'.
+    time_column : str
+        Name of the time column. Defaults to 'Date & Time'.
+    encoding : str
+        Encoding of the file. Defaults to 'latin-1'.
+    chunksize : int
+        Number of rows read at once. Defaults to 200000.
+    Returns
+    -------
+    pd.DataFrame
+        Mean air temperature `t_air` in °C, wind speed `windspeed` in m/s
+        and irradiance `ghi` in W/m², precipitation `tp` in mm and
+        evapotranspiration `e` in mm (negative, as in ERA5) of each period,
+        for the variables found in the export. The station name is stored
+        in `attrs["station"]`.
+    """
+    if columns is None:
+        columns = STATION_COLUMNS
+    station, header, n_header = read_station_header(
+        filename, time_column, encoding
+    )
+    selected = _select_columns(header, columns)
+    if not selected:
+        raise ValueError(
+            "None of the columns {} was found in {}.".format(
+                list(columns.values()), filename
+            )
+        )
+    variables = list(selected)
+    positions = [position for position, _, _ in selected.values()]
+    scale = np.array([s for _, s, _ in selected.values()])
+    offset = np.array([o for _, _, o in selected.values()])
+
+    reader = pd.read_csv(
+        filename,
+        skiprows=n_header,
+        header=None,
+        usecols=[0] + positions,
+        dtype={position: float for position in positions},
+        na_values=["--"],
+        encoding=encoding,
+        chunksize=chunksize,
+    )
+    sums, counts = [], []
+    for chunk in reader:
+        chunk = chunk[chunk[0].notna()]
+        times = _parse_times(chunk[0], time_format)
+        if timezone is not None:
+            times = times.dt.tz_localize(
+                timezone, ambiguous="NaT", nonexistent="NaT"
+            ).dt.tz_convert("UTC")
+        values = chunk[positions].to_numpy() * scale + offset
+        values = pd.DataFrame(values, columns=variables)
+        periods = pd.DatetimeIndex(times.dt.ceil(freq))
+        valid = periods.notna()
+        grouped = values[valid].groupby(periods[valid])
+        sums.append(grouped.sum())
+        counts.append(grouped.count())
+
+    # periods split between two chunks are combined
+    total = pd.concat(sums).groupby(level=0).sum()
+    count = pd.concat(counts).groupby(level=0).sum()
+    data = total.where(count > 0)
+    averaged = [v for v in variables if v not in SUMMED_VARIABLES]
+    data[averaged] = data[averaged] / count[averaged]
+    data = data.asfreq(freq)
+    data.index.name = "time"
+    data.attrs["station"] = station
+    return data
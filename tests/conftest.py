@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+# the modules of the src folder import each other as top level modules
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+)
+
+from cds_request_tools import NETCDF_LOCK  # noqa: E402
+from era5 import ERA5_NETCDF_NAMES  # noqa: E402
+
+
+def _era5_dataset(
+    times, latitude=(50.25, 50.0), longitude=(10.0, 10.25)
+):
+    """Synthetic ERA5 dataset with the variables of all formatters"""
+    rng = np.random.default_rng(0)
+    shape = (len(times), len(latitude), len(longitude))
+    data_vars = {}
+    for name, low, high, units in [
+        ("u10", -5, 5, "m s**-1"),
+        ("v10", -5, 5, "m s**-1"),
+        ("u100", -10, 10, "m s**-1"),
+        ("v100", -10, 10, "m s**-1"),
+        ("t2m", 260, 310, "K"),
+        ("sp", 90000, 105000, "Pa"),
+        ("fsr", 0.01, 1, "m"),
+        ("ssrd", 0, 3e6, "J m**-2"),
+        ("fdir", 0, 2e6, "J m**-2"),
+        ("e", -5e-4, 0, "m of water equivalent"),
+        ("tp", 0, 5e-3, "m"),
+    ]:
+        data_vars[name] = (
+            ("time", "latitude", "longitude"),
+            rng.uniform(low, high, shape).astype("float32"),
+            {"units": units},
+        )
+    return xr.Dataset(
+        data_vars,
+        coords={
+            "time": pd.DatetimeIndex(times),
+            "latitude": list(latitude),
+            "longitude": list(longitude),
+        },
+    )
+
+
+class FakeResult:
+    def __init__(self, request):
+        self.request = request
+
+    def download(self, target_file):
+        times = [
+            pd.Timestamp(int(y), int(m), int(d), int(h[:2]))
+            for y in self.request["year"]
+            for m in self.request["month"]
+            for d in self.request["day"]
+            for h in self.request["time"]
+            if int(d) <= pd.Timestamp(int(y), int(m), 1).days_in_month
+        ]
+        # grid points of the requested area formatted as N/W/S/E
+        area = self.request.get("area", "50/10/50/10")
+        north, west, south, east = [float(e) for e in area.split("/")]
+        step = float(self.request.get("grid", "0.25/0.25").split("/")[0])
+        latitude = np.arange(north, south - step / 2, -step)
+        longitude = np.arange(west, east + step / 2, step)
+        ds = xr.Dataset(
+            {
+                ERA5_NETCDF_NAMES.get(v, v): (
+                    ("time", "latitude", "longitude"),
+                    np.full(
+                        (len(times), latitude.size, longitude.size), 280.0
+                    ),
+                )
+                for v in self.request["variable"]
+            },
+            coords={
+                "time": times,
+                "latitude": latitude,
+                "longitude": longitude,
+            },
+        )
+        with NETCDF_LOCK:
+            ds.to_netcdf(target_file)
+
+
+class FakeClient:
+    """Stand-in for cdsapi.Client() simulating the latency of the queue"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def retrieve(self, dataset_name, request):
+        with self._lock:
+            self.requests.append(request)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.latency)
+        with self._lock:
+            self.running -= 1
+        return FakeResult(request)
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
+
+
+@pytest.fixture
+def fake_client_factory():
+    return FakeClient
+
+
+@pytest.fixture
+def era5_dataset():
+    return _era5_dataset
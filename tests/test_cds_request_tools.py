@@ -0,0 +1,308 @@
+import http.server
+import os
+import socket
+import threading
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import cds_request_tools as crt
+
+
+def test_split_datespan_clips_to_dates():
+    assert crt._split_datespan("2020-01-15", "2020-03-10") == [
+        ("2020-01-15", "2020-01-31"),
+        ("2020-02-01", "2020-02-29"),
+        ("2020-03-01", "2020-03-10"),
+    ]
+
+
+def test_split_datespan_several_months():
+    assert crt._split_datespan("2020-11-01", "2021-06-30", 3) == [
+        ("2020-11-01", "2021-01-31"),
+        ("2021-02-01", "2021-04-30"),
+        ("2021-05-01", "2021-06-30"),
+    ]
+
+
+def test_chunked_download_is_merged(tmp_path, fake_client_factory):
+    client = fake_client_factory(latency=0.05)
+    target_file = str(tmp_path / "era5.nc")
+    crt.get_cds_data_from_datespan_and_position(
+        start_date="2020-01-01",
+        end_date="2020-06-30",
+        latitude=50.0,
+        longitude=10.0,
+        variable=["2t"],
+        target_file=target_file,
+        cds_client=client,
+        chunk_months=1,
+        max_workers=3,
+    )
+    assert len(client.requests) == 6
+    assert client.max_running > 1
+    with xr.open_dataset(target_file) as ds:
+        assert ds.time.size == 182 * 24
+        assert ds.indexes["time"].is_monotonic_increasing
+    # the partial files are removed
+    assert [p.name for p in tmp_path.iterdir()] == ["era5.nc"]
+
+
+def test_cached_request_skips_cds(tmp_path, fake_client):
+    from cds_cache import CDSRequestCache
+
+    cache = CDSRequestCache(str(tmp_path / "cache"))
+    for name in ("first.nc", "second.nc"):
+        crt.get_cds_data_from_datespan_and_position(
+            start_date="2020-01-01",
+            end_date="2020-01-02",
+            latitude=50.0,
+            longitude=10.0,
+            variable=["2t"],
+            target_file=str(tmp_path / name),
+            cds_client=fake_client,
+            cache=cache,
+        )
+    assert len(fake_client.requests) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    with xr.open_dataset(str(tmp_path / "second.nc")) as ds:
+        assert ds.time.size == 48
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    from cds_cache import CDSRequestCache
+
+    cache = CDSRequestCache(str(tmp_path / "cache"), max_bytes=250)
+    for i, key in enumerate(("a", "b", "c")):
+        source = tmp_path / (key + ".nc")
+        source.write_bytes(b"x" * 100)
+        cache.store(key, str(source))
+        os.utime(cache._path(key), (i, i))
+    cache.evict()
+    assert sorted(os.listdir(cache.cache_dir)) == ["b.nc", "c.nc"]
+
+
+def test_plan_datespan_across_month_boundary():
+    plan = crt.plan_cds_request_datespan("2020-12-31", "2021-12-31")
+    days = [("%02d" % d) for d in range(1, 32)]
+    assert plan["blocks"] == [
+        {"year": ["2020"], "month": ["12"], "day": ["31"]},
+        {
+            "year": ["2021"],
+            "month": ["%02d" % m for m in range(1, 13)],
+            "day": days,
+        },
+    ]
+    assert plan["planned_fields"] == 366
+    assert plan["naive_fields"] == 366 + 365
+
+
+def test_plan_datespan_groups_full_years():
+    plan = crt.plan_cds_request_datespan("2018-01-01", "2021-01-10")
+    assert [b["year"] for b in plan["blocks"]] == [
+        ["2018", "2019", "2020"],
+        ["2021"],
+    ]
+    assert plan["planned_fields"] == 365 * 2 + 366 + 10
+
+
+def test_planned_blocks_are_merged(tmp_path, fake_client):
+    target_file = str(tmp_path / "era5.nc")
+    crt.get_cds_data_from_datespan_and_position(
+        start_date="2020-01-30",
+        end_date="2020-03-02",
+        variable=["2t"],
+        target_file=target_file,
+        cds_client=fake_client,
+    )
+    assert len(fake_client.requests) == 3
+    with xr.open_dataset(target_file) as ds:
+        assert ds.time.size == 33 * 24
+        assert ds.indexes["time"].is_monotonic_increasing
+
+
+def test_merge_keeps_values_of_differently_packed_files(tmp_path):
+    files = []
+    for month, (low, high) in [("01", (270, 275)), ("07", (300, 310))]:
+        times = np.array(
+            ["2020-{}-01T{:02d}".format(month, h) for h in range(24)],
+            dtype="datetime64[ns]",
+        )
+        t2m = np.linspace(low, high, 24).reshape(24, 1, 1)
+        ds = xr.Dataset(
+            {"t2m": (("time", "latitude", "longitude"), t2m)},
+            coords={"time": times, "latitude": [50.0], "longitude": [10.0]},
+        )
+        scale = (high - low) / 60000.0
+        ds["t2m"].encoding = {
+            "dtype": "int16",
+            "scale_factor": scale,
+            "add_offset": (high + low) / 2.0,
+            "_FillValue": -32767,
+        }
+        files.append(str(tmp_path / "block_{}.nc".format(month)))
+        ds.to_netcdf(files[-1])
+
+    target_file = str(tmp_path / "era5.nc")
+    crt._merge_netcdf_files(files, target_file)
+    with xr.open_dataset(target_file) as merged:
+        july = merged["t2m"].sel(time="2020-07").values.ravel()
+    np.testing.assert_allclose(july, np.linspace(300, 310, 24), atol=1e-3)
+
+
+def test_snap_to_grid_matches_nearest_selection():
+    rng = np.random.default_rng(0)
+    latitude = rng.uniform(-89.8, 89.8, 200)
+    longitude = rng.uniform(-179.8, 179.8, 200)
+    grid = [0.1, 0.3]
+    ref = xr.Dataset(
+        {
+            "lat": np.arange(90, -90, -grid[0]),
+            "lon": np.arange(-180, 180.0, grid[1]),
+        }
+    ).sel(
+        lat=xr.DataArray(latitude),
+        lon=xr.DataArray(longitude),
+        method="nearest",
+    )
+    _, _, lat, lon = crt.snap_to_grid(latitude, longitude, grid)
+    np.testing.assert_allclose(lat, ref.lat.values, atol=1e-9)
+    np.testing.assert_allclose(lon, ref.lon.values, atol=1e-9)
+
+
+def test_area_bounds_are_snapped_outwards_to_grid():
+    request = crt._format_cds_request_area(
+        latitude_span=[50.13, 49.9],
+        longitude_span=[10.1, 10.4],
+        grid=[0.1, 0.3],
+    )
+    assert request["area"] == "50.2/9.9/49.9/10.5"
+    request = crt._format_cds_request_area(longitude_span=[10.1, 10.4])
+    assert request["area"] == "90/10/-90/10.5"
+
+
+class DroppingHandler(http.server.BaseHTTPRequestHandler):
+    """Serve a file supporting range requests, drop the first connections"""
+
+    content = b""
+    drops = 0
+    errors = 0
+    ranges = []
+
+    def do_GET(self):
+        if type(self).errors > 0:
+            type(self).errors -= 1
+            self.send_error(503)
+            return
+        offset = 0
+        if "Range" in self.headers:
+            offset = int(self.headers["Range"].split("=")[1].rstrip("-"))
+        type(self).ranges.append(offset)
+        body = self.content[offset:]
+        self.send_response(206 if offset else 200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if type(self).drops > 0:
+            type(self).drops -= 1
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def dropping_server(tmp_path):
+    ds = xr.Dataset({"t2m": ("time", np.arange(5000.0))})
+    ds.to_netcdf(str(tmp_path / "source.nc"))
+    DroppingHandler.content = (tmp_path / "source.nc").read_bytes()
+    DroppingHandler.drops = 2
+    DroppingHandler.errors = 0
+    DroppingHandler.ranges = []
+    server = http.server.HTTPServer(("127.0.0.1", 0), DroppingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}/data.nc".format(server.server_port)
+    server.shutdown()
+
+
+class UrlResult:
+    def __init__(self, location, content_length):
+        self.location = location
+        self.content_length = content_length
+
+
+def test_download_resumes_after_dropped_connection(tmp_path, dropping_server):
+    size = len(DroppingHandler.content)
+    target_file = str(tmp_path / "era5.nc")
+    crt._download_result(
+        UrlResult(dropping_server, size),
+        target_file,
+        retry_sleep=0,
+        chunk_size=1024,
+    )
+    # every reconnection resumes from the last byte received
+    assert DroppingHandler.ranges[0] == 0
+    assert 0 < DroppingHandler.ranges[1] < DroppingHandler.ranges[2] < size
+    assert (tmp_path / "era5.nc").read_bytes() == DroppingHandler.content
+    assert not os.path.exists(target_file + ".part")
+
+
+def test_incomplete_download_is_not_renamed(tmp_path, dropping_server):
+    size = len(DroppingHandler.content)
+    target_file = str(tmp_path / "era5.nc")
+    with pytest.raises(IOError):
+        crt._download_result(
+            UrlResult(dropping_server, size),
+            target_file,
+            max_tries=1,
+            retry_sleep=0,
+            chunk_size=1024,
+        )
+    assert not os.path.exists(target_file)
+    # the partial file is resumed by the next call
+    crt._download_result(
+        UrlResult(dropping_server, size),
+        target_file,
+        retry_sleep=0,
+        chunk_size=1024,
+    )
+    assert DroppingHandler.ranges[1] > 0
+    assert (tmp_path / "era5.nc").read_bytes() == DroppingHandler.content
+
+
+def test_download_retries_server_errors(tmp_path, dropping_server):
+    size = len(DroppingHandler.content)
+    target_file = str(tmp_path / "era5.nc")
+    DroppingHandler.drops = 0
+    DroppingHandler.errors = 2
+    crt._download_result(
+        UrlResult(dropping_server, size), target_file, retry_sleep=0
+    )
+    assert (tmp_path / "era5.nc").read_bytes() == DroppingHandler.content
+
+    # no byte received at all
+    DroppingHandler.errors = 2
+    with pytest.raises(IOError, match="no data received"):
+        crt._download_result(
+            UrlResult(dropping_server, size),
+            str(tmp_path / "other.nc"),
+            max_tries=2,
+            retry_sleep=0,
+        )
+
+
+def test_corrupted_download_is_rejected(tmp_path):
+    class CorruptedResult:
+        def download(self, target_file):
+            with open(target_file, "wb") as f:
+                f.write(b"CDF\x01 truncated")
+
+    target_file = str(tmp_path / "era5.nc")
+    with pytest.raises(IOError):
+        crt._download_result(CorruptedResult(), target_file)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,498 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import era5
+
+FORMATTER_PVLIB = ["fdir", "ssrd", "2t", "10u", "10v"]
+
+
+def test_incremental_download_fetches_missing_data(tmp_path, fake_client):
+    target_file = str(tmp_path / "era5.nc")
+    kwargs = dict(
+        target_file=target_file,
+        latitude=50.0,
+        longitude=10.0,
+        cds_client=fake_client,
+        incremental=True,
+    )
+    era5.get_era5_data_from_datespan_and_position(
+        "2020-01-01", "2020-01-31", variable=["2t"], **kwargs
+    )
+    era5.get_era5_data_from_datespan_and_position(
+        "2020-01-01", "2020-02-10", variable=["2t", "tp"], **kwargs
+    )
+    assert len(fake_client.requests) == 3
+    # new days are requested for all variables
+    assert fake_client.requests[1]["variable"] == ["2t", "tp"]
+    assert fake_client.requests[1]["month"] == ["02"]
+    # new variables are requested for all days
+    assert fake_client.requests[2]["variable"] == ["tp"]
+    with xr.open_dataset(target_file) as ds:
+        assert set(ds.data_vars) == {"t2m", "tp"}
+        assert ds.time.size == 41 * 24
+        assert not ds.tp.isnull().any()
+
+    # nothing is missing anymore
+    era5.get_era5_data_from_datespan_and_position(
+        "2020-01-05", "2020-02-01", variable=["tp"], **kwargs
+    )
+    assert len(fake_client.requests) == 3
+    assert [p.name for p in tmp_path.iterdir()] == ["era5.nc"]
+
+
+def test_incremental_download_completes_partly_present_days(
+    tmp_path, fake_client
+):
+    target_file = str(tmp_path / "era5.nc")
+    # interrupted download: the second day ends at 11:00, swvl1 is not in
+    # ERA5_NETCDF_NAMES
+    times = pd.date_range("2020-01-01", "2020-01-02 11:00", freq="h")
+    dims = ("time", "latitude", "longitude")
+    values = np.full((len(times), 1, 1), 280.0)
+    xr.Dataset(
+        {"t2m": (dims, values), "swvl1": (dims, values)},
+        coords={"time": times, "latitude": [50.0], "longitude": [10.0]},
+    ).to_netcdf(target_file)
+
+    era5.get_era5_data_from_datespan_and_position(
+        "2020-01-01",
+        "2020-01-02",
+        target_file=target_file,
+        variable=["2t"],
+        latitude=50.0,
+        longitude=10.0,
+        cds_client=fake_client,
+        incremental=True,
+    )
+    assert len(fake_client.requests) == 1
+    assert fake_client.requests[0]["day"] == ["02"]
+    assert fake_client.requests[0]["variable"] == ["2t", "swvl1"]
+    with xr.open_dataset(target_file) as ds:
+        assert ds.time.size == 48
+        assert not ds.swvl1.isnull().any()
+
+
+def test_select_area_point_is_nearest_cell():
+    ds = xr.Dataset(
+        {"t2m": (("latitude", "longitude"), np.arange(20.0).reshape(4, 5))},
+        coords={
+            "latitude": [50.75, 50.5, 50.25, 50.0],
+            "longitude": [10.0, 10.25, 10.5, 10.75, 11.0],
+        },
+    )
+    for lon, lat in [(10.3, 50.3), (10.0, 51.0), (12.0, 49.0)]:
+        xr.testing.assert_identical(
+            era5.select_area(ds, lon, lat),
+            ds.sel(latitude=lat, longitude=lon, method="nearest"),
+        )
+
+
+def test_select_area_of_unevenly_spaced_grid():
+    # grid combined from the files of two separate areas
+    ds = xr.Dataset(
+        {"t2m": (("latitude", "longitude"), np.arange(12.0).reshape(3, 4))},
+        coords={
+            "latitude": [51.0, 50.25, 50.0],
+            "longitude": [0.0, 0.25, 1.0, 2.0],
+        },
+    )
+    for lon, lat in [(0.9, 50.5), (0.5, 50.7), (1.6, 50.1), (3.0, 52.0)]:
+        xr.testing.assert_identical(
+            era5.select_area(ds, lon, lat),
+            ds.sel(latitude=lat, longitude=lon, method="nearest"),
+        )
+    answer = era5.select_area(ds, (0.1, 1.5), (50.0, 51.0))
+    assert answer.longitude.values.tolist() == [0.25, 1.0]
+    assert answer.latitude.values.tolist() == [51.0, 50.25]
+
+
+def test_nearest_indices_of_unevenly_spaced_coordinate():
+    for coord in ([0.0, 0.25, 1.0, 2.0], [2.0, 1.0, 0.25, 0.0]):
+        da = xr.DataArray(np.arange(4), coords={"x": coord}, dims="x")
+        values = [-1.0, 0.1, 0.125, 0.6, 0.9, 1.5, 3.0]
+        expected = [int(da.sel(x=v, method="nearest")) for v in values]
+        assert era5.nearest_indices(coord, values).tolist() == expected
+    assert era5.nearest_indices([0.0, 0.25, 1.0, 2.0], 0.9) == 2
+
+
+def test_formatter_variables_union():
+    assert era5.formatter_variables(["pvlib", "windpowerlib"]) == [
+        "fdir",
+        "ssrd",
+        "2t",
+        "10u",
+        "10v",
+        "100u",
+        "100v",
+        "fsr",
+        "sp",
+    ]
+    assert era5.formatter_variables("wefesiteanalyst") == [
+        "ssrd",
+        "2t",
+        "10u",
+        "10v",
+        "e",
+        "tp",
+    ]
+    assert era5.formatter_variables(["wefesiteanalyst", "et0"])[-2:] == [
+        "2d",
+        "sp",
+    ]
+    with pytest.raises(ValueError):
+        era5.formatter_variables("unknown")
+
+
+def test_download_only_formatter_variables(tmp_path, fake_client):
+    target_file = str(tmp_path / "era5.nc")
+    era5.get_era5_data_from_datespan_and_position(
+        "2020-01-01",
+        "2020-01-02",
+        target_file,
+        latitude=50.0,
+        longitude=10.0,
+        cds_client=fake_client,
+        formatters=["pvlib"],
+    )
+    assert fake_client.requests[0]["variable"] == FORMATTER_PVLIB
+    with pytest.raises(ValueError, match="missing"):
+        era5.weather_df_from_era5(target_file, "windpowerlib")
+
+
+def test_select_geometry_masks_inside_points():
+    from shapely.geometry import Polygon
+
+    ds = xr.Dataset(
+        {"t2m": (("latitude", "longitude"), np.ones((4, 4)))},
+        coords={
+            "latitude": [1.0, 0.75, 0.5, 0.25],
+            "longitude": [0.0, 0.25, 0.5, 0.75],
+        },
+    )
+    # triangle containing the grid points (0.5, 0.25), (0.25, 0.25) and
+    # (0.25, 0.5) as (lat, lon)
+    area = Polygon([(0.2, 0.2), (0.7, 0.2), (0.2, 0.7)])
+    selection, weights = era5.select_geometry(ds, area, return_weights=True)
+    assert int(selection.t2m.notnull().sum()) == 3
+    assert bool(selection.t2m.sel(latitude=0.5, longitude=0.25).notnull())
+    # the cell [0.125, 0.375] x [0.125, 0.375] is covered from 0.2 on
+    np.testing.assert_allclose(
+        float(weights.sel(latitude=0.25, longitude=0.25)), 0.175 ** 2 / 0.0625
+    )
+    assert float(weights.sel(latitude=1.0, longitude=0.75)) == 0.0
+    np.testing.assert_allclose(float(weights.sum()) * 0.25 ** 2, area.area)
+    assert era5.select_geometry(ds, Polygon([(5, 5), (6, 5), (6, 6)])) is None
+
+
+def test_select_area_rectangle_keeps_inside_cells_only():
+    ds = xr.Dataset(
+        {
+            "t2m": (
+                ("latitude", "longitude"),
+                np.arange(20, dtype="float32").reshape(4, 5),
+            )
+        },
+        coords={
+            "latitude": [50.75, 50.5, 50.25, 50.0],
+            "longitude": [10.0, 10.25, 10.5, 10.75, 11.0],
+        },
+    )
+    for lon, lat in [
+        ((10.0, 10.5), (50.0, 50.5)),
+        ((9.0, 12.0), (50.25, 50.3)),
+        (10.3, (49.0, 51.0)),
+        ((10.0, 10.75), 50.0),
+        ((12.0, 13.0), (50.0, 51.0)),
+    ]:
+        answer = era5.select_area(ds, lon, lat)
+        lon_w, lon_e = lon if np.size(lon) > 1 else (lon, lon + 0.25)
+        lat_s, lat_n = lat if np.size(lat) > 1 else (lat, lat + 0.25)
+        expected = ds.where(
+            (lat_s < ds.latitude)
+            & (ds.latitude <= lat_n)
+            & (lon_w < ds.longitude)
+            & (ds.longitude <= lon_e),
+            drop=True,
+        )
+        assert answer.t2m.dtype == np.float32
+        if expected.t2m.size == 0:
+            assert answer.t2m.size == 0
+            continue
+        np.testing.assert_array_equal(
+            answer.latitude.values, expected.latitude.values
+        )
+        np.testing.assert_array_equal(
+            answer.longitude.values, expected.longitude.values
+        )
+        np.testing.assert_array_equal(answer.t2m.values, expected.t2m.values)
+
+
+def test_weather_df_from_several_files(tmp_path, era5_dataset):
+    times = pd.date_range("2020-01-01", "2021-12-31 23:00", freq="h")
+    ds = era5_dataset(times)
+    filenames = []
+    for year in ("2020", "2021"):
+        filenames.append(str(tmp_path / "era5_{}.nc".format(year)))
+        ds.sel(time=year).to_netcdf(filenames[-1])
+    ds.to_netcdf(str(tmp_path / "all.nc"))
+
+    for lib in ("pvlib", "windpowerlib"):
+        expected = era5.weather_df_from_era5(str(tmp_path / "all.nc"), lib)
+        for source in (str(tmp_path / "era5_*.nc"), filenames):
+            df = era5.weather_df_from_era5(
+                source, lib, memory_budget=2 ** 20
+            )
+            pd.testing.assert_frame_equal(df, expected)
+
+
+def test_time_window_is_selected_before_formatting(
+    tmp_path, monkeypatch, era5_dataset
+):
+    times = pd.date_range("2020-01-01", "2020-03-31 23:00", freq="h")
+    filename = str(tmp_path / "era5.nc")
+    era5_dataset(times).to_netcdf(filename)
+
+    converted = []
+
+    for lib in ("pvlib", "windpowerlib"):
+        full = era5.weather_df_from_era5(filename, lib, area=[10.0, 50.0])
+        formatter = getattr(era5, "format_" + lib)
+
+        def counting_formatter(ds, *args):
+            converted.append(ds.sizes["time"])
+            return formatter(ds, *args)
+
+        monkeypatch.setattr(era5, "format_" + lib, counting_formatter)
+        for start, end in [
+            ("2020-02-01", "2020-02-07"),
+            ("2020-02", "2020-02"),
+            (
+                pd.Timestamp("2020-03-01 12:00", tz="Europe/Berlin"),
+                pd.Timestamp("2020-03-02 12:00", tz="Europe/Berlin"),
+            ),
+            ("2020-03-30", None),
+            (None, "2020-01-01 05:30"),
+        ]:
+            df = era5.weather_df_from_era5(
+                filename, lib, start=start, end=end, area=[10.0, 50.0]
+            )
+            pd.testing.assert_frame_equal(df, full[start:end])
+            assert converted[-1] <= len(df) + 1
+        monkeypatch.undo()
+
+
+def legacy_frame(ds, names, shift):
+    """Former conversion of the formatters through `to_dataframe`"""
+    df = ds[names].to_dataframe().reset_index()
+    df["time"] = df.time - shift
+    df.set_index(["time", "latitude", "longitude"], inplace=True)
+    df.sort_index(inplace=True)
+    df = df.tz_localize("UTC", level=0)
+    return df[names].dropna()
+
+
+def test_formatters_match_dataframe_conversion(era5_dataset):
+    ds = era5_dataset(
+        pd.date_range("2020-01-01", periods=48, freq="h"),
+        latitude=(50.5, 50.25, 50.0),
+    )
+    ds["t2m"][3, 1, 0] = np.nan
+    for selection in (ds, era5.select_area(ds, 10.0, 50.0)):
+        df = era5.format_pvlib(selection)
+        ref = selection.assign(
+            wind_speed=np.sqrt(selection.u10 ** 2 + selection.v10 ** 2),
+            temp_air=selection.t2m - 273.15,
+            ghi=selection.ssrd / 3600.0,
+            dhi=selection.ssrd / 3600.0 - selection.fdir / 3600.0,
+        )
+        expected = legacy_frame(
+            ref,
+            ["wind_speed", "temp_air", "ghi", "dhi"],
+            pd.Timedelta(minutes=30),
+        )
+        pd.testing.assert_frame_equal(df, expected)
+
+        df = era5.format_windpowerlib(selection)
+        ref = selection.assign(
+            wnd10m=np.sqrt(selection.u10 ** 2 + selection.v10 ** 2),
+            wnd100m=np.sqrt(selection.u100 ** 2 + selection.v100 ** 2),
+        )
+        expected = legacy_frame(
+            ref,
+            ["wnd10m", "wnd100m", "sp", "t2m", "fsr"],
+            pd.Timedelta(minutes=60),
+        )
+        assert df.columns.tolist() == [
+            ("wind_speed", 10),
+            ("wind_speed", 100),
+            ("pressure", 0),
+            ("temperature", 2),
+            ("roughness_length", 0),
+        ]
+        np.testing.assert_array_equal(df.values, expected.values)
+        pd.testing.assert_index_equal(df.index, expected.index)
+    # the input dataset is not modified
+    assert "wind_speed" not in ds
+
+
+def test_wefesiteanalyst_formatter_and_float32(tmp_path, era5_dataset):
+    ds = era5_dataset(pd.date_range("2020-01-01", periods=24, freq="h"))
+    df = era5.format_wefesiteanalyst(era5.select_area(ds, 10.0, 50.0))
+    assert df.columns.tolist() == ["ghi", "t_air", "e", "tp", "windspeed"]
+    point = ds.sel(latitude=50.0, longitude=10.0)
+    np.testing.assert_allclose(df["ghi"], point.ssrd / 3600.0, rtol=1e-6)
+    np.testing.assert_allclose(df["t_air"], point.t2m - 273.15, rtol=1e-6)
+    np.testing.assert_allclose(df["tp"], point.tp * 1000, rtol=1e-6)
+    # the time stamps of the ERA5 data are kept
+    assert df.index.get_level_values("time")[0] == pd.Timestamp(
+        "2020-01-01", tz="UTC"
+    )
+
+    filename = str(tmp_path / "era5.nc")
+    ds.astype("float64").to_netcdf(filename)
+    for lib in ("pvlib", "windpowerlib", "wefesiteanalyst"):
+        full = era5.weather_df_from_era5(filename, lib)
+        compact = era5.weather_df_from_era5(filename, lib, float32=True)
+        assert (full.dtypes == "float64").all()
+        assert (compact.dtypes == "float32").all()
+        np.testing.assert_allclose(compact.values, full.values, rtol=1e-6)
+
+
+def test_iter_weather_df_from_era5_blocks(tmp_path, era5_dataset):
+    ds = era5_dataset(
+        pd.date_range("2020-01-30", "2020-03-02", freq="h"),
+        latitude=(50.5, 50.25, 50.0),
+    )
+    filename = str(tmp_path / "era5.nc")
+    ds.to_netcdf(filename)
+
+    for lib in ("pvlib", "windpowerlib", "wefesiteanalyst"):
+        full = era5.weather_df_from_era5(filename, lib)
+        blocks = list(
+            era5.iter_weather_df_from_era5(filename, lib, freq="M")
+        )
+        # one block per month of the shifted time stamps
+        months = {b.index.get_level_values("time")[0].month for b in blocks}
+        assert len(blocks) == len(months) == 3
+        pd.testing.assert_frame_equal(pd.concat(blocks), full)
+
+        tiles = list(
+            era5.iter_weather_df_from_era5(
+                filename, lib, freq="M", tile_size=2, start="2020-02"
+            )
+        )
+        assert len(tiles) == 4
+        assert max(len(t) for t in tiles) <= 29 * 24 * 2 * 2
+        pd.testing.assert_frame_equal(
+            pd.concat(tiles).sort_index(), full.loc["2020-02":]
+        )
+
+    point = list(
+        era5.iter_weather_df_from_era5(
+            filename, "pvlib", freq="M", area=[10.0, 50.0]
+        )
+    )
+    pd.testing.assert_frame_equal(
+        pd.concat(point),
+        era5.weather_df_from_era5(filename, "pvlib", area=[10.0, 50.0]),
+    )
+
+
+@pytest.mark.parametrize("store", ["points.nc", "points.zarr"])
+def test_point_store_reads_like_source(tmp_path, store, era5_dataset):
+    if store.endswith(".zarr"):
+        pytest.importorskip("zarr")
+    times = pd.date_range("2020-01-01", "2021-12-31 23:00", freq="h")
+    ds = era5_dataset(times, latitude=(50.5, 50.25, 50.0))
+    for year in (2020, 2021):
+        ds.sel(time=str(year)).to_netcdf(tmp_path / "era5_{}.nc".format(year))
+    source = str(tmp_path / "era5_*.nc")
+    target = era5.convert_era5_to_point_store(source, str(tmp_path / store))
+
+    with era5.open_era5_dataset(target) as points:
+        # one chunk per grid cell holding the whole time series
+        encoding = points["t2m"].encoding
+        chunks = encoding.get("chunksizes", encoding.get("chunks"))
+        assert tuple(chunks) == (len(times), 1, 1)
+        xr.testing.assert_equal(
+            era5.select_area(points, 10.25, 50.25),
+            era5.select_area(ds, 10.25, 50.25),
+        )
+    for area in ([10.25, 50.25], [(10.0, 10.25), (50.0, 50.5)]):
+        pd.testing.assert_frame_equal(
+            era5.weather_df_from_era5(target, "pvlib", area=area),
+            era5.weather_df_from_era5(source, "pvlib", area=area),
+        )
+
+
+@pytest.mark.parametrize("store", ["points.nc", "points.zarr"])
+def test_point_store_of_differently_packed_files(
+    tmp_path, store, era5_dataset
+):
+    if store.endswith(".zarr"):
+        pytest.importorskip("zarr")
+    times = pd.date_range("2020-01-01", "2020-02-29 23:00", freq="h")
+    ds = era5_dataset(times)[["t2m"]]
+    ds["t2m"] += 20 * (ds.time.dt.month == 2)
+    packing = {"01": (1e-3, 285.0), "02": (2e-3, 300.0)}
+    for month, (scale, offset) in packing.items():
+        # int16 packing of the CDS, with a scale and offset per file
+        ds.sel(time="2020-" + month).to_netcdf(
+            tmp_path / "era5_{}.nc".format(month),
+            encoding={
+                "t2m": {
+                    "dtype": "int16",
+                    "scale_factor": scale,
+                    "add_offset": offset,
+                    "_FillValue": -32767,
+                }
+            },
+        )
+    source = str(tmp_path / "era5_*.nc")
+    target = era5.convert_era5_to_point_store(source, str(tmp_path / store))
+    with era5.open_era5_dataset(source) as expected:
+        with era5.open_era5_dataset(target) as points:
+            np.testing.assert_allclose(points.t2m, expected.t2m, rtol=1e-6)
+            assert points.t2m.attrs["units"] == "K"
+
+
+def test_format_pvlib_solar_position(tmp_path, era5_dataset):
+    ds = era5_dataset(pd.date_range("2020-06-20", periods=48, freq="h"))
+    df = era5.format_pvlib(ds, solar_position=True)
+    assert df.columns.tolist() == [
+        "wind_speed",
+        "temp_air",
+        "ghi",
+        "dhi",
+        "dni",
+        "zenith",
+        "azimuth",
+        "dni_extra",
+    ]
+    pd.testing.assert_frame_equal(df.iloc[:, :4], era5.format_pvlib(ds))
+
+    # around the summer solstice the sun culminates in the south at about
+    # 90 - 50 + 23.4 deg above the horizon
+    noon = df.loc[df.zenith.groupby(level="time").mean().idxmin()]
+    np.testing.assert_allclose(noon.zenith, 50 - 23.4, atol=1)
+    np.testing.assert_allclose(noon.azimuth, 180, atol=10)
+
+    up = df.zenith <= 87
+    unlimited = up & (df.dni < df.dni_extra)
+    np.testing.assert_allclose(
+        (df.dni * np.cos(np.radians(df.zenith)))[unlimited],
+        (df.ghi - df.dhi)[unlimited],
+        rtol=1e-4,
+    )
+    assert (df.dni[~up] == 0).all()
+
+    pvlib = pytest.importorskip("pvlib")
+    point = df.xs((50.0, 10.25), level=["latitude", "longitude"])
+    expected = pvlib.solarposition.get_solarposition(point.index, 50.0, 10.25)
+    np.testing.assert_allclose(point.zenith, expected.zenith, atol=0.3)
+    above = expected.zenith < 85
+    np.testing.assert_allclose(
+        point.azimuth[above], expected.azimuth[above], atol=0.5
+    )
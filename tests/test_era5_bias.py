@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from era5_bias import apply_quantile_mapping
+from era5_bias import fit_quantile_mapping
+
+
+def site_data(times, seed):
+    rng = np.random.default_rng(seed)
+    rain = rng.exponential(1.0, len(times))
+    rain[rng.random(len(times)) < 0.7] = 0.0
+    return pd.DataFrame(
+        {
+            "t_air": rng.normal(20, 3, len(times)),
+            "tp": rain,
+            "ghi": rng.uniform(0, 800, len(times)),
+        },
+        index=times.rename("time"),
+    )
+
+
+def test_quantile_mapping_of_sites():
+    times = pd.date_range("2020-01-01", "2021-12-31 23:00", freq="h")
+    era5 = {"a": site_data(times, 0), "b": site_data(times, 1)}
+    # stations cover one year and have a different bias in each month
+    stations = {}
+    for name, frame in era5.items():
+        station = frame.loc["2020"].copy()
+        month = station.index.month.to_numpy()
+        station["t_air"] = 1.1 * station["t_air"] + month / 4
+        station["tp"] = 2 * station["tp"]
+        station.index = station.index.tz_localize("UTC")
+        stations[name] = station[["t_air", "tp"]]
+    stations["a"].iloc[:100] = np.nan
+
+    mapping = fit_quantile_mapping(era5, stations)
+    assert dict(mapping.sizes) == {
+        "month": 12,
+        "quantile": 101,
+        "location": 2,
+        "variable": 2,
+    }
+
+    corrected = apply_quantile_mapping(era5, mapping)
+    assert list(corrected) == ["a", "b"]
+    for name, frame in era5.items():
+        result = corrected[name]
+        month = result.index.month.to_numpy()
+        assert result.index.equals(frame.index)
+        # the fitted year is mapped onto the station values
+        fitted = result.loc["2020"]
+        n_fitted = len(fitted)
+        expected = 1.1 * frame.loc["2020", "t_air"] + month[:n_fitted] / 4
+        np.testing.assert_allclose(
+            fitted["t_air"].iloc[100:], expected.iloc[100:], atol=0.3
+        )
+        # the mapping of each month applies to the full record
+        expected = 1.1 * frame.loc["2021", "t_air"] + month[n_fitted:] / 4
+        np.testing.assert_allclose(
+            result.loc["2021", "t_air"].mean(), expected.mean(), atol=0.05
+        )
+        # dry hours stay dry, other hours are scaled
+        dry = frame["tp"] == 0
+        assert (result.loc[dry, "tp"] == 0).all()
+        np.testing.assert_allclose(
+            result["tp"].sum(), 2 * frame["tp"].sum(), rtol=0.05
+        )
+        # variables without station data are kept
+        pd.testing.assert_series_equal(result["ghi"], frame["ghi"])
+
+
+def test_quantile_mapping_of_single_location():
+    times = pd.date_range("2020-01-01", periods=24 * 60, freq="h")
+    era5 = site_data(times, 2)
+    station = era5[["t_air"]] - 2
+    mapping = fit_quantile_mapping(era5, station)
+    assert "location" not in mapping.dims
+    # months without data are not corrected
+    assert mapping["era5"].sel(month=5).isnull().all()
+
+    later = site_data(pd.date_range("2020-05-01", periods=48, freq="h"), 3)
+    data = pd.concat([era5.iloc[:48], later])
+    corrected = apply_quantile_mapping(data, mapping)
+    np.testing.assert_allclose(
+        corrected["t_air"].iloc[:48], data["t_air"].iloc[:48] - 2, atol=1e-9
+    )
+    np.testing.assert_allclose(
+        corrected["t_air"].iloc[48:], data["t_air"].iloc[48:]
+    )
+
+
+def test_quantile_mapping_errors():
+    times = pd.date_range("2020-01-01", periods=10, freq="h")
+    era5 = {"a": site_data(times, 0)}
+    with pytest.raises(ValueError, match="missing in the ERA5 data"):
+        fit_quantile_mapping(era5, {"b": site_data(times, 1)})
+    with pytest.raises(ValueError, match="no common time steps"):
+        fit_quantile_mapping(
+            era5, {"a": site_data(times + pd.Timedelta("1D"), 1)}
+        )
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import era5_et0
+
+
+def dewpoint(ea):
+    """Dewpoint in K of an actual vapour pressure in kPa"""
+    x = np.log(ea / 0.6108)
+    return 237.3 * x / (17.27 - x) + 273.15
+
+
+def era5_point(times, t2m, ea, u2, ssrd, sp, latitude, longitude):
+    u10 = u2 * np.log(67.8 * 10 - 5.42) / 4.87
+    dims = ("time", "latitude", "longitude")
+
+    def grid(values):
+        return (dims, np.broadcast_to(values, len(times))[:, None, None])
+
+    return xr.Dataset(
+        {
+            "t2m": grid(t2m),
+            "d2m": grid(dewpoint(ea)),
+            "u10": grid(u10),
+            "v10": grid(0.0),
+            "ssrd": grid(ssrd),
+            "sp": grid(sp),
+        },
+        coords={
+            "time": times,
+            "latitude": [latitude],
+            "longitude": [longitude],
+        },
+    )
+
+
+def test_hourly_et0_fao56_example_19():
+    # N'Diaye, Senegal, 1 October, 14:00 to 15:00 and 02:00 to 03:00
+    times = pd.DatetimeIndex(["2020-10-01 15:00", "2020-10-01 03:00"])
+    ds = era5_point(
+        times,
+        t2m=np.array([38.0, 28.0]) + 273.15,
+        ea=np.array([3.378, 3.402]),
+        u2=np.array([3.3, 1.9]),
+        ssrd=np.array([2.450e6, 0.0]),
+        sp=101200.0,
+        latitude=16.217,
+        longitude=-16.25,
+    )
+    et0 = era5_et0.reference_evapotranspiration(ds, freq="h", elevation=8)
+    np.testing.assert_allclose(et0.values.ravel(), [0.63, 0.0], atol=0.03)
+
+
+def test_daily_et0_fao56_example_18():
+    # Uccle (Brussels), 6 July: Tmax 21.5 °C, Tmin 12.3 °C, Rs 22.07 MJ/m²
+    times = pd.date_range("2020-07-06", periods=24, freq="h")
+    hours = np.arange(24.0)
+    t2m = 16.9 + 4.6 * np.sin((hours - 9) * np.pi / 12) + 273.15
+    # radiation accumulated over the hour ending at the time stamp
+    ssrd = np.clip(np.sin((hours - 0.5 - 4.2) * np.pi / 15.6), 0, None)
+    ssrd = ssrd / ssrd.sum() * 22.07e6
+    ds = era5_point(
+        times,
+        t2m=t2m,
+        ea=1.409,
+        u2=2.078,
+        ssrd=ssrd,
+        sp=100100.0,
+        latitude=50.8,
+        longitude=4.35,
+    )
+    et0 = era5_et0.reference_evapotranspiration(ds, freq="D", elevation=100)
+    assert et0.sizes["time"] == 1
+    np.testing.assert_allclose(et0.values.ravel(), 3.9, atol=0.1)
+
+    # lazy input gives the same result
+    lazy = era5_et0.reference_evapotranspiration(
+        ds.chunk({"time": 6}), freq="D", elevation=100
+    )
+    assert lazy.chunks is not None
+    xr.testing.assert_allclose(lazy.compute(), et0)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from era5_rainwater import minimum_tank_volume
+from era5_rainwater import simulate_rainwater_harvesting
+
+
+def reference_tank(rain, volume, area, demand, coefficient, losses):
+    storage, met, supplied, overflow = 0.0, 0, 0.0, 0.0
+    for r, d, loss in zip(rain, demand, losses):
+        served = min(storage, d)
+        storage -= served
+        supplied += served
+        met += served >= d
+        storage += coefficient * area * r
+        overflow += max(storage - volume, 0.0)
+        storage = min(storage, volume)
+        storage -= min(storage, loss)
+    return met / len(rain), supplied, overflow
+
+
+def test_simulation_matches_reference_loop():
+    times = pd.date_range("2020-01-01", periods=24 * 60, freq="h")
+    rng = np.random.default_rng(1)
+    rain = pd.Series(rng.exponential(2, len(times)), index=times)
+    rain[rng.random(len(times)) < 0.9] = 0.0
+    evaporation = pd.Series(-rng.uniform(0, 0.2, len(times)), index=times)
+    profile = np.r_[np.full(6, 2.0), np.full(12, 12.0), np.full(6, 6.0)]
+
+    result = simulate_rainwater_harvesting(
+        rain,
+        [1000, 250, 5000],
+        [20, 80],
+        profile,
+        evaporation=evaporation,
+        tank_surface=1.5,
+    )
+    assert result["reliability"].dims == ("tank_volume", "catchment_area")
+    assert list(result["tank_volume"]) == [250, 1000, 5000]
+
+    demand = np.resize(profile, len(times))
+    for volume in [250, 1000, 5000]:
+        for area in [20, 80]:
+            reliability, supplied, overflow = reference_tank(
+                rain.to_numpy(),
+                volume,
+                area,
+                demand,
+                0.8,
+                -evaporation.to_numpy() * 1.5,
+            )
+            point = result.sel(tank_volume=volume, catchment_area=area)
+            assert float(point["reliability"]) == pytest.approx(reliability)
+            assert float(point["supplied"]) == pytest.approx(supplied)
+            assert float(point["overflow"]) == pytest.approx(
+                overflow, abs=1e-6
+            )
+            assert float(point["volumetric_reliability"]) == pytest.approx(
+                supplied / demand.sum()
+            )
+
+    # reliability does not decrease with the tank volume or the catchment
+    reliability = result["reliability"].to_numpy()
+    assert (np.diff(reliability, axis=0) >= 0).all()
+    assert (np.diff(reliability, axis=1) >= 0).all()
+
+
+def test_sites_and_minimum_tank_volume():
+    times = pd.date_range("2020-01-01", periods=10, freq="D")
+    rain = pd.DataFrame(
+        {"wet": [10.0, 0, 0, 0, 0] * 2, "dry": [0.0] * 10}, index=times
+    )
+    result = simulate_rainwater_harvesting(
+        rain, [100, 200, 400], [50], 100, runoff_coefficient=1.0
+    )
+    assert result["reliability"].dims == (
+        "site",
+        "tank_volume",
+        "catchment_area",
+    )
+    # 500 l per rain event cover the demand of the 4 following days with a
+    # tank of 400 l
+    wet = result["reliability"].sel(site="wet", catchment_area=50)
+    np.testing.assert_allclose(wet, [0.2, 0.4, 0.8])
+    assert float(result["overflow"].sel(site="dry").sum()) == 0
+
+    volume = minimum_tank_volume(result, target=0.4)
+    assert float(volume.sel(site="wet", catchment_area=50)) == 200
+    assert np.isnan(float(volume.sel(site="dry", catchment_area=50)))
+
+
+def test_wrong_demand_length():
+    rain = pd.Series(np.zeros(10))
+    with pytest.raises(ValueError, match="demand"):
+        simulate_rainwater_harvesting(rain, [100], [10], np.ones(3))
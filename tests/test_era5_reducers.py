@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from era5_reducers import RunningHistogram, RunningStats, fold_blocks
+
+
+def blocks_frame():
+    index = pd.MultiIndex.from_product(
+        [
+            pd.date_range("2020-01-01", periods=10, freq="D", tz="UTC"),
+            [50.0, 50.25],
+            [10.0],
+        ],
+        names=["time", "latitude", "longitude"],
+    )
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {"ghi": rng.uniform(0, 800, len(index)), "t_air": np.nan},
+        index=index,
+    )
+    df.loc[df.index[:8], "t_air"] = rng.normal(10, 5, 8)
+    return df
+
+
+def test_running_stats_match_whole_frame():
+    df = blocks_frame()
+    blocks = [df.iloc[:6], df.iloc[6:13], df.iloc[13:]]
+    stats, per_cell, hist = fold_blocks(
+        blocks,
+        RunningStats(),
+        RunningStats(by_location=True),
+        RunningHistogram(np.linspace(0, 800, 9)),
+    )
+    pd.testing.assert_series_equal(stats.count, df.count())
+    pd.testing.assert_series_equal(stats.mean, df.mean())
+    pd.testing.assert_series_equal(stats.min, df.min())
+    pd.testing.assert_series_equal(stats.max, df.max())
+
+    grouped = df.groupby(level=["latitude", "longitude"])
+    pd.testing.assert_frame_equal(per_cell.sum, grouped.sum())
+    pd.testing.assert_frame_equal(per_cell.max, grouped.max())
+    pd.testing.assert_frame_equal(per_cell.mean, grouped.mean())
+
+    for column in df.columns:
+        expected, _ = np.histogram(
+            df[column].dropna(), np.linspace(0, 800, 9)
+        )
+        np.testing.assert_array_equal(hist.counts[column], expected)
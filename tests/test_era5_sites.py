@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import era5
+import era5_sites
+
+
+def test_cluster_sites_respects_waste():
+    latitude = [50.0, 50.1, 50.26, 40.0, 40.0]
+    longitude = [10.0, 10.05, 10.3, 0.0, 0.5]
+    boxes = era5_sites.cluster_sites(latitude, longitude, max_waste=0.5)
+    assert len(boxes) == 2
+    assert boxes[0]["latitude"] == [50.25, 50.0]
+    assert boxes[0]["longitude"] == [10.0, 10.25]
+    np.testing.assert_array_equal(boxes[0]["sites"], [0, 1, 2])
+    # without waste, only the sites on the same cell are grouped
+    boxes = era5_sites.cluster_sites(latitude, longitude, max_waste=0.0)
+    assert len(boxes) == 4
+
+
+def test_cluster_sites_boxes_do_not_overlap():
+    # a column and a row of sites crossing on a cell without site
+    latitude = [50.75, 50.25, 50.0, 50.25]
+    longitude = [10.5, 10.0, 10.5, 10.75]
+    boxes = era5_sites.cluster_sites(latitude, longitude, max_waste=0.6)
+    for a, box in enumerate(boxes):
+        for other in boxes[:a]:
+            assert (
+                box["latitude"][1] > other["latitude"][0]
+                or box["latitude"][0] < other["latitude"][1]
+                or box["longitude"][0] > other["longitude"][1]
+                or box["longitude"][1] < other["longitude"][0]
+            )
+    sites = np.sort(np.concatenate([box["sites"] for box in boxes]))
+    np.testing.assert_array_equal(sites, np.arange(4))
+
+
+def test_sites_are_downloaded_per_box(tmp_path, fake_client):
+    sites = {"a": (50.0, 10.0), "b": (50.26, 10.3), "c": (40.0, 0.5)}
+    files = era5_sites.get_era5_data_for_sites(
+        "2020-01-01",
+        "2020-01-02",
+        sites,
+        str(tmp_path),
+        variable=["2t"],
+        cds_client=fake_client,
+    )
+    assert len(fake_client.requests) == 2
+    assert sorted(files) == ["a", "b", "c"]
+    with xr.open_dataset(files["b"]) as ds:
+        assert ds.latitude.values.tolist() == [50.25]
+        assert ds.longitude.values.tolist() == [10.25]
+        assert ds.t2m.shape == (48, 1, 1)
+    assert os.path.exists(files["c"])
+
+
+def test_interpolation_to_sites():
+    times = pd.date_range("2020-01-01", periods=6, freq="h")
+    latitude = np.array([50.5, 50.25, 50.0])
+    longitude = np.array([10.0, 10.25])
+    # linear field, which the bilinear interpolation reproduces exactly
+    field = (
+        2.0 * latitude[None, :, None]
+        + 3.0 * longitude[None, None, :]
+        + np.arange(len(times))[:, None, None]
+    )
+    ds = xr.Dataset(
+        {"t2m": (("time", "latitude", "longitude"), field)},
+        coords={"time": times, "latitude": latitude, "longitude": longitude},
+    )
+    site_lat = np.array([50.1, 50.5, 50.3])
+    site_lon = np.array([10.2, 10.0, 10.05])
+
+    result = era5_sites.interpolate_to_sites(ds, site_lat, site_lon)
+    assert result["t2m"].dims == ("time", "site")
+    expected = (
+        2.0 * site_lat[None, :]
+        + 3.0 * site_lon[None, :]
+        + np.arange(len(times))[:, None]
+    )
+    np.testing.assert_allclose(result["t2m"].values, expected)
+
+    weights = era5_sites.interpolation_weights(
+        latitude, longitude, site_lat, site_lon, method="idw"
+    )
+    np.testing.assert_allclose(weights[1].sum(axis=1), 1)
+    result = era5_sites.interpolate_to_sites(
+        ds, site_lat, site_lon, weights=weights
+    )
+    # a site on a grid point takes its value, the others lie in between
+    np.testing.assert_allclose(
+        result["t2m"].isel(site=1),
+        ds["t2m"].sel(latitude=50.5, longitude=10.0),
+    )
+    assert (result["t2m"].values >= field.min()).all()
+    assert (result["t2m"].values <= field.max()).all()
+
+    with pytest.raises(ValueError):
+        era5_sites.interpolate_to_sites(ds, [51.0], [10.0])
+
+
+def test_idw_selects_nearest_cells_of_large_grid():
+    latitude = np.arange(60.0, 40.0, -0.25)
+    longitude = np.arange(0.0, 20.0, 0.25)
+    rng = np.random.default_rng(0)
+    site_lat = rng.uniform(40, 60, 50)
+    site_lon = rng.uniform(0, 20, 50)
+    indices, weights = era5_sites.interpolation_weights(
+        latitude, longitude, site_lat, site_lon, method="idw", neighbours=6
+    )
+    # distances to all cells of the grid
+    grid_lat, grid_lon = np.meshgrid(latitude, longitude, indexing="ij")
+    distance = np.hypot(
+        site_lat[:, None] - grid_lat.ravel(),
+        (site_lon[:, None] - grid_lon.ravel())
+        * np.cos(np.radians(site_lat))[:, None],
+    )
+    expected = np.sort(np.argsort(distance, axis=1)[:, :6], axis=1)
+    np.testing.assert_array_equal(np.sort(indices, axis=1), expected)
+    np.testing.assert_allclose(weights.sum(axis=1), 1)
+
+
+def test_weather_df_for_sites_matches_grid_points(tmp_path, era5_dataset):
+    ds = era5_dataset(pd.date_range("2020-01-01", periods=24, freq="h"))
+    filename = str(tmp_path / "era5.nc")
+    ds.to_netcdf(filename)
+    sites = {"on_grid": (50.25, 10.25), "between": (50.1, 10.1)}
+    for lib in ("pvlib", "windpowerlib", "wefesiteanalyst"):
+        frames = era5_sites.weather_df_for_sites(filename, sites, lib)
+        expected = era5.weather_df_from_era5(
+            filename, lib, area=[10.25, 50.25]
+        )
+        pd.testing.assert_frame_equal(
+            frames["on_grid"], expected, check_exact=False, rtol=1e-6
+        )
+        assert frames["between"].index.equals(expected.index)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from era5_summary import climate_summary
+
+
+def weather_frame():
+    index = pd.MultiIndex.from_product(
+        [
+            pd.date_range("2019-12-30", "2020-02-02", freq="h", tz="UTC"),
+            [50.0, 50.25],
+            [10.0, 10.25, 10.5],
+        ],
+        names=["time", "latitude", "longitude"],
+    )
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "ghi": rng.uniform(0, 800, len(index)),
+            "t_air": rng.normal(20, 5, len(index)),
+            "windspeed": rng.uniform(0, 10, len(index)),
+            "tp": rng.uniform(0, 2, len(index)),
+        },
+        index=index,
+    )
+    df.iloc[5, 1] = np.nan
+    return df
+
+
+def test_climate_summary_matches_groupby():
+    df = weather_frame()
+    summary = climate_summary(
+        df, periods=("total", "annual", "monthly", "diurnal")
+    )
+    assert summary.columns.tolist() == [
+        "latitude",
+        "longitude",
+        "period",
+        "group",
+        "statistic",
+        "value",
+    ]
+    table = summary.set_index(
+        ["period", "group", "statistic", "latitude", "longitude"]
+    )["value"].sort_index()
+    cells = ["latitude", "longitude"]
+    times = df.index.get_level_values("time")
+
+    expected = df.groupby(level=cells)["ghi"].sum() / 1000
+    np.testing.assert_allclose(
+        table.loc[("total", "all", "solar_irrad_total")], expected
+    )
+    expected = df.groupby([times.year] + cells)["t_air"].mean()
+    np.testing.assert_allclose(
+        table.loc[("annual", "2020", "temp_mean")], expected.loc[2020]
+    )
+    january = df[(times.year == 2020) & (times.month == 1)]
+    expected = january.groupby(level=cells)["tp"].sum()
+    np.testing.assert_allclose(
+        table.loc[("monthly", "2020-01", "precip_total")], expected
+    )
+    expected = df[times.hour == 13].groupby(level=cells)["windspeed"].mean()
+    np.testing.assert_allclose(
+        table.loc[("diurnal", "13", "windspeed_mean")], expected
+    )
+
+
+def test_climate_summary_of_sites_in_local_time():
+    df = weather_frame().xs((50.0, 10.0), level=["latitude", "longitude"])
+    sites = {"a": df, "b": df * 2}
+    summary = climate_summary(
+        sites,
+        statistics={"t_max": ("t_air", "max", 1.0)},
+        periods=["diurnal"],
+        timezone="America/Costa_Rica",
+    )
+    local = df.tz_convert("America/Costa_Rica")
+    expected = local["t_air"].groupby(local.index.hour).max()
+    result = summary[summary.site == "a"].set_index("group")["value"]
+    np.testing.assert_allclose(
+        result.loc[expected.index.astype(str)], expected
+    )
+    result = summary[summary.site == "b"].set_index("group")["value"]
+    np.testing.assert_allclose(
+        result.loc[expected.index.astype(str)], 2 * expected
+    )
+
+    with pytest.raises(ValueError):
+        climate_summary(df, statistics={"x": ("ghi", "median", 1.0)})
+    with pytest.raises(ValueError):
+        climate_summary(df, statistics={"x": ("e", "sum", 1.0)})
+
+
+def test_climate_summary_of_sliced_frame():
+    df = weather_frame()
+    times = df.index.get_level_values("time")
+    sliced = df[(times.year == 2020) & (df.index.get_level_values(1) == 50.0)]
+    summary = climate_summary(sliced, periods=["annual"])
+    assert summary["group"].unique().tolist() == ["2020"]
+    assert summary["latitude"].unique().tolist() == [50.0]
+    assert summary["value"].notna().all()
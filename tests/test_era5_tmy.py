@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from era5_tmy import typical_meteorological_year
+
+
+def multi_year_frame(offsets):
+    """Hourly data of 2010 to 2014 with an offset per year and location"""
+    times = pd.date_range("2010-01-01", "2014-12-31 23:00", freq="h", tz="UTC")
+    index = pd.MultiIndex.from_product(
+        [times, [50.0, 50.25], [10.0]],
+        names=["time", "latitude", "longitude"],
+    )
+    rng = np.random.default_rng(0)
+    # the same weather every year, shifted by the offset of the year
+    base = rng.uniform(0, 1, (8784, 1, 5))
+    day_of_year = (times.dayofyear - 1) * 24 + times.hour
+    offset = np.array([offsets[y] for y in times.year - 2010])
+    values = base[day_of_year] + offset[:, :, None]
+    return pd.DataFrame(
+        values.reshape(len(index), 5),
+        index=index,
+        columns=["ghi", "t_air", "e", "tp", "windspeed"],
+    )
+
+
+def test_tmy_selects_the_median_year_per_location():
+    # the year with offset 0 is closest to the long-term distribution
+    offsets = [(-2, 1), (-1, 2), (0, -1), (1, 0), (2, -2)]
+    df = multi_year_frame(offsets)
+    tmy, selection = typical_meteorological_year(df)
+
+    assert (selection.loc[(50.0, 10.0)] == 2012).all()
+    assert (selection.loc[(50.25, 10.0)] == 2013).all()
+
+    times = tmy.index.get_level_values("time")
+    assert (times.year == 2001).all()
+    assert len(tmy) == 8760 * 2
+    # the TMY holds the data of the selected years
+    january = tmy.xs(50.25, level="latitude").loc["2001-01"]
+    expected = df.xs(50.25, level="latitude").loc["2013-01"]
+    np.testing.assert_array_equal(january.values, expected.values)
+
+
+def test_tmy_skips_incomplete_months():
+    offsets = [(-2, 1), (-1, 2), (0, -1), (1, 0), (2, -2)]
+    df = multi_year_frame(offsets)
+    # drop a day of the typical year of the first location
+    single = df.xs((50.0, 10.0), level=["latitude", "longitude"])
+    single = single.drop(single.loc["2012-03-10"].index)
+    _, selection = typical_meteorological_year(single, year=2004)
+    assert selection[3].iloc[0] != 2012
+    assert (selection.drop(columns=3) == 2012).all(axis=None)
+
+    with pytest.raises(ValueError):
+        typical_meteorological_year(
+            single, weights={"x": ("ghi_missing", "sum", 1)}
+        )
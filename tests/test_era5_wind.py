@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import era5_wind
+
+
+def wind_dataset(k=2.0, c=8.0, n=20000):
+    rng = np.random.default_rng(0)
+    shape = (n, 2, 3)
+    ws100 = c * rng.weibull(k, shape)
+    direction = rng.uniform(0, 2 * np.pi, shape)
+    # power law with exponent 0.2 between 10 m and 100 m
+    ws10 = ws100 * 0.1 ** 0.2
+    dims = ("time", "latitude", "longitude")
+    return xr.Dataset(
+        {
+            "u100": (dims, ws100 * np.cos(direction)),
+            "v100": (dims, ws100 * np.sin(direction)),
+            "u10": (dims, ws10 * np.cos(direction)),
+            "v10": (dims, ws10 * np.sin(direction)),
+            "fsr": (dims, np.full(shape, 0.1)),
+            "sp": (dims, np.full(shape, 101325.0)),
+            "t2m": (dims, np.full(shape, 288.15)),
+        },
+        coords={
+            "time": pd.date_range("2020", periods=n, freq="h"),
+            "latitude": [50.25, 50.0],
+            "longitude": [10.0, 10.25, 10.5],
+        },
+    )
+
+
+def test_hub_height_wind_speed():
+    ds = wind_dataset(n=100)
+    _, ws100 = era5_wind.wind_speeds(ds)
+    for method in ("log", "power"):
+        xr.testing.assert_allclose(
+            era5_wind.hub_height_wind_speed(ds, 100, method), ws100
+        )
+    np.testing.assert_allclose(
+        era5_wind.hub_height_wind_speed(ds, 150, "power"),
+        ws100 * 1.5 ** 0.2,
+    )
+    np.testing.assert_allclose(
+        era5_wind.hub_height_wind_speed(ds, 150, "log"),
+        ws100 * np.log(1500) / np.log(1000),
+    )
+
+
+def test_wind_resource_recovers_weibull_parameters():
+    ds = wind_dataset(k=2.0, c=8.0)
+    resource = era5_wind.wind_resource(ds, hub_height=100)
+    assert resource["weibull_k"].dims == ("latitude", "longitude")
+    np.testing.assert_allclose(resource["weibull_k"], 2.0, rtol=0.03)
+    np.testing.assert_allclose(resource["weibull_c"], 8.0, rtol=0.03)
+    np.testing.assert_allclose(resource["shear_exponent"], 0.2)
+    # density of the standard atmosphere
+    np.testing.assert_allclose(
+        resource["power_density"],
+        resource["weibull_power_density"],
+        rtol=0.05,
+    )
+    expected = 0.5 * 1.225 * 8.0 ** 3 * 1.32934  # Gamma(1 + 3 / 2)
+    np.testing.assert_allclose(
+        resource["power_density"], expected, rtol=0.05
+    )
+
+    chunked = era5_wind.wind_resource(ds.chunk({"time": 5000}))
+    xr.testing.assert_allclose(chunked, resource)
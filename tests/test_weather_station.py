@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from weather_station import read_station_export
+from weather_station import read_station_header
+
+HEADER = [
+    '"Test Station"',
+    '"5/27/22 11:00 PM : 1 Year"',
+    '"","Gateway","Gateway","Gateway","Gateway","Gateway","Gateway"',
+    '"","Vantage","Vantage","Vantage","Vantage","Vantage","Vantage"',
+    '"","","","","","",""',
+    '"Date & Time","Temp - °F","Windgeschwindigkeit - mph","Regen - in",'
+    '"Sonneneinstr - W/m^2","ET - in","Hohe Temp - °F"',
+]
+
+
+def write_export(path, times, rows):
+    lines = HEADER + [
+        ",".join(
+            ['"{}"'.format(t.strftime("%m/%d/%y %I:%M %p").lstrip("0"))]
+            + ['"{}"'.format(v) for v in row]
+        )
+        for t, row in zip(times, rows)
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="latin-1")
+
+
+def test_read_station_header(tmp_path):
+    filename = tmp_path / "export.csv"
+    write_export(filename, [], [])
+    station, columns, n_header = read_station_header(filename)
+    assert station == "Test Station"
+    assert n_header == 6
+    assert list(columns["name"])[:3] == [
+        "Date & Time",
+        "Temp",
+        "Windgeschwindigkeit",
+    ]
+    assert columns["unit"][1] == "°F"
+    assert columns["sensor"][1] == "Vantage"
+    assert np.isnan(columns["unit"][0])
+
+
+def test_read_station_export(tmp_path):
+    filename = tmp_path / "export.csv"
+    times = pd.date_range("2022-05-29 15:15", periods=12, freq="15min")
+    rows = [
+        [50 + i, 10, 0.1, 100 * i, "0.01", 99] for i in range(len(times))
+    ]
+    rows[1][0] = "--"
+    write_export(filename, times, rows)
+
+    # small chunks to combine hours split between chunks
+    data = read_station_export(filename, chunksize=5)
+    assert data.attrs["station"] == "Test Station"
+    assert list(data.columns) == ["t_air", "windspeed", "tp", "ghi", "e"]
+    # time stamps mark the end of the hours
+    assert list(data.index) == list(
+        pd.date_range("2022-05-29 16:00", periods=3, freq="h")
+    )
+    first = data.iloc[0]
+    # 15:15 to 16:00, the temperature at 15:30 is missing
+    assert first["t_air"] == pytest.approx(((50 + 52 + 53) / 3 - 32) * 5 / 9)
+    assert first["windspeed"] == pytest.approx(4.4704)
+    assert first["tp"] == pytest.approx(4 * 2.54)
+    assert first["ghi"] == pytest.approx(150)
+    assert first["e"] == pytest.approx(-4 * 0.254)
+    assert data["tp"].sum() == pytest.approx(12 * 2.54)
+
+    utc = read_station_export(filename, timezone="America/Costa_Rica")
+    assert utc.index[0] == pd.Timestamp("2022-05-29 22:00", tz="UTC")